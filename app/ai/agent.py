@@ -1,7 +1,6 @@
 import json
 import logging
-from groq import Groq
-from app.config import settings
+from app.services.llm_gateway import get_llm_gateway
 
 logger = logging.getLogger("datalens")
 
@@ -41,18 +40,14 @@ def run_langchain_agent(csv_analysis: list[str], image_analysis: list[str]) -> d
         [f"IMAGE CAPTION:\n{i}" for i in image_analysis]
     )
     try:
-        client = Groq(api_key=settings.GROQ_API_KEY)
-
-        resp = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=[
+        text = get_llm_gateway().chat_sync(
+            [
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": combined}
             ],
-            temperature=0
-        )
-
-        text = resp.choices[0].message.content.strip()
+            model="llama3-8b-8192",
+            temperature=0,
+        ).strip()
 
         # Parse JSON safely
         return json.loads(text)
@@ -0,0 +1,92 @@
+"""
+CPU inference backends for BLIP captioning, chosen with CAPTION_BACKEND:
+
+    torch       float32 PyTorch, as loaded from the hub (baseline)
+    torch-int8  Linear layers dynamically quantised to int8 weights
+    onnx        vision encoder exported to ONNX and run by ONNX Runtime;
+                the text decoder stays in PyTorch
+
+The onnx backend needs the optional onnx and onnxruntime packages. The
+exported encoder is written once to ONNX_MODEL_DIR and reused.
+"""
+import os
+
+from app.config import settings
+from app.logger import logger
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+def apply_backend(model, backend: str):
+    """Return model prepared for backend; the caller holds the only reference."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown CAPTION_BACKEND {backend!r}, expected one of {BACKENDS}")
+    if backend == "torch-int8":
+        import torch
+
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == "onnx":
+        model.vision_model = _onnx_vision_encoder(_onnx_session(model))
+    return model
+
+
+def _export_vision_encoder(model, path: str):
+    import torch
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, vision_model):
+            super().__init__()
+            self.vision_model = vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values)[0]
+
+    size = model.config.vision_config.image_size
+    dummy = torch.zeros(1, 3, size, size)
+    part = f"{path}.part"
+    # Not inference_mode: the exporter traces the graph, which inference tensors break
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(model.vision_model).eval(),
+            (dummy,),
+            part,
+            input_names=["pixel_values"],
+            output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=17,
+        )
+    os.replace(part, path)
+    logger.info("Exported BLIP vision encoder to %s", path)
+
+
+def _onnx_session(model):
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError("CAPTION_BACKEND=onnx needs: pip install onnx onnxruntime") from e
+
+    os.makedirs(settings.ONNX_MODEL_DIR, exist_ok=True)
+    path = os.path.join(settings.ONNX_MODEL_DIR, "blip_vision_encoder.onnx")
+    if not os.path.exists(path):
+        _export_vision_encoder(model, path)
+
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = settings.CAPTION_THREADS
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+def _onnx_vision_encoder(session):
+    """
+    Stand-in for model.vision_model. generate() only reads element 0 of its
+    output, the image embeddings, which ONNX Runtime now computes. It has to
+    be an nn.Module to be assigned over a registered submodule.
+    """
+    import torch
+
+    class OnnxVisionEncoder(torch.nn.Module):
+        def forward(self, pixel_values=None, **kwargs):
+            embeds = session.run(["image_embeds"], {"pixel_values": pixel_values.detach().cpu().numpy()})[0]
+            return (torch.from_numpy(embeds),)
+
+    return OnnxVisionEncoder()
@@ -0,0 +1,41 @@
+import threading
+from typing import Callable, List
+
+from app.config import settings
+from app.ai import models
+from app.ai.image_prep import load_prepared_image
+from app.utils.batching import MicroBatcher
+
+
+class CaptionBatcher(MicroBatcher):
+    """
+    Collects caption requests from any number of threads and runs them
+    through the model in batches of up to max_batch images (see MicroBatcher).
+    """
+
+    def __init__(self, run_batch: Callable[[list], List[str]], max_batch: int, max_wait: float, timeout: float | None = None):
+        super().__init__(run_batch, max_batch, max_wait, name="caption-batcher", timeout=timeout)
+
+    def caption(self, image) -> str:
+        return self.run(image)
+
+
+_batcher: CaptionBatcher | None = None
+_batcher_lock = threading.Lock()
+
+
+def get_caption_batcher() -> CaptionBatcher:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = CaptionBatcher(
+                models.caption_batch_local,
+                settings.CAPTION_MAX_BATCH,
+                settings.CAPTION_MAX_WAIT_MS / 1000,
+                settings.BATCH_TIMEOUT_S,
+            )
+        return _batcher
+
+
+def caption_local(path: str) -> str:
+    return get_caption_batcher().caption(load_prepared_image(path))
@@ -0,0 +1,55 @@
+import os
+from uuid import uuid4
+
+import numpy as np
+from PIL import Image
+
+# BLIP's processor resizes every image to 384 x 384 (bicubic, aspect ratio
+# not kept), so nothing larger than that needs to be decoded or held.
+TARGET_SIZE = (384, 384)
+PREP_SUFFIX = ".prep384.npy"
+# Image.resize first shrinks by an integer factor with reduce() until it is
+# within this factor of the target, then does the bicubic pass
+REDUCING_GAP = 3.0
+
+
+def prep_path_for(path: str) -> str:
+    return path + PREP_SUFFIX
+
+
+def prepare_image(path: str) -> Image.Image:
+    """
+    Decode an image straight down to TARGET_SIZE RGB. JPEGs are decoded at
+    a reduced DCT scale via draft(); other formats are shrunk with reduce()
+    before the final bicubic resize, so full-resolution pixels are never
+    converted or resampled.
+    """
+    with Image.open(path) as img:
+        if img.format == "JPEG":
+            img.draft("RGB", TARGET_SIZE)
+        if img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        small = img.resize(TARGET_SIZE, Image.BICUBIC, reducing_gap=REDUCING_GAP)
+    return small.convert("RGB")
+
+
+def cache_prepared_image(path: str) -> str:
+    """
+    Store the prepared pixels next to path as a uint8 (384, 384, 3) .npy,
+    ready for the processor's rescale/normalise step. Reuses an existing one.
+    """
+    out = prep_path_for(path)
+    if os.path.exists(out):
+        return out
+    part = f"{out}.{uuid4().hex}.part.npy"
+    np.save(part, np.asarray(prepare_image(path)))
+    os.replace(part, out)
+    return out
+
+
+def load_prepared_image(path: str) -> Image.Image:
+    """The cached prepared image for path if there is one, else prepare it now."""
+    cached = prep_path_for(path)
+    if os.path.exists(cached):
+        return Image.fromarray(np.load(cached))
+    return prepare_image(path)
@@ -1,22 +1,28 @@
+import asyncio
 import json
-from langchain_groq import ChatGroq
 from app.config import settings
 from app.logger import logger
+from app.ai.prompt_builder import compact_csv_insights, estimate_tokens
+from app.services.llm_cache import llm_cache, llm_cache_key
+from app.services.llm_gateway import get_llm_gateway
 
+TEMPERATURE = 0.3
+MAX_TOKENS = 2048
 
-def run_langchain_agent(csv_summaries, image_captions):
+
+def build_prompt(csv_analyses, image_captions, budget: int | None = None) -> str:
     """
-    Use Groq LLM to create a structured AI business analytics report.
+    The report prompt, with CSV analyses (dicts from analyze_csv) compacted
+    so the whole prompt stays within budget tokens (PROMPT_TOKEN_BUDGET).
     """
+    budget = budget or settings.PROMPT_TOKEN_BUDGET
+    captions = "\n".join(image_captions)
+    fixed = estimate_tokens(_render_prompt("", captions))
+    return _render_prompt(compact_csv_insights(csv_analyses, budget - fixed), captions)
 
-    llm = ChatGroq(
-        api_key=settings.GROQ_API_KEY,
-        model=settings.GROQ_MODEL or "llama-3.1-8b-instant",
-        temperature=0.3,
-        max_tokens=2048,
-    )
 
-    prompt = f"""
+def _render_prompt(csv_insights: str, image_captions: str) -> str:
+    return f"""
 You are a senior business data analyst.
 Analyze the dataset insights & image captions provided below and generate a detailed business intelligence report.
 
@@ -45,37 +51,102 @@ Guidelines:
 - Do not return markdown, additional comments, or code fences
 
 CSV Insights:
-{csv_summaries}
+{csv_insights}
 
 Visual Insights:
 {image_captions}
 """
 
-    try:
-        logger.info("📡 Sending request to Groq")
-        response = llm.invoke(prompt)
-        text = response.content.strip()
 
-        # Remove code fencing if present
-        if text.startswith("```"):
-            text = text.strip("```").strip()
+def _prepare(csv_analyses, image_captions) -> tuple[str, str, str]:
+    model = settings.GROQ_MODEL or "llama-3.1-8b-instant"
+    prompt = build_prompt(csv_analyses, image_captions)
+    return model, prompt, llm_cache_key(model, TEMPERATURE, MAX_TOKENS, prompt)
+
+
+def _parse_report(text: str) -> dict:
+    text = text.strip()
+    # Remove code fencing if present
+    if text.startswith("```"):
+        text = text.strip("```").strip()
+    return json.loads(text)
+
+
+def fallback_report() -> dict:
+    return {
+        "summary": "Partial insights extracted. AI failed to fully structure advanced details.",
+        "key_metrics": {},
+        "trends": [],
+        "correlations": [],
+        "recommendations": [
+            "Use more structured data for stronger insight extraction.",
+            "Ensure charts contain readable labels and trends.",
+            "Validate column naming consistency across CSV uploads."
+        ]
+    }
+
+
+def run_langchain_agent(csv_analyses, image_captions, use_cache: bool = True):
+    """
+    Use Groq LLM to create a structured AI business analytics report.
+    Parsed reports are cached by model, sampling params and prompt, so
+    unchanged inputs are answered without a Groq call unless use_cache is False.
+    """
+    model, prompt, key = _prepare(csv_analyses, image_captions)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            logger.info("LLM cache hit %s: %s", key[:12], llm_cache.stats())
+            return cached
 
-        result = json.loads(text)
+    try:
+        logger.info("📡 Sending request to Groq")
+        text = get_llm_gateway().chat_sync(
+            [{"role": "user", "content": prompt}],
+            model=model,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+        )
+        result = _parse_report(text)
         logger.info("✅ Groq report parsed successfully")
+        # Only parsed reports are cached; the fallback below is retried next time
+        llm_cache.put(key, model, result)
         return result
 
     except Exception as e:
         logger.error("❌ Groq parsing failed: %s", e)
+        return fallback_report()
 
-        return {
-            "summary": "Partial insights extracted. AI failed to fully structure advanced details.",
-            "key_metrics": {},
-            "trends": [],
-            "correlations": [],
-            "recommendations": [
-                "Use more structured data for stronger insight extraction.",
-                "Ensure charts contain readable labels and trends.",
-                "Validate column naming consistency across CSV uploads."
-            ]
-        }
 
+async def stream_langchain_agent(csv_analyses, image_captions, use_cache: bool = True):
+    """
+    Streaming run_langchain_agent: yields ("token", text) as Groq produces
+    the answer, then ("report", dict) once it is parsed. A cache hit yields
+    only the report.
+    """
+    model, prompt, key = _prepare(csv_analyses, image_captions)
+    if use_cache:
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            logger.info("LLM cache hit %s: %s", key[:12], llm_cache.stats())
+            yield "report", cached
+            return
+
+    parts = []
+    try:
+        logger.info("📡 Streaming request to Groq")
+        async for delta in get_llm_gateway().stream(
+            [{"role": "user", "content": prompt}],
+            model=model,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+        ):
+            parts.append(delta)
+            yield "token", delta
+        result = _parse_report("".join(parts))
+        logger.info("✅ Groq report parsed successfully")
+        await asyncio.to_thread(llm_cache.put, key, model, result)
+    except Exception as e:
+        logger.error("❌ Groq parsing failed: %s", e)
+        result = fallback_report()
+    yield "report", result
@@ -3,15 +3,10 @@ from langchain.llms.base import LLM
 from pydantic import BaseModel
 import json
 import logging
-from app.config import settings
+from app.services.llm_gateway import get_llm_gateway
 
 logger = logging.getLogger("datalens")
 
-try:
-    import groq
-except Exception:
-    groq = None
-
 class GroqLLM(LLM, BaseModel):
     """Minimal LangChain-compatible LLM wrapper using Groq chat completions."""
     model: str = "llama3-8b-8192"
@@ -22,33 +17,16 @@ class GroqLLM(LLM, BaseModel):
         arbitrary_types_allowed = True
 
     def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
-        if groq is None:
-            raise RuntimeError("groq python package not available")
+        # Shared pooled client with deadline, retries and the global concurrency
+        # cap; api_key, when set, replaces GROQ_API_KEY for this call
         try:
-            client = groq.Groq(api_key=self.api_key or settings.GROQ_API_KEY)
-            # Use chat completion API by wrapping prompt as a single user message
-            resp = client.chat.completions.create(
+            return get_llm_gateway().chat_sync(
+                [{"role": "user", "content": prompt}],
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
                 temperature=self.temperature,
                 max_tokens=1500,
+                api_key=self.api_key,
             )
-            # Robustly extract text
-            text = None
-            if isinstance(resp, dict):
-                choices = resp.get("choices", [])
-                if choices:
-                    msg = choices[0].get("message") or {}
-                    text = msg.get("content") or choices[0].get("text")
-            else:
-                try:
-                    text = resp.choices[0].message.content
-                except Exception:
-                    try:
-                        text = resp.choices[0].text
-                    except Exception:
-                        text = str(resp)
-            return text or ""
         except Exception as e:
             logger.exception("Groq LLM call failed: %s", e)
             raise
@@ -0,0 +1,79 @@
+import json
+import threading
+from functools import lru_cache
+
+from app.config import settings
+from app.logger import logger
+
+BLIP_MODEL = "Salesforce/blip-image-captioning-base"
+# Passed to generate(); part of the caption cache key, so changing them
+# invalidates stored captions
+CAPTION_GENERATION: dict = {}
+
+# Loading is slow and generate() on one model object is not safe to run from
+# several threads at once, so each model gets a load lock and a run lock.
+_load_lock = threading.Lock()
+blip_lock = threading.Lock()
+embedding_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _load_blip(backend: str):
+    import torch
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    from app.ai.caption_backends import apply_backend
+
+    # Pin the intra-op pool so concurrent requests do not oversubscribe cores
+    torch.set_num_threads(settings.CAPTION_THREADS)
+    logger.info("Loading %s (%s backend, %d threads)", BLIP_MODEL, backend, settings.CAPTION_THREADS)
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL)
+    model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL)
+    model.eval()
+    return processor, apply_backend(model, backend)
+
+
+@lru_cache(maxsize=1)
+def _load_sentence_model():
+    from sentence_transformers import SentenceTransformer
+
+    logger.info("Loading %s", settings.EMBEDDING_MODEL)
+    return SentenceTransformer(settings.EMBEDDING_MODEL)
+
+
+def get_blip(backend: str | None = None):
+    """(processor, model), loaded on first use rather than at import."""
+    with _load_lock:
+        return _load_blip(backend or settings.CAPTION_BACKEND)
+
+
+def get_sentence_model():
+    with _load_lock:
+        return _load_sentence_model()
+
+
+def caption_batch_local(images: list, backend: str | None = None) -> list[str]:
+    """Caption a batch of RGB PIL images in one generate() call."""
+    import torch
+
+    processor, model = get_blip(backend)
+    with blip_lock, torch.inference_mode():
+        inputs = processor(images=images, return_tensors="pt")
+        out = model.generate(**inputs, **CAPTION_GENERATION)
+    return processor.batch_decode(out, skip_special_tokens=True)
+
+
+def caption_cache_key() -> tuple[str, str]:
+    """(model id, generation params) that a stored caption must match."""
+    # Quantised and ONNX backends can word captions slightly differently
+    model = BLIP_MODEL if settings.CAPTION_BACKEND == "torch" else f"{BLIP_MODEL}:{settings.CAPTION_BACKEND}"
+    return model, json.dumps(CAPTION_GENERATION, sort_keys=True)
+
+
+def embed_local(texts: list[str]):
+    """(len(texts), dim) float32 array, in one encode() call."""
+    import numpy as np
+
+    model = get_sentence_model()
+    with embedding_lock:
+        emb = model.encode(texts, batch_size=max(len(texts), 1), convert_to_numpy=True, show_progress_bar=False)
+    return np.ascontiguousarray(emb, dtype=np.float32)
@@ -0,0 +1,160 @@
+"""
+Renders per-file CSV analyses into the compact text block the report prompt
+embeds, trimmed to a token budget. Each numeric column becomes one line of
+4-significant-digit stats plus its trend; each strong correlation one short
+line. Columns are ranked by salience (spread relative to the mean, size of
+the trend, strongest correlation) and correlations by |r|, and lines are
+kept best-first, round-robin across files, until the budget is used up.
+"""
+import math
+from typing import Any, Dict, List
+
+from app.logger import logger
+
+# key_metrics suffixes, in the order they are rendered
+METRIC_SUFFIXES = ("mean", "std", "min", "p50", "p90", "p99", "max", "sum")
+# Per-file allowance for section labels and "N omitted" notes
+NOTE_TOKENS = 24
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for Llama-family tokenizers (about 4 characters per
+    token on this mix of English and numbers); only used for budgeting.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def legacy_csv_block(analysis: Dict[str, Any]) -> str:
+    """The repr-style block reports used before compaction, for comparison."""
+    return (
+        f"File: {analysis['file']}\nKey Metrics: {analysis['key_metrics']}\n"
+        f"Trends: {analysis['trends']}\nCorrelations: {analysis['correlations']}\n"
+    )
+
+
+def _num(v) -> str:
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return "nan"
+    if isinstance(v, float) and math.isinf(v):
+        return "inf" if v > 0 else "-inf"
+    return f"{v:.4g}"
+
+
+def split_key_metrics(km: Dict[str, Any]) -> tuple[Dict[str, Dict[str, float]], Dict[str, Any]]:
+    """{column: {stat: value}} plus the table-level entries (row_count, ...)."""
+    columns: Dict[str, Dict[str, float]] = {}
+    table: Dict[str, Any] = {}
+    for key, value in km.items():
+        col, _, stat = key.rpartition("_")
+        if col and stat in METRIC_SUFFIXES:
+            columns.setdefault(col, {})[stat] = value
+        else:
+            table[key] = value
+    return columns, table
+
+
+def column_salience(stats: Dict[str, float], trend: Dict[str, Any] | None, max_corr: float) -> float:
+    """
+    Relative spread (std / |mean|), trend size (|change| in units of 100%,
+    weighted by r² when the trend is a fit) and strongest |r|, each
+    log-damped so no single term swamps the others.
+    """
+    mean, std = stats.get("mean"), stats.get("std")
+    spread = 0.0
+    if std is not None and mean is not None and math.isfinite(std):
+        lo, hi = stats.get("min", mean), stats.get("max", mean)
+        scale = abs(mean) or (hi - lo) or 1.0
+        spread = math.log1p(std / scale)
+    change = 0.0
+    if trend:
+        pct = abs(trend.get("change_pct", 0.0))
+        pct = 1000.0 if not math.isfinite(pct) else pct
+        fit = trend.get("r2", 1.0)
+        change = math.log1p(pct / 100.0) * (fit if math.isfinite(fit) else 0.0)
+    return spread + change + max_corr
+
+
+def _column_line(col: str, stats: Dict[str, float], trend: Dict[str, Any] | None) -> str:
+    parts = [f"{s}={_num(stats[s])}" for s in METRIC_SUFFIXES if s in stats]
+    if trend:
+        t = f"trend={trend['direction']} {_num(trend.get('change_pct', 0.0))}%"
+        if "r2" in trend:
+            t += f" r2={_num(trend['r2'])}"
+        if "recent_direction" in trend:
+            t += f" recent={trend['recent_direction']} {_num(trend['recent_change_pct'])}%"
+        parts.append(t)
+    return f"{col}: {' '.join(parts)}"
+
+
+def _file_candidates(analysis: Dict[str, Any]) -> tuple[str, List[str], List[str]]:
+    columns, table = split_key_metrics(analysis.get("key_metrics") or {})
+    trends = {t["metric"]: t for t in analysis.get("trends") or [] if "metric" in t}
+    corrs = sorted(analysis.get("correlations") or [], key=lambda c: -abs(c.get("coefficient", 0.0)))
+
+    max_corr: Dict[str, float] = {}
+    for c in corrs:
+        r = abs(c.get("coefficient", 0.0))
+        for col in (c["a"], c["b"]):
+            max_corr[col] = max(max_corr.get(col, 0.0), r)
+
+    ranked = sorted(
+        set(columns) | set(trends),
+        key=lambda col: -column_salience(columns.get(col, {}), trends.get(col), max_corr.get(col, 0.0)),
+    )
+    shape = ", ".join(f"{k}={v}" for k, v in table.items())
+    header = f"File: {analysis['file']}" + (f" ({shape})" if shape else "")
+    col_lines = [_column_line(col, columns.get(col, {}), trends.get(col)) for col in ranked]
+    corr_lines = [f"{c['a']} ~ {c['b']}: r={c['coefficient']:.2f}" for c in corrs]
+    return header, col_lines, corr_lines
+
+
+def render_csv_insights(analyses: List[Dict[str, Any]], budget: int) -> str:
+    """
+    Compact text for every analysis in at most about `budget` tokens. File
+    headers always stay; columns and correlations are added in rank order,
+    the n-th best of every file before the (n+1)-th of any, and whatever
+    does not fit is summarised as a count.
+    """
+    files = [_file_candidates(a) for a in analyses]
+    used = sum(estimate_tokens(h) + NOTE_TOKENS for h, _, _ in files)
+
+    candidates = []
+    for f, (_, cols, corrs) in enumerate(files):
+        candidates += [(rank, 0, f, line) for rank, line in enumerate(cols)]
+        candidates += [(rank, 1, f, line) for rank, line in enumerate(corrs)]
+    candidates.sort(key=lambda c: c[:3])
+
+    kept: set = set()
+    full: set = set()
+    for rank, kind, f, line in candidates:
+        cost = estimate_tokens(line)
+        # Each list stays a prefix of its ranking, so the omitted note is exact
+        if (f, kind) in full or used + cost > budget:
+            full.add((f, kind))
+            continue
+        used += cost
+        kept.add((f, kind, rank))
+
+    blocks = []
+    for f, (header, cols, corrs) in enumerate(files):
+        lines = [header]
+        for kind, label, items in ((0, "Columns (ranked by salience)", cols), (1, "Correlations", corrs)):
+            shown = [line for rank, line in enumerate(items) if (f, kind, rank) in kept]
+            if not items:
+                continue
+            lines.append(f"{label}:")
+            lines += shown
+            if len(shown) < len(items):
+                lines.append(f"(+{len(items) - len(shown)} lower-ranked omitted)")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def compact_csv_insights(analyses: List[Dict[str, Any]], budget: int) -> str:
+    """render_csv_insights, logging its size against the legacy rendering."""
+    text = render_csv_insights(analyses, budget)
+    before = sum(estimate_tokens(legacy_csv_block(a)) for a in analyses)
+    after = estimate_tokens(text)
+    logger.info("CSV insights: ~%d tokens (budget %d), ~%d saved vs. raw metrics", after, budget, max(before - after, 0))
+    return text
@@ -7,13 +7,14 @@ from app.ai.vision import extract_image_text
 from typing import Dict, Any, List
 import logging
 from app.utils.metrics import compute_key_metrics, detect_trends, compute_correlations
+from app.services.columnar import read_csv_frame
 
 logger = logging.getLogger("datalens")
 
 def csv_metrics_tool(path_or_text: str) -> str:
     try:
         if os.path.exists(path_or_text):
-            df = pd.read_csv(path_or_text)
+            df = read_csv_frame(path_or_text)
         else:
             # treat as raw CSV content
             from io import StringIO
@@ -27,7 +28,7 @@ def csv_metrics_tool(path_or_text: str) -> str:
 def csv_trends_tool(path_or_text: str) -> str:
     try:
         if os.path.exists(path_or_text):
-            df = pd.read_csv(path_or_text)
+            df = read_csv_frame(path_or_text)
         else:
             from io import StringIO
             df = pd.read_csv(StringIO(path_or_text))
@@ -40,7 +41,7 @@ def csv_trends_tool(path_or_text: str) -> str:
 def csv_correlations_tool(path_or_text: str) -> str:
     try:
         if os.path.exists(path_or_text):
-            df = pd.read_csv(path_or_text)
+            df = read_csv_frame(path_or_text)
         else:
             from io import StringIO
             df = pd.read_csv(StringIO(path_or_text))
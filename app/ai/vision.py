@@ -1,51 +1,40 @@
-import os
-from urllib.parse import urlparse
+from contextlib import nullcontext
 
-from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
-
-import boto3
-
-from app.config import settings
+from app.ai.captioning import caption_local
+from app.services.caption_cache import get_cached_caption, store_caption
+from app.services.model_server import get_model_client
+from app.services.object_cache import lease_s3_cached
+from app.services.storage import file_sha256
 from app.logger import logger
 
-processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-
-
-def _download_s3_to_local(s3_uri: str) -> str:
-    parsed = urlparse(s3_uri)
-    bucket = parsed.netloc
-    key = parsed.path.lstrip("/")
-
-    local_dir = os.path.join("tmp", "images")
-    os.makedirs(local_dir, exist_ok=True)
-    local_path = os.path.join(local_dir, os.path.basename(key))
 
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    )
-    s3.download_file(bucket, key, local_path)
-    return local_path
-
-
-def _resolve_image_path(path: str) -> str:
+def _local_image(path: str, checksum: str | None = None):
     if path.startswith("s3://"):
-        return _download_s3_to_local(path)
-    return path
+        return lease_s3_cached(path, checksum)
+    return nullcontext(path)
 
 
-def extract_image_text(path: str) -> dict:
+def extract_image_text(path: str, checksum: str | None = None) -> dict:
     try:
-        local_path = _resolve_image_path(path)
-        img = Image.open(local_path).convert("RGB")
-
-        inputs = processor(images=img, return_tensors="pt")
-        out = model.generate(**inputs)
-        caption = processor.decode(out[0], skip_special_tokens=True)
-
+        # Captions are keyed by content, so a known checksum skips the download too
+        if checksum:
+            cached = get_cached_caption(checksum)
+            if cached is not None:
+                return {"caption": cached}
+
+        with _local_image(path, checksum) as local_path:
+            if not checksum:
+                checksum = file_sha256(local_path)
+                cached = get_cached_caption(checksum)
+                if cached is not None:
+                    return {"caption": cached}
+
+            # With a model server the weights live there, not in this worker
+            client = get_model_client()
+            caption = client.caption(local_path) if client else caption_local(local_path)
+
+        if caption:
+            store_caption(checksum, caption)
         return {"caption": caption}
 
     except Exception as e:
@@ -5,12 +5,61 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./dev.db"
     QDRANT_URL: str = "http://localhost:6333"
     QDRANT_API_KEY: str | None = None
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_BATCH_SIZE: int = 256
+    QDRANT_FLUSH_MS: int = 50
+    VECTOR_BACKEND: str = "qdrant"  # or "local" for the on-disk store
+    VECTOR_STORE_DIR: str = "tmp/vectors"
     AWS_S3_BUCKET: str | None = None
     AWS_ACCESS_KEY_ID: str | None = None
     AWS_SECRET_ACCESS_KEY: str | None = None
+    AWS_REGION: str | None = None
+    S3_ENDPOINT_URL: str | None = None
+    S3_TRANSFER_WORKERS: int = 8
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MULTIPART_THRESHOLD: int = 16 * 1024 * 1024
+    S3_MULTIPART_CHUNKSIZE: int = 16 * 1024 * 1024
+    S3_MAX_CONCURRENCY: int = 4
+    OBJECT_CACHE_DIR: str = "tmp/objects"
+    OBJECT_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
     GROQ_API_KEY: str | None = None
     GROQ_MODEL: str = "llama-3.1-8b-instant"
+    LLM_BASE_URL: str = "https://api.groq.com/openai/v1"
+    LLM_MAX_CONCURRENCY: int = 4
+    LLM_TIMEOUT_S: float = 60.0
+    LLM_MAX_RETRIES: int = 3
+    PROMPT_TOKEN_BUDGET: int = 4000
+    LLM_CACHE_MAX_ENTRIES: int = 256
+    LLM_CACHE_TTL_S: int = 7 * 24 * 3600
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBED_MAX_BATCH: int = 64
+    EMBED_MAX_WAIT_MS: int = 5
+    EMBED_CACHE_ENTRIES: int = 4096
+    MODEL_SERVER_SOCKET: str | None = None
+    MODEL_SERVER_TIMEOUT: float = 120.0
+    BATCH_TIMEOUT_S: float = 300.0
+    CAPTION_MAX_BATCH: int = 8
+    CAPTION_MAX_WAIT_MS: int = 25
+    CAPTION_THREADS: int = 4
+    CAPTION_BACKEND: str = "torch"  # torch, torch-int8 or onnx
+    ONNX_MODEL_DIR: str = "tmp/onnx"
+    CAPTION_WARMUP_ON_UPLOAD: bool = False
+    IMAGE_PREP_ON_UPLOAD: bool = True
+    REPORT_WORKERS: int = 2
+    REPORT_QUEUE_DEPTH: int = 16
+    REPORT_JOB_HEARTBEAT_S: float = 15.0
+    REPORT_JOB_STALE_S: float = 60.0
+    REPORT_CSV_PROCESSES: int = 4
+    REPORT_IMAGE_THREADS: int = 2
+    STREAMING_METRICS_MIN_BYTES: int = 256 * 1024 * 1024
+    METRICS_CHUNK_ROWS: int = 100_000
+    METRICS_MAX_PAIR_COLUMNS: int = 2000
+    TREND_METHOD: str = "endpoints"
+    TREND_WINDOW_ROWS: int | None = None
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    MAX_UPLOAD_FILE_BYTES: int = 5 * 1024 ** 3
+    MAX_UPLOAD_REQUEST_BYTES: int = 10 * 1024 ** 3
 
     class Config:
         env_file = ".env"
@@ -1,14 +1,48 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
+import logging
+logger = logging.getLogger("datalens")
 
 engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def init_db():
+def init_db(bind=None):
     from app.db import models
-    Base.metadata.create_all(bind=engine)
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+
+def add_missing_columns(bind):
+    """
+    create_all never alters a table that already exists, so columns added to
+    the models since a database was created are added here. Only nullable
+    columns can be added in place; anything else needs the table rebuilt.
+    """
+    existing = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if not existing.has_table(table.name):
+            continue
+        present = {c["name"] for c in existing.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in present]
+        if not missing:
+            continue
+        with bind.begin() as conn:
+            for column in missing:
+                if not column.nullable or column.primary_key:
+                    logger.error("Column %s.%s is missing and not nullable; rebuild the table", table.name, column.name)
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=bind.dialect)}"
+                ))
+                logger.info("Added column %s.%s", table.name, column.name)
+            added = {c.name for c in missing}
+            for index in table.indexes:
+                if {c.name for c in index.columns} & added:
+                    index.create(conn, checkfirst=True)
 
 def get_db():
     db = SessionLocal()
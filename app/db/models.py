@@ -5,7 +5,8 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     JSON,
-    Boolean
+    Boolean,
+    LargeBinary
 )
 from sqlalchemy.orm import relationship
 from app.db.database import Base
@@ -27,7 +28,10 @@ class FileMeta(Base):
     filename = Column(String)
     s3_path = Column(String) 
     file_type = Column(String)
-    checksum = Column(String)
+    checksum = Column(String, index=True)
+    blob_path = Column(String, nullable=True)
+    columnar_path = Column(String, nullable=True)
+    metric_summary = Column(LargeBinary, nullable=True)
     size = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -41,3 +45,43 @@ class Report(Base):
     report_json = Column(SQLJSON, default={})
     pdf_path = Column(String, nullable=True)
     embeddings_indexed = Column(Boolean, default=False)
+
+
+class CaptionCache(Base):
+    __tablename__ = "caption_cache"
+    checksum = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)
+    params = Column(String, primary_key=True)
+    caption = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class EmbeddingCache(Base):
+    __tablename__ = "embedding_cache"
+    text_hash = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)
+    vector = Column(LargeBinary)  # float32 bytes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class LLMResponse(Base):
+    __tablename__ = "llm_responses"
+    key = Column(String, primary_key=True)
+    model = Column(String)
+    response = Column(SQLJSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+    id = Column(String, primary_key=True, index=True)
+    upload_id = Column(String, index=True)
+    status = Column(String, default="queued", index=True)
+    stage = Column(String, nullable=True)
+    progress = Column(Integer, default=0)
+    request_json = Column(SQLJSON, default={})
+    result_json = Column(SQLJSON, nullable=True)
+    error = Column(String, nullable=True)
+    owner = Column(String, nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
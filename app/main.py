@@ -36,6 +36,22 @@ async def verify_token(request: Request, call_next):
     return await call_next(request)
 
 
+# -----------------------
+# Middleware for upload size
+# -----------------------
+async def limit_upload_size(request: Request, call_next):
+    # Reject oversized uploads from the declared length before the body is read
+    if request.url.path.startswith("/upload"):
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > settings.MAX_UPLOAD_REQUEST_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": "Upload exceeds the request size limit"},
+            )
+
+    return await call_next(request)
+
+
 # -----------------------
 # Swagger Auth Button
 # -----------------------
@@ -59,12 +75,13 @@ def custom_openapi(app: FastAPI):
         }
     }
 
-    # Secure ONLY this endpoint
-    if "/generate-report" in schema["paths"]:
-        for method in schema["paths"]["/generate-report"]:
-            schema["paths"]["/generate-report"][method]["security"] = [
-                {"ApiTokenAuth": []}
-            ]
+    # Secure ONLY the report endpoints
+    for path, ops in schema["paths"].items():
+        if path.startswith("/generate-report"):
+            for method in ops:
+                ops[method]["security"] = [
+                    {"ApiTokenAuth": []}
+                ]
 
     app.openapi_schema = schema
     return schema
@@ -85,10 +102,12 @@ def create_app():
 
     # Add API token middleware
     app.add_middleware(BaseHTTPMiddleware, dispatch=verify_token)
+    app.add_middleware(BaseHTTPMiddleware, dispatch=limit_upload_size)
 
     @app.on_event("startup")
     def start_db():
         init_db()
+        report.jobs.resume()
 
     # Routes
     app.include_router(upload.router)
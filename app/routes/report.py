@@ -2,25 +2,28 @@ from __future__ import annotations
 
 import os
 import json
+import math
+from contextlib import ExitStack
 from uuid import uuid4
-from typing import List
-from urllib.parse import urlparse
+from typing import Callable, List
 
-import boto3
-import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.schemas import ReportRequest, ReportResponse
-from app.db.database import get_db
-from app.db.models import Upload, FileMeta, Report
-from app.utils.metrics import compute_key_metrics, detect_trends, compute_correlations
+from app.schemas import ReportRequest, ReportResponse, ReportJobResponse, MetricsSummaryRequest, MetricsSummaryResponse
+from app.db.database import SessionLocal, get_db
+from app.db.models import Upload, FileMeta, Report, ReportJob
 from app.ai.vision import extract_image_text
-from app.ai.langchain_agent import run_langchain_agent
+from app.ai.langchain_agent import run_langchain_agent, stream_langchain_agent
 from app.utils.pdf_generator import generate_pdf
-from app.services.s3_client import upload_to_s3
+from app.services.object_cache import lease_s3_cached
+from app.services.analysis import OrderedBatch, analyze_csv, get_csv_pool, get_image_pool
+from app.services.report_jobs import JobQueue, QueueFull
+from app.utils.streaming_metrics import combine_summaries
 from app.services.qdrant_client import QdrantWrapper
-from app.services.embeddings import generate_embeddings
+from app.services.embeddings import collection_name, get_embedding_service
 from app.logger import logger
 from app.config import settings
 
@@ -34,28 +37,14 @@ LOCAL_UPLOAD_DIR = os.path.join("app", "uploads")
 # Helpers for file access
 # ------------------------
 
-def download_s3_to_local(s3_uri: str, subdir: str) -> str:
-    parsed = urlparse(s3_uri)
-    bucket = parsed.netloc
-    key = parsed.path.lstrip("/")
+def ensure_local_csv_path(f: FileMeta, leases: ExitStack) -> str | None:
+    """Local path for a CSV; a cached S3 copy stays leased until leases closes."""
+    if f.blob_path and os.path.exists(f.blob_path):
+        return f.blob_path
 
-    local_dir = os.path.join("tmp", subdir)
-    os.makedirs(local_dir, exist_ok=True)
-    local_path = os.path.join(local_dir, os.path.basename(key))
-
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    )
-    s3.download_file(bucket, key, local_path)
-    return local_path
-
-
-def ensure_local_csv_path(f: FileMeta) -> str | None:
     if f.s3_path and f.s3_path.startswith("s3://"):
         try:
-            return download_s3_to_local(f.s3_path, "csv")
+            return leases.enter_context(lease_s3_cached(f.s3_path, f.checksum))
         except Exception as e:
             logger.error("CSV S3 download failed: %s", e)
 
@@ -65,12 +54,29 @@ def ensure_local_csv_path(f: FileMeta) -> str | None:
 
 def ensure_local_image_paths(f: FileMeta) -> List[str]:
     paths = []
+    if f.blob_path and os.path.exists(f.blob_path):
+        paths.append(f.blob_path)
     if f.s3_path:
         paths.append(f.s3_path)
     paths.append(os.path.join(LOCAL_UPLOAD_DIR, f.filename))
     return list(dict.fromkeys(paths))
 
 
+def _csv_source_path(f: FileMeta, leases: ExitStack) -> str | None:
+    # With a summary or columnar cache built at ingest the raw CSV is never needed
+    if f.metric_summary or (f.columnar_path and os.path.isdir(f.columnar_path)):
+        return None
+    return ensure_local_csv_path(f, leases)
+
+
+def caption_image_file(filename: str, paths: List[str], checksum: str | None = None) -> str | None:
+    for p in paths:
+        cap = extract_image_text(p, checksum=checksum).get("caption", "")
+        if cap:
+            return f"{filename}: {cap}"
+    return None
+
+
 def is_csv(f: FileMeta) -> bool:
     return f.filename.lower().endswith(".csv")
 
@@ -85,85 +91,300 @@ def is_image(f: FileMeta) -> bool:
 
 @router.post("/generate-report", response_model=ReportResponse, tags=["report"])
 def generate_report(req: ReportRequest, db: Session = Depends(get_db)):
+    return build_report(req, db)
+
 
-    upload = db.query(Upload).filter(Upload.id == req.upload_id).first()
+def _report_files(db: Session, upload_id: str) -> tuple[List[FileMeta], List[FileMeta]]:
+    upload = db.query(Upload).filter(Upload.id == upload_id).first()
     if not upload:
         raise HTTPException(404, "upload_id not found")
 
-    files = db.query(FileMeta).filter(FileMeta.upload_id == req.upload_id).all()
+    files = db.query(FileMeta).filter(FileMeta.upload_id == upload_id).all()
     if not files:
         raise HTTPException(400, "No files found")
 
-    csv_files = [f for f in files if is_csv(f)]
-    image_files = [f for f in files if is_image(f)]
+    return [f for f in files if is_csv(f)], [f for f in files if is_image(f)]
+
+
+def _start_analysis(csv_files: List[FileMeta], image_files: List[FileMeta], leases: ExitStack) -> tuple[OrderedBatch, OrderedBatch]:
+    # CSV analysis goes to worker processes and captioning to its own
+    # threads; both run at once and results keep the file order. Cached
+    # inputs stay leased until the caller closes leases after the results.
+    csv_batch = OrderedBatch(
+        get_csv_pool(settings.REPORT_CSV_PROCESSES),
+        analyze_csv,
+        [
+            (
+                f.filename, f.metric_summary, f.columnar_path, _csv_source_path(f, leases),
+                settings.STREAMING_METRICS_MIN_BYTES, settings.METRICS_CHUNK_ROWS,
+                settings.TREND_METHOD, settings.TREND_WINDOW_ROWS, settings.METRICS_MAX_PAIR_COLUMNS,
+            )
+            for f in csv_files
+        ],
+        "CSV",
+        # A lone CSV only runs inline when no caption has to overlap with it
+        inline_single=not image_files,
+    )
+    image_batch = OrderedBatch(
+        get_image_pool(settings.REPORT_IMAGE_THREADS),
+        caption_image_file,
+        [(f.filename, ensure_local_image_paths(f), f.checksum) for f in image_files],
+        "Image",
+        inline_single=not csv_files,
+    )
+    return csv_batch, image_batch
 
-    csv_summaries = []
-    for f in csv_files:
-        path = ensure_local_csv_path(f)
-        if not path:
-            continue
 
-        try:
-            df = pd.read_csv(path)
-            km = compute_key_metrics(df)
-            tr = detect_trends(df)
-            corr = compute_correlations(df)
-            summary = f"File: {f.filename}\nKey Metrics: {km}\nTrends: {tr}\nCorrelations: {corr}\n"
-            csv_summaries.append(summary)
-        except Exception as e:
-            logger.error("CSV error: %s", e)
+def _write_pdf(report_id: str, agent_out: dict) -> str | None:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    pdf_dir = os.path.abspath(os.path.join(base_dir, "..", "..", "outputs"))
+    os.makedirs(pdf_dir, exist_ok=True)
+    local_pdf = os.path.join(pdf_dir, f"{report_id}.pdf")
 
-    image_captions = []
-    for f in image_files:
-        for p in ensure_local_image_paths(f):
-            cap = extract_image_text(p).get("caption", "")
-            if cap:
-                image_captions.append(f"{f.filename}: {cap}")
-                break
+    try:
+        generate_pdf(agent_out, local_pdf)
+        pdf_path = f"/outputs/{report_id}.pdf"
+        logger.info("PDF generated: %s", pdf_path)
+        return pdf_path
+    except Exception as e:
+        logger.error("PDF generation failed: %s", e)
+        return None
 
-    logger.info("Groq Agent inputs: %d CSV + %d images", len(csv_summaries), len(image_captions))
+
+def _index_report(report_id: str, upload_id: str, agent_out: dict) -> bool:
+    # Store vectors in Qdrant
+    try:
+        texts = [agent_out.get("summary", ""), json.dumps(agent_out.get("key_metrics", {}))]
+        service = get_embedding_service()
+        vecs = service.embed(texts)
+        ids = [f"{report_id}_0", f"{report_id}_1"]
+        payloads = [{"report_id": report_id, "upload_id": upload_id, "kind": kind} for kind in ("summary", "key_metrics")]
+        qdrant.upsert(collection_name("reports", service.model), ids, vecs, payloads)
+        return True
+    except Exception as e:
+        logger.warning("Vector indexing failed for report %s: %s", report_id, e, exc_info=True)
+        return False
+
+
+def _report_body(report_id: str, agent_out: dict, pdf_path: str | None) -> dict:
+    return {
+        "report_id": report_id,
+        "summary": agent_out.get("summary", ""),
+        "key_metrics": agent_out.get("key_metrics", {}),
+        "trends": agent_out.get("trends", []),
+        "correlations": agent_out.get("correlations", []),
+        "recommendations": agent_out.get("recommendations", []),
+        "pdf_path": pdf_path,
+    }
+
+
+def build_report(req: ReportRequest, db: Session, progress: Callable[[str, int], None] | None = None) -> dict:
+    """
+    The full report pipeline: CSV metrics, image captions, LLM, PDF and
+    vector indexing. progress(stage, percent) is called between stages.
+    """
+    progress = progress or (lambda stage, pct: None)
+
+    csv_files, image_files = _report_files(db, req.upload_id)
+
+    progress("csv", 10)
+    with ExitStack() as leases:
+        csv_batch, image_batch = _start_analysis(csv_files, image_files, leases)
+
+        csv_analyses = [s for s in csv_batch.results() if s]
+        progress("images", 30)
+        image_captions = [c for c in image_batch.results() if c]
+
+    logger.info("Groq Agent inputs: %d CSV + %d images", len(csv_analyses), len(image_captions))
 
     # Generate insights via Groq + LangChain
-    agent_out = run_langchain_agent(csv_summaries, image_captions)
+    progress("llm", 50)
+    agent_out = run_langchain_agent(csv_analyses, image_captions, use_cache=req.use_llm_cache)
     report_id = str(uuid4())
     pdf_path = None
 
     # Generate PDF if requested
     if req.include_pdf:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        pdf_dir = os.path.abspath(os.path.join(base_dir, "..", "..", "outputs"))
-        os.makedirs(pdf_dir, exist_ok=True)
-        local_pdf = os.path.join(pdf_dir, f"{report_id}.pdf")
-
-        try:
-            generate_pdf(agent_out, local_pdf)
-            pdf_path = f"/outputs/{report_id}.pdf"
-            logger.info("PDF generated: %s", pdf_path)
-        except Exception as e:
-            logger.error("PDF generation failed: %s", e)
+        progress("pdf", 75)
+        pdf_path = _write_pdf(report_id, agent_out)
 
     # Save report in DB
     rep = Report(id=report_id, upload_id=req.upload_id, report_json=agent_out, pdf_path=pdf_path)
     db.add(rep)
     db.commit()
 
-    # Store vectors in Qdrant
+    progress("indexing", 90)
+    _index_report(report_id, req.upload_id, agent_out)
+
+    return _report_body(report_id, agent_out, pdf_path)
+
+
+# ------------------------
+# Streaming Report
+# ------------------------
+
+def _json_safe(value):
+    # NaN/inf are not JSON; EventSource clients would fail to parse them
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    return value
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(_json_safe(data), default=str)}\n\n"
+
+
+def _load_report_files(upload_id: str) -> tuple[List[FileMeta], List[FileMeta]]:
+    db = SessionLocal()
     try:
-        texts = [agent_out.get("summary", ""), json.dumps(agent_out.get("key_metrics", {}))]
-        vecs = generate_embeddings(texts)
-        ids = [f"{report_id}_0", f"{report_id}_1"]
-        payloads = [{"report_id": report_id}, {"report_id": report_id}]
-        qdrant.upsert("reports", ids, vecs, payloads)
-    except Exception as e:
-        logger.warning("Qdrant upsert failed: %s", e)
+        csv_files, image_files = _report_files(db, upload_id)
+        # Detached copies: the stream outlives this session
+        db.expunge_all()
+        return csv_files, image_files
+    finally:
+        db.close()
+
+
+def _save_report(report_id: str, upload_id: str, agent_out: dict, pdf_path: str | None = None):
+    db = SessionLocal()
+    try:
+        db.merge(Report(id=report_id, upload_id=upload_id, report_json=agent_out, pdf_path=pdf_path))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _finish_report(report_id: str, upload_id: str, agent_out: dict, include_pdf: bool) -> dict:
+    pdf_path = _write_pdf(report_id, agent_out) if include_pdf else None
+    if pdf_path:
+        _save_report(report_id, upload_id, agent_out, pdf_path)
+    return {"report_id": report_id, "pdf_path": pdf_path, "indexed": _index_report(report_id, upload_id, agent_out)}
+
+
+async def _report_events(req: ReportRequest, csv_files: List[FileMeta], image_files: List[FileMeta]):
+    yield _sse("start", {"upload_id": req.upload_id, "csv_files": len(csv_files), "image_files": len(image_files)})
+    with ExitStack() as leases:
+        # Resolving S3-backed CSVs downloads them; keep that off the event loop
+        csv_batch, image_batch = await run_in_threadpool(_start_analysis, csv_files, image_files, leases)
+
+        csv_analyses = []
+        results = iter(csv_batch)
+        for f in csv_files:
+            analysis = await run_in_threadpool(next, results)
+            if analysis:
+                csv_analyses.append(analysis)
+                yield _sse("metrics", analysis)
+            else:
+                yield _sse("metrics", {"file": f.filename, "error": "analysis failed"})
+
+        image_captions = []
+        results = iter(image_batch)
+        for f in image_files:
+            caption = await run_in_threadpool(next, results)
+            if caption:
+                image_captions.append(caption)
+            yield _sse("caption", {"file": f.filename, "caption": caption})
+
+    agent_out = None
+    async for kind, value in stream_langchain_agent(csv_analyses, image_captions, use_cache=req.use_llm_cache):
+        if kind == "token":
+            yield _sse("token", {"text": value})
+        else:
+            agent_out = value
+
+    report_id = str(uuid4())
+    await run_in_threadpool(_save_report, report_id, req.upload_id, agent_out)
+    yield _sse("report", _report_body(report_id, agent_out, None))
+
+    # The client already has the report; PDF and indexing are announced when done
+    done = await run_in_threadpool(_finish_report, report_id, req.upload_id, agent_out, req.include_pdf)
+    yield _sse("done", done)
+
+
+@router.post("/generate-report/stream", tags=["report"])
+async def generate_report_stream(req: ReportRequest):
+    """
+    The report pipeline as server-sent events: start, one metrics event per
+    CSV, one caption event per image, token events as the LLM writes, the
+    report itself, and done once the PDF and vector indexing have finished.
+    """
+    csv_files, image_files = await run_in_threadpool(_load_report_files, req.upload_id)
+    return StreamingResponse(
+        _report_events(req, csv_files, image_files),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ------------------------
+# Combined Metrics
+# ------------------------
+
+@router.post("/generate-report/metrics", response_model=MetricsSummaryResponse, tags=["report"])
+def combined_metrics(req: MetricsSummaryRequest, db: Session = Depends(get_db)):
+    """
+    Metrics and correlations across every CSV in the given uploads, merged
+    from the summaries stored at ingest, as if the files were concatenated
+    oldest first. No raw data is read.
+    """
+    files = (
+        db.query(FileMeta)
+        .filter(FileMeta.upload_id.in_(req.upload_ids), FileMeta.metric_summary.isnot(None))
+        .order_by(FileMeta.created_at, FileMeta.id)
+        .all()
+    )
+    if not files:
+        raise HTTPException(404, "No metric summaries found for these uploads")
 
+    acc = combine_summaries((f.metric_summary for f in files), settings.METRICS_MAX_PAIR_COLUMNS)
     return {
-        "report_id": report_id,
-        "summary": agent_out.get("summary", ""),
-        "key_metrics": agent_out.get("key_metrics", {}),
-        "trends": agent_out.get("trends", []),
-        "correlations": agent_out.get("correlations", []),
-        "recommendations": agent_out.get("recommendations", []),
-        "pdf_path": pdf_path,
+        "file_count": len(files),
+        "key_metrics": acc.key_metrics(),
+        "trends": acc.trends(settings.TREND_METHOD),
+        "correlations": acc.correlations(req.threshold),
+    }
+
+
+# ------------------------
+# Report Jobs
+# ------------------------
+
+def _run_report_job(db: Session, job: ReportJob, progress) -> dict:
+    return build_report(ReportRequest(**job.request_json), db, progress)
+
+
+jobs = JobQueue(handler=_run_report_job)
+
+
+def _job_response(job: ReportJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress or 0,
+        "error": job.error,
+        "result": job.result_json,
     }
 
+
+@router.post("/generate-report/jobs", response_model=ReportJobResponse, status_code=202, tags=["report"])
+def enqueue_report(req: ReportRequest, db: Session = Depends(get_db)):
+    if not db.query(Upload).filter(Upload.id == req.upload_id).first():
+        raise HTTPException(404, "upload_id not found")
+    try:
+        job = jobs.submit(db, req.upload_id, req.model_dump())
+    except QueueFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "5"})
+    return _job_response(job)
+
+
+@router.get("/generate-report/jobs/{job_id}", response_model=ReportJobResponse, tags=["report"])
+def get_report_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(ReportJob).filter(ReportJob.id == job_id).first()
+    if not job:
+        raise HTTPException(404, "job_id not found")
+    return _job_response(job)
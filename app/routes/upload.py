@@ -1,13 +1,20 @@
 import os
 os.makedirs("uploads", exist_ok=True)
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
 from typing import List
-import os, time, hashlib
+import asyncio, os, shutil, time
+from collections import Counter
 from uuid import uuid4
 from app.schemas import UploadResponse, FileInfo
 from app.db.database import get_db
 from app.db.models import Upload, FileMeta
-from app.services.s3_client import upload_to_s3
+from app.services.s3_client import upload_to_s3_async
+from app.services.storage import stream_upload_to_disk, commit_blob, find_stored_s3_path, find_ingested, INCOMING_DIR
+from app.services.analysis import ingest_csv
+from app.services.caption_cache import warm_captions
+from app.ai.image_prep import cache_prepared_image
+from app.config import settings
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.logger import logger
 
@@ -15,26 +22,121 @@ router = APIRouter()
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(INCOMING_DIR, exist_ok=True)
 
 @router.post("/upload", response_model=UploadResponse, tags=["upload"])
-async def upload_files(csv_files: List[UploadFile] = File(None), image_files: List[UploadFile] = File(None), db: Session = Depends(get_db)):
+async def upload_files(background_tasks: BackgroundTasks, csv_files: List[UploadFile] = File(None), image_files: List[UploadFile] = File(None), db: Session = Depends(get_db)):
     files = []
     upload_id = str(uuid4())
     db.add(Upload(id=upload_id, metadata={}))
     db.commit()
-    for f in (csv_files or []) + (image_files or []):
-        ts = str(int(time.time()*1000))
-        fname = f"{ts}_{f.filename}"
-        out = os.path.join(UPLOAD_DIR, fname)
-        contents = await f.read()
-        with open(out, "wb") as fh:
-            fh.write(contents)
-        checksum = hashlib.sha256(contents).hexdigest()
-        s3_path = upload_to_s3(out, key=f"{upload_id}/{fname}")
-        size = len(contents)
-        fm = FileMeta(id=str(uuid4()), upload_id=upload_id, filename=fname, s3_path=s3_path, file_type=f.content_type, checksum=checksum, size=size)
-        db.add(fm)
+    remaining = settings.MAX_UPLOAD_REQUEST_BYTES
+    stored = []
+    s3_paths = {}
+    pending = {}
+    claimed = []
+    new_files = []
+    try:
+        for f in (csv_files or []) + (image_files or []):
+            ts = str(int(time.time()*1000))
+            fname = f"{ts}_{f.filename}"
+            incoming = os.path.join(INCOMING_DIR, str(uuid4()))
+            size, checksum = await stream_upload_to_disk(f, incoming, max_bytes=min(settings.MAX_UPLOAD_FILE_BYTES, remaining))
+            remaining -= size
+            blob_path, created = commit_blob(incoming, checksum)
+            _in_use[checksum] += 1
+            claimed.append(checksum)
+            new_files.append((checksum, blob_path if created else None))
+            # Identical content is stored and pushed to S3 only once; the PUTs
+            # for this request run in parallel while the next file streams in
+            if checksum not in s3_paths and checksum not in pending:
+                prior = find_stored_s3_path(db, checksum)
+                if prior:
+                    s3_paths[checksum] = prior
+                else:
+                    pending[checksum] = asyncio.ensure_future(upload_to_s3_async(blob_path, key=f"blobs/{checksum}"))
+            columnar_path, summary = None, None
+            if fname.lower().endswith(".csv"):
+                prior = find_ingested(db, checksum)
+                if prior:
+                    columnar_path, summary = prior.columnar_path, prior.metric_summary
+                else:
+                    columnar_path, summary = await _ingest_csv(blob_path)
+                    new_files.append((checksum, columnar_path))
+            stored.append((f, fname, checksum, blob_path, columnar_path, summary, size, created))
+
+        s3_paths.update(zip(pending, await asyncio.gather(*pending.values())))
+
+        for f, fname, checksum, blob_path, columnar_path, summary, size, created in stored:
+            s3_path = s3_paths[checksum]
+            fm = FileMeta(id=str(uuid4()), upload_id=upload_id, filename=fname, s3_path=s3_path, file_type=f.content_type, checksum=checksum, blob_path=blob_path, columnar_path=columnar_path, metric_summary=summary, size=size)
+            db.add(fm)
+            files.append(FileInfo(filename=fname, content_type=f.content_type, size=size, s3_path=s3_path, checksum=checksum))
+            logger.info("Saved file %s as blob %s (size=%d, new=%s)", fname, blob_path, size, created)
+        db.commit()
+    except Exception:
+        # A 413, an S3 error or a DB failure: undo the whole upload
+        for task in pending.values():
+            task.cancel()
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+        db.rollback()
+        db.query(Upload).filter(Upload.id == upload_id).delete()
         db.commit()
-        files.append(FileInfo(filename=fname, content_type=f.content_type, size=size, s3_path=s3_path, checksum=checksum))
-        logger.info("Saved file %s (size=%d)", out, size)
+        _release(db, claimed, new_files)
+        raise
+    _release(db, claimed)
+
+    # Shrink new images to model size, and optionally caption them, after
+    # the response so the first report finds both cached
+    images = {checksum: blob_path for _, fname, checksum, blob_path, *_ in stored if fname.lower().endswith((".png", ".jpg", ".jpeg"))}
+    if images and settings.IMAGE_PREP_ON_UPLOAD:
+        for blob_path in images.values():
+            background_tasks.add_task(_prepare_image, blob_path)
+    if images and settings.CAPTION_WARMUP_ON_UPLOAD:
+        background_tasks.add_task(warm_captions, [(p, c) for c, p in images.items()])
     return {"upload_id": upload_id, "files": files}
+
+
+# Checksums of blobs that uploads in this process are still working with, so
+# a failing upload does not delete content a concurrent one just deduplicated
+_in_use: Counter = Counter()
+
+
+def _release(db: Session, claimed: list, remove: list | None = None):
+    """
+    Drop this upload's claims, then delete the (checksum, path) blobs and
+    columnar caches in remove that nothing else uses or references.
+    """
+    for checksum in claimed:
+        _in_use[checksum] -= 1
+        if _in_use[checksum] <= 0:
+            del _in_use[checksum]
+    for checksum, path in remove or []:
+        if not path or checksum in _in_use or db.query(FileMeta).filter(FileMeta.checksum == checksum).first():
+            continue
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning("Could not remove %s after a failed upload: %s", path, e)
+
+
+def _prepare_image(blob_path: str):
+    try:
+        cache_prepared_image(blob_path)
+    except Exception as e:
+        logger.warning("Image prep failed for %s: %s", blob_path, e)
+
+
+async def _ingest_csv(blob_path: str) -> tuple[str | None, bytes | None]:
+    # Parse once at ingest so reports never re-read the CSV text
+    try:
+        return await run_in_threadpool(
+            ingest_csv, blob_path, settings.STREAMING_METRICS_MIN_BYTES, settings.METRICS_CHUNK_ROWS,
+            settings.METRICS_MAX_PAIR_COLUMNS,
+        )
+    except Exception as e:
+        logger.warning("CSV ingest failed for %s: %s", blob_path, e)
+        return None, None
@@ -15,6 +15,8 @@ class UploadResponse(BaseModel):
 class ReportRequest(BaseModel):
     upload_id: str
     include_pdf: bool = False
+    # False forces a fresh LLM call; the new response still replaces the cached one
+    use_llm_cache: bool = True
 
 class KeyMetric(BaseModel):
     name: str
@@ -39,3 +41,21 @@ class ReportResponse(BaseModel):
     correlations: List[str]
     recommendations: List[str]
     pdf_path: Optional[str] = None
+
+class ReportJobResponse(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    progress: int = 0
+    error: Optional[str] = None
+    result: Optional[ReportResponse] = None
+
+class MetricsSummaryRequest(BaseModel):
+    upload_ids: List[str]
+    threshold: float = 0.5
+
+class MetricsSummaryResponse(BaseModel):
+    file_count: int
+    key_metrics: Dict[str, Any]
+    trends: List[Dict[str, Any]]
+    correlations: List[Dict[str, Any]]
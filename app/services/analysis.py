@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.services.columnar import build_columnar_cache, load_numeric_frame, load_time_axis
+from app.utils.metrics import compute_all_metrics
+from app.utils.trends import regression_trends
+from app.utils.streaming_metrics import MAX_PAIR_COLUMNS, MetricsAccumulator, stream_csv_metrics, summarize_csv
+
+import logging
+logger = logging.getLogger("datalens")
+
+_lock = threading.Lock()
+_csv_pool: ProcessPoolExecutor | None = None
+_image_pool: ThreadPoolExecutor | None = None
+
+
+def analyze_csv(
+    filename: str,
+    summary: Optional[bytes],
+    columnar_path: Optional[str],
+    local_path: Optional[str],
+    streaming_min_bytes: Optional[int] = None,
+    chunk_rows: int = 100_000,
+    trend_method: str = "endpoints",
+    trend_window: Optional[int] = None,
+    max_pair_columns: int = MAX_PAIR_COLUMNS,
+) -> Optional[dict]:
+    """
+    Metrics, trends and correlations for one CSV as a plain dict (file,
+    key_metrics, trends, correlations); app.ai.prompt_builder renders it for
+    the LLM. Runs in a worker process, so it only takes and returns plain
+    values. A summary stored at ingest answers without touching rows;
+    raw CSVs of streaming_min_bytes or more are read in chunk_rows blocks so
+    memory stays constant.
+
+    trend_method="regression" fits a least-squares slope per column;
+    trend_window adds the slope over the trailing rows. That needs the rows,
+    so with a window the columnar cache is read in preference to the stored
+    summary; files too large to have one get full-range fits only.
+    Summaries and streamed files wider than max_pair_columns numeric columns
+    come back without correlations.
+    """
+    windowed = trend_method == "regression" and trend_window and columnar_path and os.path.isdir(columnar_path)
+    if summary and not windowed:
+        acc = MetricsAccumulator.from_bytes(summary, max_pair_columns)
+        km, tr, corr = acc.key_metrics(), acc.trends(trend_method), acc.correlations()
+        return {"file": filename, "key_metrics": km, "trends": tr, "correlations": corr}
+    x, axis = None, None
+    if columnar_path and os.path.isdir(columnar_path):
+        df = load_numeric_frame(columnar_path)
+        x, axis = load_time_axis(columnar_path)
+        if x is None:
+            x = np.arange(len(df), dtype="float64")
+    elif local_path and streaming_min_bytes is not None and os.path.getsize(local_path) >= streaming_min_bytes:
+        km, tr, corr = stream_csv_metrics(
+            local_path, chunk_rows=chunk_rows, trend_method=trend_method, max_pair_columns=max_pair_columns
+        )
+        return {"file": filename, "key_metrics": km, "trends": tr, "correlations": corr}
+    elif local_path:
+        df = pd.read_csv(local_path)
+    else:
+        return None
+
+    km, tr, corr = compute_all_metrics(df)
+    if trend_method == "regression":
+        tr = regression_trends(df, window=trend_window, x=x, axis=axis)
+    return {"file": filename, "key_metrics": km, "trends": tr, "correlations": corr}
+
+
+def ingest_csv(
+    blob_path: str,
+    streaming_min_bytes: int,
+    chunk_rows: int = 100_000,
+    max_pair_columns: int = MAX_PAIR_COLUMNS,
+) -> tuple[Optional[str], bytes]:
+    """
+    One parse of a freshly stored CSV yields both its columnar cache and its
+    mergeable metric summary. Files of streaming_min_bytes or more get only
+    the summary, built chunk by chunk.
+    """
+    if os.path.getsize(blob_path) >= streaming_min_bytes:
+        return None, summarize_csv(blob_path, chunk_rows, max_pair_columns).to_bytes()
+
+    df = pd.read_csv(blob_path)
+    columnar_path = build_columnar_cache(blob_path, df=df)
+    return columnar_path, MetricsAccumulator(max_pair_columns).update(df).to_bytes()
+
+
+def get_csv_pool(processes: int) -> ProcessPoolExecutor:
+    global _csv_pool
+    with _lock:
+        if _csv_pool is None:
+            # spawn keeps children clear of the parent's threads and locks
+            _csv_pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        return _csv_pool
+
+
+def _discard_csv_pool():
+    global _csv_pool
+    with _lock:
+        if _csv_pool is not None:
+            _csv_pool.shutdown(wait=False, cancel_futures=True)
+            _csv_pool = None
+
+
+def get_image_pool(threads: int) -> ThreadPoolExecutor:
+    global _image_pool
+    with _lock:
+        if _image_pool is None:
+            _image_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="caption")
+        return _image_pool
+
+
+class OrderedBatch:
+    """
+    Fan jobs out to a pool straight away and hand results back in submission
+    order, so output stays deterministic however the workers finish. A
+    failing job logs and yields None instead of sinking the rest.
+
+    With inline_single a lone job runs in the consuming thread when its
+    result is read, skipping the hop to a worker. Only pass it when nothing
+    else is meant to run alongside, since the job then starts late.
+    """
+
+    def __init__(self, pool, fn: Callable, jobs: Sequence[tuple], label: str, inline_single: bool = False):
+        self.fn = fn
+        self.jobs = list(jobs)
+        self.label = label
+        if inline_single and len(self.jobs) == 1:
+            self.futures = [None]
+        else:
+            self.futures = [pool.submit(fn, *args) for args in self.jobs]
+
+    def __iter__(self):
+        """Each result as soon as it and everything before it are done."""
+        for args, fut in zip(self.jobs, self.futures):
+            try:
+                yield fut.result() if fut else self.fn(*args)
+            except BrokenProcessPool as e:
+                # A dead worker poisons the whole pool: drop it and do this
+                # job in-process rather than fail the report
+                logger.warning("%s worker pool broke, running inline: %s", self.label, e)
+                _discard_csv_pool()
+                try:
+                    yield self.fn(*args)
+                except Exception as e:
+                    logger.error("%s error: %s", self.label, e)
+                    yield None
+            except Exception as e:
+                logger.error("%s error: %s", self.label, e)
+                yield None
+
+    def results(self) -> List:
+        return list(self)
@@ -0,0 +1,40 @@
+from sqlalchemy.exc import IntegrityError
+
+from app.ai.models import caption_cache_key
+from app.db.database import SessionLocal
+from app.db.models import CaptionCache
+import logging
+logger = logging.getLogger("datalens")
+
+
+def get_cached_caption(checksum: str) -> str | None:
+    model, params = caption_cache_key()
+    db = SessionLocal()
+    try:
+        row = db.get(CaptionCache, (checksum, model, params))
+        return row.caption if row else None
+    finally:
+        db.close()
+
+
+def store_caption(checksum: str, caption: str):
+    model, params = caption_cache_key()
+    db = SessionLocal()
+    try:
+        db.add(CaptionCache(checksum=checksum, model=model, params=params, caption=caption))
+        db.commit()
+    except IntegrityError:
+        # Another worker captioned the same image first
+        db.rollback()
+    finally:
+        db.close()
+
+
+def warm_captions(images: list[tuple[str, str]]):
+    """Caption (path, checksum) pairs ahead of any report; run as a background task."""
+    from app.ai.vision import extract_image_text
+
+    for path, checksum in images:
+        if get_cached_caption(checksum) is None:
+            extract_image_text(path, checksum=checksum)
+    logger.info("Caption warm-up done for %d images", len(images))
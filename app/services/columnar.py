@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+from typing import List, Optional
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+
+from app.utils.trends import find_time_column, time_values
+
+import logging
+logger = logging.getLogger("datalens")
+
+COLUMNAR_SUFFIX = ".cols"
+COLUMNAR_VERSION = 2
+
+
+def columnar_path_for(blob_path: str) -> str:
+    return blob_path + COLUMNAR_SUFFIX
+
+
+def build_columnar_cache(csv_path: str, out_dir: str | None = None, df: pd.DataFrame | None = None) -> str:
+    """
+    Parse a CSV once and store its numeric columns as a Fortran-ordered
+    float64 .npy matrix (one contiguous run per column) plus a manifest.
+    A detected date column is kept as time.npy (days since the epoch) for
+    regression trends. The artifact lives next to the blob and is reused if
+    it already exists. Pass df when the CSV has already been parsed.
+    """
+    out_dir = out_dir or columnar_path_for(csv_path)
+    if os.path.exists(os.path.join(out_dir, "manifest.json")):
+        return out_dir
+
+    if df is None:
+        df = pd.read_csv(csv_path)
+    num = df.select_dtypes(include=["number"])
+    matrix = np.asfortranarray(num.to_numpy(dtype="float64", na_value=np.nan))
+    time_column = find_time_column(df)
+
+    part_dir = f"{out_dir}.{uuid4().hex}.part"
+    os.makedirs(part_dir)
+    try:
+        np.save(os.path.join(part_dir, "numeric.npy"), matrix)
+        if time_column is not None:
+            np.save(os.path.join(part_dir, "time.npy"), time_values(df[time_column]))
+        manifest = {
+            "version": COLUMNAR_VERSION,
+            "row_count": int(len(df)),
+            "column_count": int(len(df.columns)),
+            "numeric_columns": [str(c) for c in num.columns],
+            "time_column": None if time_column is None else str(time_column),
+        }
+        with open(os.path.join(part_dir, "manifest.json"), "w") as fh:
+            json.dump(manifest, fh)
+        os.replace(part_dir, out_dir)
+    except OSError:
+        # Another ingest finished the same blob first; keep theirs
+        shutil.rmtree(part_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(out_dir, "manifest.json")):
+            raise
+
+    logger.info("Built columnar cache %s (%d rows, %d numeric columns)", out_dir, len(df), num.shape[1])
+    return out_dir
+
+
+def load_manifest(path: str) -> dict:
+    with open(os.path.join(path, "manifest.json")) as fh:
+        return json.load(fh)
+
+
+def load_numeric_frame(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Memory-map the numeric block of a columnar cache and wrap it in a
+    DataFrame without copying. Only the requested columns' pages are touched.
+    The original table's row/column counts travel in df.attrs.
+    """
+    manifest = load_manifest(path)
+    matrix = np.load(os.path.join(path, "numeric.npy"), mmap_mode="r")
+    names = manifest["numeric_columns"]
+    wanted = names if columns is None else [c for c in columns if c in names]
+    index = {c: i for i, c in enumerate(names)}
+
+    df = pd.DataFrame({c: matrix[:, index[c]] for c in wanted}, index=pd.RangeIndex(manifest["row_count"]), copy=False)
+    df.attrs["row_count"] = manifest["row_count"]
+    df.attrs["column_count"] = manifest["column_count"]
+    return df
+
+
+def load_time_axis(path: str) -> tuple[Optional[np.ndarray], Optional[str]]:
+    """The stored time axis and its column name, or (None, None)."""
+    column = load_manifest(path).get("time_column")
+    if column is None:
+        return None, None
+    return np.load(os.path.join(path, "time.npy"), mmap_mode="r"), column
+
+
+def read_csv_frame(path: str) -> pd.DataFrame:
+    """Use the columnar cache next to a CSV when there is one, else parse it."""
+    cols = columnar_path_for(path)
+    if os.path.exists(os.path.join(cols, "manifest.json")):
+        return load_numeric_frame(cols)
+    return pd.read_csv(path)
@@ -1,21 +1,205 @@
+"""
+The one place texts become vectors. EmbeddingService looks each text up by
+SHA-256 in an in-process LRU and then the embedding_cache table, and only
+encodes what neither holds. Misses from concurrent callers are grouped by a
+MicroBatcher into single encode() calls. Vectors stay float32 NumPy from the
+model to the vector store; nothing is converted to Python lists on the way.
+
+The encoder is the model server when MODEL_SERVER_SOCKET is set, else
+sentence-transformers in-process. If sentence-transformers cannot load, a
+deterministic hash embedding keeps the pipeline running. A configured model
+server that does not answer is an error instead (it is often still loading
+weights), and the service is built again on the next call.
+
+Vectors from different models are not comparable, so vector collections are
+named per model with collection_name().
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Sequence
+
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from sqlalchemy.exc import IntegrityError
+
 from app.config import settings
+from app.ai import models
+from app.db.database import SessionLocal
+from app.db.models import EmbeddingCache
+from app.services.model_server import get_model_client
+from app.utils.batching import MicroBatcher
+import logging
+logger = logging.getLogger("datalens")
+
+HASH_EMBEDDING_DIM = 384
+HASH_MODEL = "sha256-fallback"
+PROBE_ATTEMPTS = 3
+PROBE_BACKOFF_S = 0.5
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def collection_name(base: str, model: str) -> str:
+    """base suffixed with model, so one collection never mixes vectors from two models."""
+    return f"{base}-{re.sub(r'[^A-Za-z0-9]+', '-', model).strip('-').lower()}"
+
+
+def hash_embed(texts: Sequence[str]) -> np.ndarray:
+    """Unit-norm vectors from each text's SHA-256 digest, tiled to 384 dims."""
+    digests = np.frombuffer(b"".join(hashlib.sha256(t.encode()).digest() for t in texts), dtype=np.uint8)
+    base = digests.reshape(len(texts), 32).astype(np.float32)
+    vecs = np.tile(base, HASH_EMBEDDING_DIM // 32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-9
+    return vecs
+
+
+class EmbeddingService:
+    """
+    Cached, batched front for an encoder. embed() returns a C-contiguous
+    (len(texts), dim) float32 array in input order; duplicate texts within a
+    call are encoded once.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[list], np.ndarray],
+        model: str,
+        max_batch: int,
+        max_wait: float,
+        cache_entries: int,
+        persist: bool = True,
+        timeout: float | None = None,
+    ):
+        self.encode = encode
+        self.model = model
+        self.cache_entries = cache_entries
+        self.persist = persist
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.encoded = 0
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._batcher = MicroBatcher(self._run_batch, max_batch, max_wait, name="embed-batcher", timeout=timeout)
+
+    def _run_batch(self, items: list) -> list:
+        # One DB lookup, one encode() and one commit for everything in the batch
+        todo = dict(items)
+        found = self._load(list(todo)) if self.persist else {}
+        missing = [key for key in todo if key not in found]
+        if missing:
+            vecs = np.ascontiguousarray(self.encode([todo[key] for key in missing]), dtype=np.float32)
+            fresh = dict(zip(missing, vecs))
+            if self.persist:
+                self._store(fresh)
+            found.update(fresh)
+        with self._lock:
+            self.db_hits += len(todo) - len(missing)
+            self.encoded += len(missing)
+        return [found[key] for key, _ in items]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        keys = [text_hash(t) for t in texts]
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vec
+            self.memory_hits += len(found)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            futures = {key: self._batcher.submit((key, text)) for key, text in missing.items()}
+            fresh = {key: fut.result(timeout=self._batcher.timeout) for key, fut in futures.items()}
+            self._remember(fresh)
+            found.update(fresh)
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def _remember(self, vecs: dict):
+        with self._lock:
+            for key, vec in vecs.items():
+                vec.flags.writeable = False
+                self._lru[key] = vec
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.cache_entries:
+                self._lru.popitem(last=False)
+
+    def _load(self, keys: list[str]) -> dict:
+        db = SessionLocal()
+        try:
+            rows = db.query(EmbeddingCache).filter(EmbeddingCache.model == self.model, EmbeddingCache.text_hash.in_(keys)).all()
+            return {row.text_hash: np.frombuffer(row.vector, dtype=np.float32) for row in rows}
+        finally:
+            db.close()
+
+    def _store(self, vecs: dict):
+        db = SessionLocal()
+        try:
+            db.add_all(EmbeddingCache(text_hash=key, model=self.model, vector=vec.tobytes()) for key, vec in vecs.items())
+            db.commit()
+        except IntegrityError:
+            # Another worker stored some of them first; keep the rest
+            db.rollback()
+            for key, vec in vecs.items():
+                db.merge(EmbeddingCache(text_hash=key, model=self.model, vector=vec.tobytes()))
+            db.commit()
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"memory_hits": self.memory_hits, "db_hits": self.db_hits, "encoded": self.encoded, "entries": len(self._lru)}
+
+
+def _default_encoder() -> tuple[Callable[[list], np.ndarray], str]:
+    # Probe with a real call: an installed package is no use if the model
+    # cannot load (no HF cache offline) or the server is down
+    client = get_model_client()
+    if client:
+        for attempt in range(PROBE_ATTEMPTS):
+            try:
+                client.embed(["ping"])
+                return client.embed, settings.EMBEDDING_MODEL
+            except Exception as e:
+                if attempt == PROBE_ATTEMPTS - 1:
+                    raise RuntimeError(f"Model server embeddings unavailable: {e}") from e
+                logger.warning("Model server embeddings unavailable, retrying: %s", e)
+                time.sleep(PROBE_BACKOFF_S * 2 ** attempt)
+    try:
+        models.get_sentence_model()
+        return models.embed_local, settings.EMBEDDING_MODEL
+    except Exception as e:
+        logger.info("sentence-transformers not available, using hash embeddings: %s", e)
+        return hash_embed, HASH_MODEL
 
-_model = None
 
-def get_model():
-    global _model
-    if _model is None:
-        _model = SentenceTransformer(settings.EMBEDDING_MODEL)
-    return _model
+_service: EmbeddingService | None = None
+_service_lock = threading.Lock()
 
 
-def generate_embeddings(texts: list[str]) -> list[list[float]]:
-    if not texts:
-        return []
+def get_embedding_service() -> EmbeddingService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            encode, model = _default_encoder()
+            _service = EmbeddingService(
+                encode,
+                model,
+                settings.EMBED_MAX_BATCH,
+                settings.EMBED_MAX_WAIT_MS / 1000,
+                settings.EMBED_CACHE_ENTRIES,
+                timeout=settings.BATCH_TIMEOUT_S,
+            )
+        return _service
 
-    model = get_model()
-    emb = model.encode(texts, convert_to_numpy=True)
 
-    return emb.tolist()
+def generate_embeddings(texts: Sequence[str]) -> np.ndarray:
+    return get_embedding_service().embed(texts)
@@ -0,0 +1,105 @@
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.db.database import SessionLocal
+from app.db.models import LLMResponse
+import logging
+logger = logging.getLogger("datalens")
+
+
+def llm_cache_key(model: str, temperature: float, max_tokens: int, prompt: str) -> str:
+    """Content address of one LLM call: identical inputs give identical keys."""
+    params = json.dumps({"model": model, "temperature": temperature, "max_tokens": max_tokens}, sort_keys=True)
+    return hashlib.sha256(f"{params}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache of parsed LLM responses. An in-process LRU of max_entries
+    answers repeats without touching the DB; the llm_responses table shares
+    results across workers and restarts. Entries older than ttl seconds are
+    ignored in both tiers and replaced on the next store.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lru: OrderedDict[str, tuple[datetime, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh(self, created_at: datetime) -> bool:
+        return datetime.utcnow() - created_at < timedelta(seconds=self.ttl)
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry and self._fresh(entry[0]):
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return copy.deepcopy(entry[1])
+            if entry:
+                del self._lru[key]
+
+        db = SessionLocal()
+        try:
+            row = db.get(LLMResponse, key)
+            hit = row is not None and self._fresh(row.created_at)
+            if hit:
+                self._remember(key, row.created_at, row.response)
+            response = row.response if hit else None
+        finally:
+            db.close()
+
+        with self._lock:
+            if hit:
+                self.db_hits += 1
+            else:
+                self.misses += 1
+                self.expired += row is not None
+        return response
+
+    def put(self, key: str, model: str, response: dict):
+        now = datetime.utcnow()
+        self._remember(key, now, response)
+        db = SessionLocal()
+        try:
+            # merge() replaces an expired row with the same key
+            db.merge(LLMResponse(key=key, model=model, response=response, created_at=now))
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same response first
+            db.rollback()
+        finally:
+            db.close()
+
+    def _remember(self, key: str, created_at: datetime, response: dict):
+        with self._lock:
+            # A private copy: callers may mutate what get() or put() handed them
+            self._lru[key] = (created_at, copy.deepcopy(response))
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "entries": len(self._lru),
+            }
+
+
+llm_cache = LLMResponseCache(settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL_S)
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import random
+import threading
+from concurrent.futures import Future
+
+import httpx
+
+from app.config import settings
+import logging
+logger = logging.getLogger("datalens")
+
+# Worth retrying: rate limited, or the provider is overloaded / restarting
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class LLMGateway:
+    """
+    One shared client for OpenAI-compatible chat completions (Groq by
+    default). All calls run on a private event loop thread that owns a
+    keep-alive httpx.AsyncClient and a semaphore, so every thread and event
+    loop in the process shares one connection pool and at most
+    max_concurrency requests are in flight. A call may pass its own api_key
+    in place of the gateway's. Each call has a deadline that covers retries; 429 and 5xx responses and transport errors are retried
+    with full-jitter exponential backoff, honouring Retry-After.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str | None,
+        max_concurrency: int,
+        timeout: float,
+        max_retries: int,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._sem: asyncio.Semaphore | None = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _open(self):
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        self._client = httpx.AsyncClient(base_url=self.base_url, headers=headers, limits=limits)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+
+    def submit(
+        self,
+        messages: list[dict],
+        model: str,
+        temperature: float = 0.0,
+        max_tokens: int | None = None,
+        timeout: float | None = None,
+        api_key: str | None = None,
+    ) -> Future:
+        """Schedule a completion on the gateway loop; safe from any thread."""
+        loop = self._ensure_started()
+        coro = self._complete(messages, model, temperature, max_tokens, timeout or self.timeout, _auth(api_key))
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    async def chat(self, messages: list[dict], model: str, **kwargs) -> str:
+        """Completion text, awaitable from any event loop without blocking it."""
+        return await asyncio.wrap_future(self.submit(messages, model, **kwargs))
+
+    def chat_sync(self, messages: list[dict], model: str, **kwargs) -> str:
+        return self.submit(messages, model, **kwargs).result()
+
+    async def stream(
+        self,
+        messages: list[dict],
+        model: str,
+        temperature: float = 0.0,
+        max_tokens: int | None = None,
+        timeout: float | None = None,
+        api_key: str | None = None,
+    ):
+        """
+        Async iterator over completion text deltas, usable from any event
+        loop. Same pool, cap and deadline as chat(); retries happen only
+        before the first delta, since a half-streamed answer cannot be
+        replayed.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        coro = self._stream(messages, model, temperature, max_tokens, timeout or self.timeout, _auth(api_key), emit)
+        fut = asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            fut.cancel()
+
+    def _delay(self, attempt: int, resp: httpx.Response | None) -> float:
+        retry_after = resp.headers.get("retry-after") if resp is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def _complete(self, messages, model, temperature, max_tokens, timeout, headers) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        payload = {"model": model, "messages": messages, "temperature": temperature}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+
+        async with self._sem:
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                resp, error = None, None
+                try:
+                    resp = await self._client.post("/chat/completions", json=payload, headers=headers, timeout=remaining)
+                except httpx.TransportError as e:
+                    error = e
+                else:
+                    if resp.status_code not in RETRY_STATUSES:
+                        if resp.is_error:
+                            raise LLMError(f"LLM call failed with {resp.status_code}: {resp.text[:200]}")
+                        return resp.json()["choices"][0]["message"]["content"] or ""
+                    error = LLMError(f"LLM call failed with {resp.status_code}")
+
+                if attempt == self.max_retries:
+                    raise error
+                delay = self._delay(attempt, resp)
+                if loop.time() + delay >= deadline:
+                    break
+                logger.warning("LLM call attempt %d failed (%s), retrying in %.2fs", attempt + 1, error, delay)
+                await asyncio.sleep(delay)
+        raise LLMError(f"LLM call exceeded its {timeout:.0f}s deadline")
+
+    async def _stream(self, messages, model, temperature, max_tokens, timeout, headers, emit):
+        payload = {"model": model, "messages": messages, "temperature": temperature, "stream": True}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        started = False
+        try:
+            async with asyncio.timeout(timeout), self._sem:
+                for attempt in range(self.max_retries + 1):
+                    resp, error = None, None
+                    try:
+                        async with self._client.stream("POST", "/chat/completions", json=payload, headers=headers, timeout=timeout) as resp:
+                            if resp.status_code not in RETRY_STATUSES:
+                                if resp.is_error:
+                                    await resp.aread()
+                                    raise LLMError(f"LLM call failed with {resp.status_code}: {resp.text[:200]}")
+                                async for line in resp.aiter_lines():
+                                    if not line.startswith("data:"):
+                                        continue
+                                    data = line[5:].strip()
+                                    if data == "[DONE]":
+                                        break
+                                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                                    if delta:
+                                        started = True
+                                        emit(("delta", delta))
+                                emit(("end", None))
+                                return
+                            error = LLMError(f"LLM call failed with {resp.status_code}")
+                    except httpx.TransportError as e:
+                        if started:
+                            raise
+                        error = e
+                    if attempt == self.max_retries:
+                        raise error
+                    delay = self._delay(attempt, resp)
+                    logger.warning("LLM stream attempt %d failed (%s), retrying in %.2fs", attempt + 1, error, delay)
+                    await asyncio.sleep(delay)
+        except TimeoutError:
+            emit(("error", LLMError(f"LLM call exceeded its {timeout:.0f}s deadline")))
+        except Exception as e:
+            emit(("error", e))
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+
+def _auth(api_key: str | None) -> dict | None:
+    """Per-request headers overriding the gateway's key, if one was given."""
+    return {"Authorization": f"Bearer {api_key}"} if api_key else None
+
+
+_gateway: LLMGateway | None = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(
+                settings.LLM_BASE_URL,
+                settings.GROQ_API_KEY,
+                settings.LLM_MAX_CONCURRENCY,
+                settings.LLM_TIMEOUT_S,
+                settings.LLM_MAX_RETRIES,
+            )
+        return _gateway
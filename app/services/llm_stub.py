@@ -0,0 +1,133 @@
+"""
+Offline stand-in for an OpenAI-compatible chat-completions API, for tests
+and local runs without a Groq key:
+
+    python -m app.services.llm_stub --port 8089
+    LLM_BASE_URL=http://127.0.0.1:8089/v1 uvicorn app.main:app
+
+Every completion returns `reply` (a minimal valid report by default),
+streamed in small chunked SSE deltas when the request sets "stream". The
+first `fail_first` requests get `fail_status` with Retry-After: 0, and each
+request can be slowed by `delay` seconds to exercise deadlines and limits.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = json.dumps({
+    "summary": "Stub report.",
+    "key_metrics": {},
+    "trends": [],
+    "correlations": [],
+    "recommendations": [],
+})
+
+
+class ChatCompletionsStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reply: str = DEFAULT_REPLY, fail_first: int = 0, fail_status: int = 429, delay: float = 0.0):
+        self.reply = reply
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.delay = delay
+        self.requests: list[dict] = []
+        self.auth: list[str | None] = []
+        self.clients: set[tuple] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so clients can reuse connections
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict | None = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, n: int):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                pieces = [stub.reply[i:i + 8] for i in range(0, len(stub.reply), 8)]
+                events = [{"id": f"stub-{n}", "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": p}}]} for p in pieces]
+                for data in [json.dumps(e) for e in events] + ["[DONE]"]:
+                    chunk = f"data: {data}\n\n".encode()
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    return self._send(404, {"error": {"message": f"no route {self.path}"}})
+                with stub._lock:
+                    stub.requests.append(body)
+                    stub.auth.append(self.headers.get("Authorization"))
+                    stub.clients.add(self.client_address)
+                    n = len(stub.requests)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    if n <= stub.fail_first:
+                        return self._send(stub.fail_status, {"error": {"message": "stub failure"}}, {"Retry-After": "0"})
+                    if body.get("stream"):
+                        return self._stream(n)
+                    self._send(200, {
+                        "id": f"stub-{n}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": stub.reply}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+        return Handler
+
+    def start(self) -> "ChatCompletionsStub":
+        threading.Thread(target=self.server.serve_forever, name="llm-stub", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--delay", type=float, default=0.0)
+    args = ap.parse_args()
+    stub = ChatCompletionsStub(args.host, args.port, delay=args.delay)
+    print(f"Chat completions stub on {stub.url}")
+    stub.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Local model server: one process holds the BLIP and sentence-transformer
+weights and every API worker on the box calls it over a Unix socket, so N
+uvicorn workers cost one copy of the models instead of N.
+
+    python -m app.services.model_server          # listens on MODEL_SERVER_SOCKET
+    MODEL_SERVER_SOCKET=/tmp/datalens-models.sock uvicorn app.main:app --workers 4
+
+Messages are a 4-byte big-endian length followed by UTF-8 JSON. Images are
+passed by path (server and workers share the filesystem), never by value;
+embeddings come back as base64 float32 bytes rather than JSON number lists.
+Caption requests from all workers meet in one CaptionBatcher here, so they
+are batched across requests as well as within one.
+"""
+import base64
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.ai import captioning, models
+from app.logger import logger
+
+_HEADER = struct.Struct(">I")
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+def _send(sock: socket.socket, payload: dict):
+    body = json.dumps(payload).encode()
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Model server connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv(sock: socket.socket) -> dict:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+def _pack_array(arr) -> dict:
+    arr = np.ascontiguousarray(arr, dtype=np.float32)
+    return {"shape": list(arr.shape), "data": base64.b64encode(arr.tobytes()).decode("ascii")}
+
+
+def _unpack_array(packed: dict) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(packed["data"]), dtype=np.float32).reshape(packed["shape"])
+
+
+# ------------------------
+# Server
+# ------------------------
+
+_OPS = {
+    "caption": lambda req: captioning.caption_local(req["path"]),
+    "embed": lambda req: _pack_array(models.embed_local(req["texts"])),
+    "ping": lambda req: "pong",
+}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # A connection may carry several requests; it ends when the client hangs up
+        while True:
+            try:
+                req = _recv(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                result = _OPS[req["op"]](req)
+                _send(self.request, {"ok": True, "result": result})
+            except Exception as e:
+                logger.exception("Model server %s failed: %s", req.get("op"), e)
+                _send(self.request, {"ok": False, "error": str(e)})
+
+
+class ModelServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, preload: bool = True):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        if preload:
+            models.get_blip()
+            models.get_sentence_model()
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+        logger.info("Model server listening on %s", socket_path)
+
+
+# ------------------------
+# Client
+# ------------------------
+
+class ModelClient:
+    """Calls the model server; keeps one connection per calling thread."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def call(self, op: str, **kwargs):
+        req = {"op": op, **kwargs}
+        for attempt in range(2):
+            reused = getattr(self._local, "sock", None) is not None
+            sock = self._connection()
+            try:
+                _send(sock, req)
+            except TimeoutError:
+                self._drop()
+                raise
+            except OSError:
+                # A pooled connection the server closed (it restarted since
+                # this thread connected): nothing was delivered, so reconnect once
+                self._drop()
+                if attempt or not reused:
+                    raise
+                continue
+            try:
+                resp = _recv(sock)
+            except BaseException:
+                # The request is out and may still be running; sending it
+                # again would repeat the work, so the caller gets the error
+                self._drop()
+                raise
+            break
+        if not resp["ok"]:
+            raise ModelServerError(resp["error"])
+        return resp["result"]
+
+    def caption(self, path: str) -> str:
+        return self.call("caption", path=os.path.abspath(path))
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return _unpack_array(self.call("embed", texts=list(texts)))
+
+
+_client: ModelClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_model_client() -> ModelClient | None:
+    """The shared client when MODEL_SERVER_SOCKET is set, else None (load in-process)."""
+    global _client
+    if not settings.MODEL_SERVER_SOCKET:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = ModelClient(settings.MODEL_SERVER_SOCKET, settings.MODEL_SERVER_TIMEOUT)
+        return _client
+
+
+def main():
+    if not settings.MODEL_SERVER_SOCKET:
+        raise SystemExit("Set MODEL_SERVER_SOCKET to the socket path to listen on")
+    with ModelServer(settings.MODEL_SERVER_SOCKET) as server:
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
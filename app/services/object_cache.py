@@ -0,0 +1,191 @@
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from uuid import uuid4
+
+from app.config import settings
+from app.services.s3_client import download_from_s3, head_etag
+import logging
+logger = logging.getLogger("datalens")
+
+
+class ObjectCache:
+    """
+    Size-bounded local cache for remote objects, keyed by content (checksum
+    or ETag) rather than file name. Entries are written to a temp file and
+    renamed into place, and the least recently used ones (by mtime, bumped on
+    every hit) are evicted once the cache grows past max_bytes.
+
+    Callers that keep using a path take a lease (acquire/release or lease())
+    and leased entries are never evicted, so the cache can briefly exceed
+    max_bytes while they are in use. A lease is a shared flock on the entry's
+    "<path>.lock" file, and eviction only removes an entry after taking that
+    lock exclusively without blocking, so leases hold across every worker
+    process sharing the cache directory.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._leases: dict[str, list[int]] = {}
+        os.makedirs(root, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def acquire(self, key: str, fetch: Callable[[str], object]) -> str:
+        """
+        Return a local path for key, calling fetch(dest) only on a miss. The
+        entry stays leased until release(path).
+        """
+        path = self.path_for(key)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Lease before looking, so an eviction cannot slip in between
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = self._share(path)
+        with self._lock:
+            self._leases.setdefault(path, []).append(fd)
+
+        try:
+            # One fetch per key; concurrent callers wait and then hit
+            with key_lock:
+                if os.path.exists(path):
+                    os.utime(path)
+                    with self._lock:
+                        self.hits += 1
+                    return path
+
+                part = f"{path}.{uuid4().hex}.part"
+                try:
+                    fetch(part)
+                    os.replace(part, path)
+                finally:
+                    if os.path.exists(part):
+                        os.remove(part)
+
+                with self._lock:
+                    self.misses += 1
+                    self._size += os.path.getsize(path)
+                    self._key_locks.pop(key, None)
+            self._evict()
+            return path
+        except BaseException:
+            self.release(path)
+            raise
+
+    def release(self, path: str):
+        with self._lock:
+            fds = self._leases.get(path)
+            if fds:
+                os.close(fds.pop())
+                if not fds:
+                    del self._leases[path]
+            over = self._size > self.max_bytes
+        if over:
+            # Whatever was held over budget can go now
+            self._evict()
+
+    @contextmanager
+    def lease(self, key: str, fetch: Callable[[str], object]) -> Iterator[str]:
+        path = self.acquire(key, fetch)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[str], object]) -> str:
+        """Unleased acquire: the path may be evicted once other entries are fetched."""
+        path = self.acquire(key, fetch)
+        self.release(path)
+        return path
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "bytes": self._size}
+
+    @staticmethod
+    def _share(path: str) -> int:
+        """Open and share-lock path's lock file; the fd holds the lease."""
+        lock_path = f"{path}.lock"
+        while True:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            # An evictor may have unlinked the lock file before we got it;
+            # a lock on an unlinked inode protects nothing, so start over
+            try:
+                if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _entries(self):
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith((".part", ".lock")):
+                    continue
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                yield p, st.st_size, st.st_mtime
+
+    def _evict(self):
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            self._size = sum(size for _, size, _ in entries)
+            for p, size, _ in entries:
+                if self._size <= self.max_bytes:
+                    break
+                if p in self._leases:
+                    continue
+                # Held in another worker: skip rather than wait
+                fd = os.open(f"{p}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    try:
+                        os.remove(p)
+                    except FileNotFoundError:
+                        continue
+                    finally:
+                        os.remove(f"{p}.lock")
+                finally:
+                    os.close(fd)
+                self._size -= size
+                self.evictions += 1
+                logger.info("Evicted cached object %s", p)
+
+
+object_cache = ObjectCache(settings.OBJECT_CACHE_DIR, settings.OBJECT_CACHE_MAX_BYTES)
+
+
+def _s3_key(s3_uri: str, checksum: str | None) -> str:
+    # Without a stored checksum the ETag identifies the content
+    return checksum or f"etag-{head_etag(s3_uri)}"
+
+
+@contextmanager
+def lease_s3_cached(s3_uri: str, checksum: str | None = None) -> Iterator[str]:
+    """
+    Local path for an S3 object, downloading it only if the cache does not
+    already hold the same content. The entry is kept from eviction until the
+    block exits.
+    """
+    with object_cache.lease(_s3_key(s3_uri, checksum), lambda dest: download_from_s3(s3_uri, dest)) as path:
+        logger.info("Object cache for %s: %s", s3_uri, object_cache.stats())
+        yield path
@@ -1,41 +1,171 @@
+"""
+Vector storage for reports. With qdrant-client installed, points are written
+through one background batcher: concurrent upserts are grouped into batches
+of up to QDRANT_BATCH_SIZE points, or whatever arrived within
+QDRANT_FLUSH_MS, and each collection is created (cosine, dim taken from the
+first vector) with keyword indexes on INDEXED_FIELDS the first time it is
+written. Qdrant only accepts unsigned integer or UUID ids, so other keys are
+mapped to a deterministic uuid5 and kept in the payload as "key".
+
+Without qdrant-client, or with VECTOR_BACKEND=local, the memory-mapped
+LocalVectorStore is used instead. Both return (key, score, payload) hits.
+"""
+import threading
+import uuid
+
 from app.config import settings
+from app.services.vector_store import LocalVectorStore
+from app.utils.batching import MicroBatcher
 import logging
 logger = logging.getLogger("datalens")
 
 try:
-    from qdrant_client import QdrantClient
+    from qdrant_client import QdrantClient, models
     _HAS_QDRANT = True
 except Exception:
     _HAS_QDRANT = False
 
+INDEXED_FIELDS = ("report_id", "upload_id")
+POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "datalens/points")
+
+
+def point_id(key):
+    """key itself if Qdrant accepts it as an id, else a uuid5 stable across runs."""
+    if isinstance(key, int) and not isinstance(key, bool) and key >= 0:
+        return key
+    try:
+        return str(uuid.UUID(str(key)))
+    except ValueError:
+        return str(uuid.uuid5(POINT_NAMESPACE, str(key)))
+
+
 class QdrantWrapper:
     def __init__(self):
-        if _HAS_QDRANT:
-            self.client = QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY)
+        if _HAS_QDRANT and settings.VECTOR_BACKEND != "local":
+            self.client = QdrantClient(
+                location=settings.QDRANT_URL,
+                api_key=settings.QDRANT_API_KEY,
+                prefer_grpc=settings.QDRANT_PREFER_GRPC,
+                grpc_port=settings.QDRANT_GRPC_PORT,
+            )
+            self._collections: set = set()
+            self._collections_lock = threading.Lock()
+            self._batcher = MicroBatcher(
+                self._write_batch, settings.QDRANT_BATCH_SIZE, settings.QDRANT_FLUSH_MS / 1000,
+                name="qdrant-writer", timeout=settings.BATCH_TIMEOUT_S,
+            )
         else:
+            # No Qdrant (or air-gapped): a persistent memory-mapped store on local disk
             self.client = None
-            self._store = {}  
+            self._store = LocalVectorStore(settings.VECTOR_STORE_DIR)
 
-    def upsert(self, collection_name: str, ids, vectors, payloads):
-        if self.client:
-            self.client.upsert(collection_name=collection_name, points=[{"id": i, "vector": v, "payload": p} for i,v,p in zip(ids,vectors,payloads)])
-            logger.info("Upserted to Qdrant collection %s (real)", collection_name)
-        else:
-            self._store.setdefault(collection_name, []).extend(list(zip(ids,vectors,payloads)))
-            logger.info("Upserted to Qdrant collection %s (mock)", collection_name)
+    def upsert(self, collection_name: str, ids, vectors, payloads, wait: bool = True):
+        """
+        Queue points for the writer. With wait (the default) returns once they
+        are stored and raises if the write failed; otherwise returns the
+        per-point futures.
+        """
+        if not self.client:
+            self._store.upsert(collection_name, ids, vectors, payloads)
+            logger.info("Upserted to local vector collection %s", collection_name)
+            return []
+        call = object()  # lets the writer tell this caller's points from others'
+        futures = [
+            self._batcher.submit((collection_name, call, models.PointStruct(
+                id=point_id(key),
+                # The client serialises plain lists; convert float32 rows only here
+                vector=vec.tolist() if hasattr(vec, "tolist") else list(vec),
+                payload={**payload, "key": key},
+            )))
+            for key, vec, payload in zip(ids, vectors, payloads)
+        ]
+        if wait:
+            for fut in futures:
+                fut.result(timeout=self._batcher.timeout)
+        return futures
 
-    def search(self, collection_name: str, vector, top=5):
-        if self.client:
-            res = self.client.search(collection_name=collection_name, query_vector=vector, limit=top)
-            return res
-        else:
-            from numpy import dot
-            from numpy.linalg import norm
-            items = self._store.get(collection_name, [])
-            sims = []
-            for id_, vec, payload in items:
-                import numpy as np
-                sim = float(dot(np.array(vec), np.array(vector)) / (norm(vec) * norm(vector) + 1e-9))
-                sims.append((id_, sim, payload))
-            sims.sort(key=lambda x: x[1], reverse=True)
-            return sims[:top]
+    def _write_batch(self, items: list) -> list:
+        """
+        One upsert per collection. If it fails and the batch mixes several
+        callers' points, each caller's points are retried on their own, so a
+        bad request (say, a dimension mismatch) fails only its own futures.
+        """
+        groups: dict = {}
+        for i, (name, call, _) in enumerate(items):
+            groups.setdefault(name, {}).setdefault(call, []).append(i)
+        results: list = [None] * len(items)
+        for name, calls in groups.items():
+            idx = [i for members in calls.values() for i in members]
+            error = self._write_points(name, [items[i][2] for i in idx])
+            if error is None:
+                continue
+            if len(calls) == 1:
+                for i in idx:
+                    results[i] = error
+                continue
+            for members in calls.values():
+                error = self._write_points(name, [items[i][2] for i in members])
+                for i in members:
+                    results[i] = error
+        return results
+
+    def _write_points(self, name: str, points: list) -> Exception | None:
+        try:
+            self._ensure_collection(name, len(points[0].vector))
+            self.client.upsert(collection_name=name, points=points, wait=True)
+            logger.info("Upserted %d points to Qdrant collection %s", len(points), name)
+            return None
+        except Exception as e:
+            logger.warning("Qdrant upsert of %d points to %s failed: %s", len(points), name, e)
+            return e
+
+    def _ensure_collection(self, name: str, dim: int):
+        with self._collections_lock:
+            if name in self._collections:
+                return
+            if not self.client.collection_exists(name):
+                self.client.create_collection(
+                    collection_name=name,
+                    vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+                )
+                logger.info("Created Qdrant collection %s (dim=%d)", name, dim)
+            for field in INDEXED_FIELDS:
+                # Idempotent; also covers collections created before the index existed
+                self.client.create_payload_index(name, field_name=field, field_schema=models.PayloadSchemaType.KEYWORD)
+            self._collections.add(name)
+
+    def search(self, collection_name: str, vector, top=5, where: dict | None = None):
+        return self.search_batch(collection_name, [vector], top, where)[0]
+
+    def search_batch(self, collection_name: str, vectors, top=5, where: dict | None = None):
+        if not self.client:
+            return self._store.search_batch(collection_name, vectors, top, where)
+        if collection_name not in self._collections and not self.client.collection_exists(collection_name):
+            return [[] for _ in vectors]
+        query_filter = _qdrant_filter(where)
+        responses = self.client.query_batch_points(collection_name, requests=[
+            models.QueryRequest(
+                query=vec.tolist() if hasattr(vec, "tolist") else list(vec),
+                filter=query_filter,
+                limit=top,
+                with_payload=True,
+            )
+            for vec in vectors
+        ])
+        return [
+            [(p.payload.get("key", p.id), p.score, {k: v for k, v in p.payload.items() if k != "key"}) for p in res.points]
+            for res in responses
+        ]
+
+
+def _qdrant_filter(where: dict | None):
+    """{field: value or [values]} as a Qdrant filter requiring every field to match."""
+    if not where:
+        return None
+    return models.Filter(must=[
+        models.FieldCondition(
+            key=key,
+            match=models.MatchAny(any=list(value)) if isinstance(value, (list, tuple, set)) else models.MatchValue(value=value),
+        )
+        for key, value in where.items()
+    ])
@@ -0,0 +1,178 @@
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable
+from uuid import uuid4
+
+from app.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ReportJob
+import logging
+logger = logging.getLogger("datalens")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobLost(Exception):
+    """The job row no longer belongs to this queue (taken over, or deleted)."""
+
+
+class JobQueue:
+    """
+    Bounded worker pool for report jobs. Job state lives in the report_jobs
+    table so a restart can pick up whatever was queued or running.
+    At most workers + queue_depth jobs are admitted at once.
+
+    Several processes (uvicorn --workers) share the table. Each job row names
+    the queue that owns it, and owners refresh updated_at on their unfinished
+    rows every REPORT_JOB_HEARTBEAT_S. A row is taken over only when it has no
+    owner or its owner has been silent for REPORT_JOB_STALE_S, and only
+    through a conditional UPDATE, so exactly one process runs each job.
+    Progress and results are written under the same owner condition: a
+    process that finds its job taken over stops at the next stage.
+    """
+
+    def __init__(self, handler: Callable, workers: int | None = None, queue_depth: int | None = None):
+        self.handler = handler
+        workers = workers or settings.REPORT_WORKERS
+        depth = settings.REPORT_QUEUE_DEPTH if queue_depth is None else queue_depth
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+        self._slots = threading.BoundedSemaphore(workers + depth)
+        self._heartbeat: threading.Thread | None = None
+        self._heartbeat_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def submit(self, db, upload_id: str, request: dict) -> ReportJob:
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull("Report queue is full, retry later")
+        try:
+            job = ReportJob(id=str(uuid4()), upload_id=upload_id, status="queued", progress=0, request_json=request, owner=self.owner)
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            self._executor.submit(self._run, job.id)
+        except Exception:
+            self._slots.release()
+            raise
+        self._start_heartbeat()
+        logger.info("Queued report job %s for upload %s", job.id, upload_id)
+        return job
+
+    def resume(self) -> int:
+        """
+        Claim jobs left queued or running by a process that is gone, and keep
+        claiming them in the background. Never blocks: jobs beyond the free
+        slots stay in the table for a later pass or another process.
+        """
+        claimed = self.claim_orphans()
+        self._start_heartbeat()
+        return claimed
+
+    def _start_heartbeat(self):
+        with self._heartbeat_lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="report-job-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def claim_orphans(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.REPORT_JOB_STALE_S)
+        orphaned = ReportJob.owner.is_(None) | ((ReportJob.owner != self.owner) & (ReportJob.updated_at < cutoff))
+        db = SessionLocal()
+        try:
+            ids = [
+                row.id
+                for row in db.query(ReportJob.id)
+                .filter(ReportJob.status.in_(["queued", "running"]), orphaned)
+                .order_by(ReportJob.created_at)
+            ]
+            claimed = []
+            for job_id in ids:
+                if not self._slots.acquire(blocking=False):
+                    break
+                # Conditional on the row still being orphaned: of several
+                # processes racing for it, only one UPDATE matches
+                won = db.query(ReportJob).filter(
+                    ReportJob.id == job_id, ReportJob.status.in_(["queued", "running"]), orphaned
+                ).update(
+                    {"owner": self.owner, "status": "queued", "stage": None, "progress": 0, "updated_at": datetime.utcnow()},
+                    synchronize_session=False,
+                )
+                db.commit()
+                if won:
+                    claimed.append(job_id)
+                else:
+                    self._slots.release()
+        finally:
+            db.close()
+
+        for job_id in claimed:
+            self._executor.submit(self._run, job_id)
+        if claimed:
+            logger.info("Resumed %d report jobs", len(claimed))
+        return len(claimed)
+
+    def _beat(self):
+        while not self._stop.wait(settings.REPORT_JOB_HEARTBEAT_S):
+            db = SessionLocal()
+            try:
+                db.query(ReportJob).filter(
+                    ReportJob.owner == self.owner, ReportJob.status.in_(["queued", "running"])
+                ).update({"updated_at": datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                logger.warning("Report job heartbeat failed: %s", e)
+            finally:
+                db.close()
+            try:
+                self.claim_orphans()
+            except Exception as e:
+                logger.warning("Claiming orphaned report jobs failed: %s", e)
+
+    def _run(self, job_id: str):
+        db = SessionLocal()
+        try:
+            started = db.query(ReportJob).filter(ReportJob.id == job_id, ReportJob.owner == self.owner).update(
+                {"status": "running", "stage": "started", "progress": 0, "updated_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+            db.commit()
+            if not started:
+                # Deleted, or taken over while this process looked dead
+                return
+            job = db.query(ReportJob).filter(ReportJob.id == job_id).first()
+
+            def progress(stage: str, pct: int):
+                self._update(db, job_id, stage=stage, progress=pct)
+
+            try:
+                result = self.handler(db, job, progress)
+                self._update(db, job_id, status="done", stage="done", progress=100, result_json=result)
+            except JobLost:
+                logger.warning("Report job %s was taken over by another process; abandoning it", job_id)
+            except Exception as e:
+                db.rollback()
+                detail = getattr(e, "detail", None) or str(e)
+                logger.exception("Report job %s failed: %s", job_id, detail)
+                try:
+                    self._update(db, job_id, status="failed", error=str(detail))
+                except JobLost:
+                    logger.warning("Report job %s was taken over by another process; abandoning it", job_id)
+        finally:
+            db.close()
+            self._slots.release()
+
+    def _update(self, db, job_id: str, **fields):
+        updated = db.query(ReportJob).filter(ReportJob.id == job_id, ReportJob.owner == self.owner).update(
+            {**fields, "updated_at": datetime.utcnow()}, synchronize_session=False,
+        )
+        db.commit()
+        if not updated:
+            raise JobLost(job_id)
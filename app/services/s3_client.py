@@ -1,21 +1,106 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import urlparse
+from uuid import uuid4
+
 from app.config import settings
 import logging
 logger = logging.getLogger("datalens")
 
+# Every S3 transfer runs on this pool, so concurrent uploads/reports share one
+# bound instead of each opening their own connections.
+_executor = ThreadPoolExecutor(max_workers=settings.S3_TRANSFER_WORKERS, thread_name_prefix="s3")
+
+
+def s3_enabled() -> bool:
+    return bool(settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY and settings.AWS_S3_BUCKET)
+
+
+@lru_cache(maxsize=1)
+def get_s3_client():
+    """One pooled, thread-safe client for the whole process."""
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION,
+        endpoint_url=settings.S3_ENDPOINT_URL,
+        config=Config(
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": 5, "mode": "adaptive"},
+        ),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_transfer_config():
+    """Multipart settings: large objects are split and sent in parallel parts."""
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=settings.S3_MAX_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+def parse_s3_uri(s3_uri: str) -> tuple[str, str]:
+    parsed = urlparse(s3_uri)
+    return parsed.netloc, parsed.path.lstrip("/")
+
+
+def _upload(local_path: str, key: str) -> str:
+    get_s3_client().upload_file(local_path, settings.AWS_S3_BUCKET, key, Config=get_transfer_config())
+    url = f"s3://{settings.AWS_S3_BUCKET}/{key}"
+    logger.info("Uploaded to S3 %s", url)
+    return url
+
+
+def _download(s3_uri: str, local_path: str) -> str:
+    bucket, key = parse_s3_uri(s3_uri)
+    os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+    # Unique per call: concurrent downloads to the same destination must not
+    # write into one another's temp file
+    part_path = f"{local_path}.{uuid4().hex}.part"
+    try:
+        get_s3_client().download_file(bucket, key, part_path, Config=get_transfer_config())
+        os.replace(part_path, local_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return local_path
+
+
+def head_etag(s3_uri: str) -> str:
+    bucket, key = parse_s3_uri(s3_uri)
+    return get_s3_client().head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+
+
 def upload_to_s3(local_path: str, key: str | None = None) -> str:
-    if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY and settings.AWS_S3_BUCKET:
-        import boto3
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        )
+    if s3_enabled():
         key = key or os.path.basename(local_path)
-        s3.upload_file(local_path, settings.AWS_S3_BUCKET, key)
-        url = f"s3://{settings.AWS_S3_BUCKET}/{key}"
-        logger.info("Uploaded to S3 %s", url)
-        return url
+        return _executor.submit(_upload, local_path, key).result()
     else:
         logger.info("S3 credentials not present, returning local path")
         return os.path.abspath(local_path)
+
+
+def download_from_s3(s3_uri: str, local_path: str) -> str:
+    return _executor.submit(_download, s3_uri, local_path).result()
+
+
+async def upload_to_s3_async(local_path: str, key: str | None = None) -> str:
+    if not s3_enabled():
+        return upload_to_s3(local_path, key)
+    key = key or os.path.basename(local_path)
+    return await asyncio.wrap_future(_executor.submit(_upload, local_path, key))
+
+
+async def download_from_s3_async(s3_uri: str, local_path: str) -> str:
+    return await asyncio.wrap_future(_executor.submit(_download, s3_uri, local_path))
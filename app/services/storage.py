@@ -0,0 +1,100 @@
+import hashlib
+import os
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db.models import FileMeta
+import logging
+logger = logging.getLogger("datalens")
+
+
+async def stream_upload_to_disk(f: UploadFile, out_path: str, max_bytes: int | None = None) -> tuple[int, str]:
+    """
+    Copy an UploadFile to out_path in UPLOAD_CHUNK_SIZE pieces, updating the
+    size and SHA-256 as each chunk goes by, so memory stays flat however large
+    the file is. Fails with 413 as soon as max_bytes is exceeded and removes
+    the partial file. Returns (size, checksum).
+    """
+    if max_bytes is not None and f.size is not None and f.size > max_bytes:
+        raise HTTPException(413, f"{f.filename} exceeds the upload size limit")
+
+    digest = hashlib.sha256()
+    size = 0
+    part_path = out_path + ".part"
+    fh = open(part_path, "wb")
+    try:
+        while True:
+            chunk = await f.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise HTTPException(413, f"{f.filename} exceeds the upload size limit")
+            digest.update(chunk)
+            await run_in_threadpool(fh.write, chunk)
+        fh.close()
+        os.replace(part_path, out_path)
+    except BaseException:
+        fh.close()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    return size, digest.hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(settings.UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ------------------------
+# Content-addressed blobs
+# ------------------------
+
+BLOB_DIR = os.path.join("uploads", "blobs")
+INCOMING_DIR = os.path.join("uploads", ".incoming")
+
+
+def blob_path_for(checksum: str) -> str:
+    return os.path.join(BLOB_DIR, checksum[:2], checksum)
+
+
+def commit_blob(part_path: str, checksum: str) -> tuple[str, bool]:
+    """
+    Move a freshly streamed file into the blob store under its checksum.
+    If the content is already stored the new copy is dropped instead.
+    Returns (blob_path, created).
+    """
+    path = blob_path_for(checksum)
+    if os.path.exists(path):
+        os.remove(part_path)
+        return path, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(part_path, path)
+    logger.info("Stored new blob %s", path)
+    return path, True
+
+
+def find_stored_s3_path(db, checksum: str) -> str | None:
+    """Return the S3 URI of an earlier upload with the same content, if any."""
+    prior = (
+        db.query(FileMeta)
+        .filter(FileMeta.checksum == checksum, FileMeta.s3_path.like("s3://%"))
+        .first()
+    )
+    return prior.s3_path if prior else None
+
+
+def find_ingested(db, checksum: str) -> FileMeta | None:
+    """An earlier row for the same content whose CSV ingest already ran."""
+    return (
+        db.query(FileMeta)
+        .filter(FileMeta.checksum == checksum, FileMeta.metric_summary.isnot(None))
+        .first()
+    )
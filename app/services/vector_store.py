@@ -0,0 +1,270 @@
+"""
+In-process vector store for deployments without a Qdrant server.
+
+Each collection is a directory holding:
+
+    vectors.f32   float32 rows, unit-normalised on insert, memory-mapped and
+                  grown by doubling, so cosine similarity is a plain dot product
+    index.jsonl   one {"id", "row", "payload"} line per upsert; the last line
+                  for an id wins when the collection is reopened
+    meta.json     dim and the number of committed rows, replaced atomically
+                  after the rows and index lines are on disk
+    lock          flock()ed exclusively by a writer and shared by readers
+
+Several processes (uvicorn workers) can share a collection. Writers hold the
+exclusive lock and first catch up with the committed rows, so row numbers
+are never handed out twice; every operation catches up with whatever other
+processes committed since it last looked, reading only the new index lines.
+
+A search is one matrix-vector (or matrix-matrix, for batches) product over
+the committed rows followed by argpartition for the top k. Equality filters
+on payload fields narrow the rows first through per-field posting sets.
+"""
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import logging
+logger = logging.getLogger("datalens")
+
+MIN_CAPACITY = 1024
+
+Hit = Tuple[Any, float, dict]
+
+
+def _normalise(vectors) -> np.ndarray:
+    mat = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    mat /= np.where(norms > 0, norms, 1.0)
+    return mat
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """(k, queries) row indices of the highest scores per column, best first."""
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1, axis=0)[:k]
+    else:
+        part = np.repeat(np.arange(len(scores))[:, None], scores.shape[1], axis=1)
+    order = np.argsort(-np.take_along_axis(scores, part, axis=0), axis=0, kind="stable")
+    return np.take_along_axis(part, order, axis=0)
+
+
+class _Collection:
+    def __init__(self, path: str, dim: Optional[int] = None):
+        self.path = path
+        self.count = 0
+        self.dim = dim
+        self.mat: Optional[np.memmap] = None
+        self.ids: List[Any] = []
+        self.rows: Dict[Any, int] = {}
+        self.payloads: List[dict] = []
+        self.postings: Dict[str, Dict[Any, set]] = {}
+        self._seen = None  # stat of the meta.json last read
+        self._offset = 0  # bytes of index.jsonl already applied
+        os.makedirs(path, exist_ok=True)
+        self._lock_fd = os.open(self._file("lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        with self.locked(fcntl.LOCK_SH):
+            self._refresh()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def locked(self, mode: int):
+        fcntl.flock(self._lock_fd, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Apply rows other processes committed since the last look; call under the lock."""
+        try:
+            st = os.stat(self._file("meta.json"))
+        except FileNotFoundError:
+            return
+        if (st.st_ino, st.st_mtime_ns, st.st_size) == self._seen:
+            return
+        with open(self._file("meta.json")) as f:
+            meta = json.load(f)
+        self._seen = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self.dim, committed = meta["dim"], meta["count"]
+        entries: Dict[int, Tuple[Any, dict]] = {}
+        with open(self._file("index.jsonl"), "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn last write
+                self._offset += len(line)
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue  # left by a writer that died mid-line
+                # Lines past the committed count are from a writer that died
+                # before meta.json; the next writer reuses those rows
+                if e["row"] < committed:
+                    entries[e["row"]] = (e["id"], e["payload"])
+        if self.mat is None or committed > len(self.mat):
+            self._map(max(MIN_CAPACITY, committed))
+        for row in sorted(entries):
+            self._set_row(row, *entries[row])
+        self.count = committed
+
+    def _map(self, capacity: int):
+        path = self._file("vectors.f32")
+        size = capacity * self.dim * 4
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            current = os.fstat(f.fileno()).st_size
+            if current < size:
+                f.truncate(size)
+            # Another process may have grown the file further already
+            capacity = max(capacity, current // (self.dim * 4))
+        if self.mat is not None:
+            self.mat.flush()
+        self.mat = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _set_row(self, row: int, id_, payload: dict):
+        if row < len(self.ids):
+            for key, value in self.payloads[row].items():
+                self.postings.get(key, {}).get(_hashable(value), set()).discard(row)
+            if self.rows.get(self.ids[row]) == row:
+                del self.rows[self.ids[row]]
+            self.ids[row], self.payloads[row] = id_, payload
+        else:
+            self.ids.append(id_)
+            self.payloads.append(payload)
+        self.rows[id_] = row
+        for key, value in payload.items():
+            self.postings.setdefault(key, {}).setdefault(_hashable(value), set()).add(row)
+
+    def upsert(self, ids: Sequence, vectors, payloads: Sequence[dict]):
+        mat = _normalise(vectors)
+        with self.locked(fcntl.LOCK_EX):
+            self._refresh()
+            self._write(ids, mat, payloads)
+
+    def _write(self, ids: Sequence, mat: np.ndarray, payloads: Sequence[dict]):
+        if self.dim is None:
+            self.dim = mat.shape[1]
+        if mat.shape[1] != self.dim:
+            raise ValueError(f"Vectors have {mat.shape[1]} dims, collection has {self.dim}")
+        if self.mat is None:
+            self._map(MIN_CAPACITY)
+
+        rows, count, added = [], self.count, {}
+        for id_ in ids:
+            row = self.rows.get(id_, added.get(id_))
+            if row is None:
+                row = added[id_] = count
+                count += 1
+            rows.append(row)
+        if count > len(self.mat):
+            capacity = len(self.mat)
+            while capacity < count:
+                capacity *= 2
+            self._map(capacity)
+
+        self.mat[rows] = mat
+        self.mat.flush()
+        with open(self._file("index.jsonl"), "ab") as f:
+            if f.tell() > self._offset:
+                f.write(b"\n")  # end a line torn by a writer that died
+            for id_, row, payload in zip(ids, rows, payloads):
+                f.write((json.dumps({"id": id_, "row": row, "payload": payload}) + "\n").encode("utf-8"))
+            self._offset = f.tell()
+        for id_, row, payload in zip(ids, rows, payloads):
+            self._set_row(row, id_, payload)
+        self.count = count
+        tmp = self._file("meta.json.part")
+        with open(tmp, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count}, f)
+        os.replace(tmp, self._file("meta.json"))
+        st = os.stat(self._file("meta.json"))
+        self._seen = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def size(self) -> int:
+        with self.locked(fcntl.LOCK_SH):
+            self._refresh()
+            return self.count
+
+    def candidates(self, where: Optional[dict]) -> Optional[np.ndarray]:
+        """Rows matching every field of where (a value or a list of allowed values); None means all."""
+        if not where:
+            return None
+        rows: Optional[set] = None
+        for key, allowed in where.items():
+            values = allowed if isinstance(allowed, (list, tuple, set)) else [allowed]
+            index = self.postings.get(key, {})
+            match = set().union(*(index.get(_hashable(v), set()) for v in values))
+            rows = match if rows is None else rows & match
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+
+    def search(self, queries, top: int, where: Optional[dict]) -> List[List[Hit]]:
+        q = _normalise(queries)
+        # Shared: no writer is changing rows while they are scored
+        with self.locked(fcntl.LOCK_SH):
+            self._refresh()
+            return self._search(q, top, where)
+
+    def _search(self, q: np.ndarray, top: int, where: Optional[dict]) -> List[List[Hit]]:
+        if self.count == 0:
+            return [[] for _ in q]
+        rows = self.candidates(where)
+        block = self.mat[: self.count] if rows is None else self.mat[rows]
+        if len(block) == 0:
+            return [[] for _ in q]
+        scores = block @ q.T
+        best = _top_k(scores, min(top, len(block)))
+        out = []
+        for j in range(q.shape[0]):
+            hits = []
+            for i in best[:, j]:
+                row = int(i if rows is None else rows[i])
+                hits.append((self.ids[row], float(scores[i, j]), self.payloads[row]))
+            out.append(hits)
+        return out
+
+
+def _hashable(value):
+    return json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else value
+
+
+class LocalVectorStore:
+    """
+    Collections of unit-normalised float32 vectors under root, safe to share
+    between threads and between processes on one host.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.RLock()
+
+    def _collection(self, name: str) -> _Collection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = _Collection(os.path.join(self.root, name))
+            return self._collections[name]
+
+    def upsert(self, collection_name: str, ids: Sequence, vectors, payloads: Optional[Iterable[dict]] = None):
+        ids = list(ids)
+        payloads = list(payloads) if payloads is not None else [{} for _ in ids]
+        with self._lock:
+            self._collection(collection_name).upsert(ids, vectors, payloads)
+
+    def search(self, collection_name: str, vector, top: int = 5, where: Optional[dict] = None) -> List[Hit]:
+        """(id, cosine score, payload) for the top most similar vectors, best first."""
+        return self.search_batch(collection_name, [vector], top, where)[0]
+
+    def search_batch(self, collection_name: str, vectors, top: int = 5, where: Optional[dict] = None) -> List[List[Hit]]:
+        with self._lock:
+            return self._collection(collection_name).search(vectors, top, where)
+
+    def count(self, collection_name: str) -> int:
+        with self._lock:
+            return self._collection(collection_name).size()
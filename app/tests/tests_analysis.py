@@ -0,0 +1,56 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.analysis import OrderedBatch, analyze_csv, ingest_csv
+
+
+def _slow(label):
+    time.sleep(0.2)
+    return label, threading.current_thread().name
+
+
+def test_single_job_batches_overlap():
+    with ThreadPoolExecutor(2, thread_name_prefix="pool") as csv_pool, ThreadPoolExecutor(2, thread_name_prefix="pool") as image_pool:
+        start = time.monotonic()
+        csv = OrderedBatch(csv_pool, _slow, [("csv",)], "CSV")
+        image = OrderedBatch(image_pool, _slow, [("image",)], "Image")
+        results = csv.results() + image.results()
+        elapsed = time.monotonic() - start
+
+    assert [label for label, _ in results] == ["csv", "image"]
+    assert all(name.startswith("pool") for _, name in results)
+    assert elapsed < 0.35
+
+
+def test_inline_single_runs_in_the_caller():
+    with ThreadPoolExecutor(1) as pool:
+        batch = OrderedBatch(pool, _slow, [("only",)], "CSV", inline_single=True)
+        assert batch.results() == [("only", threading.current_thread().name)]
+        many = OrderedBatch(pool, _slow, [("a",), ("b",)], "CSV", inline_single=True)
+        assert [label for label, _ in many.results()] == ["a", "b"]
+
+
+def test_trend_window_reads_rows_despite_a_stored_summary(tmp_path):
+    rows = 200
+    df = pd.DataFrame({
+        "day": pd.date_range("2024-01-01", periods=rows, freq="D").strftime("%Y-%m-%d"),
+        "sales": np.arange(rows, dtype="float64"),
+    })
+    path = tmp_path / "sales.csv"
+    df.to_csv(path, index=False)
+    columnar_path, summary = ingest_csv(str(path), streaming_min_bytes=1 << 30)
+
+    windowed = analyze_csv("sales.csv", summary, columnar_path, str(path), trend_method="regression", trend_window=50)
+    assert "recent_slope" in windowed["trends"][0]
+
+    full = analyze_csv("sales.csv", summary, columnar_path, str(path), trend_method="regression")
+    assert "recent_slope" not in full["trends"][0]
+    assert full["trends"][0]["slope"] == pytest.approx(windowed["trends"][0]["slope"])
@@ -0,0 +1,44 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.ai.caption_backends import apply_backend
+from app.config import settings
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        apply_backend(object(), "tpu")
+
+
+def test_onnx_backend_matches_torch_encoder(tmp_path, monkeypatch):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(settings, "ONNX_MODEL_DIR", str(tmp_path))
+
+    class Vision(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.proj = torch.nn.Conv2d(3, 8, 4, stride=4)
+
+        def forward(self, pixel_values=None, **kwargs):
+            return (self.proj(pixel_values).flatten(2).transpose(1, 2),)
+
+    class Model(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.vision_model = Vision()
+            self.config = SimpleNamespace(vision_config=SimpleNamespace(image_size=16))
+
+    model = Model().eval()
+    pixels = torch.rand(2, 3, 16, 16)
+    with torch.no_grad():
+        expected = model.vision_model(pixel_values=pixels)[0]
+
+    apply_backend(model, "onnx")
+    assert os.path.exists(tmp_path / "blip_vision_encoder.onnx")
+    assert torch.allclose(model.vision_model(pixel_values=pixels)[0], expected, atol=1e-5)
@@ -0,0 +1,30 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.database import init_db
+
+
+def test_init_db_adds_columns_missing_from_an_old_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE filemeta (id VARCHAR PRIMARY KEY, upload_id VARCHAR, filename VARCHAR, s3_path VARCHAR,"
+            " file_type VARCHAR, checksum VARCHAR, size INTEGER, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO filemeta (id, filename) VALUES ('f1', 'sales.csv')"))
+        conn.execute(text(
+            "CREATE TABLE report_jobs (id VARCHAR PRIMARY KEY, upload_id VARCHAR, status VARCHAR, stage VARCHAR,"
+            " progress INTEGER, request_json JSON, result_json JSON, error VARCHAR, created_at DATETIME, updated_at DATETIME)"
+        ))
+
+    init_db(engine)
+    init_db(engine)  # a second start finds nothing to add
+
+    db = inspect(engine)
+    assert {"blob_path", "columnar_path", "metric_summary"} <= {c["name"] for c in db.get_columns("filemeta")}
+    assert "owner" in {c["name"] for c in db.get_columns("report_jobs")}
+    assert any(ix["column_names"] == ["owner"] for ix in db.get_indexes("report_jobs"))
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT filename, metric_summary FROM filemeta")).all() == [("sales.csv", None)]
@@ -0,0 +1,106 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import threading
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.db.database import Base
+from app.services import embeddings
+from app.services.embeddings import EmbeddingService, hash_embed
+
+
+def _service(tmp_path, monkeypatch, calls, **kwargs):
+    engine = create_engine(f"sqlite:///{tmp_path / 'emb.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(embeddings, "SessionLocal", sessionmaker(bind=engine))
+
+    def encode(texts):
+        calls.append(list(texts))
+        return hash_embed(texts)
+
+    return EmbeddingService(encode, "test-model", **{"max_batch": 64, "max_wait": 0.05, "cache_entries": 100, **kwargs})
+
+
+def test_embeddings_are_float32_and_cached_by_text(tmp_path, monkeypatch):
+    calls = []
+    svc = _service(tmp_path, monkeypatch, calls)
+
+    out = svc.embed(["revenue up", "costs flat", "revenue up"])
+    assert out.dtype == np.float32 and out.shape == (3, 384) and out.flags.c_contiguous
+    np.testing.assert_array_equal(out[0], out[2])
+    np.testing.assert_allclose(np.linalg.norm(out, axis=1), 1.0, rtol=1e-5)
+    assert sorted(calls[0]) == ["costs flat", "revenue up"]
+
+    svc.embed(["costs flat"])
+    assert len(calls) == 1 and svc.stats()["memory_hits"] == 1
+
+    # Another worker with an empty LRU reads the table instead of encoding
+    other_calls = []
+    other = _service(tmp_path, monkeypatch, other_calls)
+    np.testing.assert_array_equal(other.embed(["revenue up", "new text"])[0], out[0])
+    assert other_calls == [["new text"]] and other.stats()["db_hits"] == 1
+
+
+def test_concurrent_callers_share_batches(tmp_path, monkeypatch):
+    calls = []
+    svc = _service(tmp_path, monkeypatch, calls, max_batch=8, max_wait=0.2)
+    results = {}
+
+    def worker(i):
+        results[i] = svc.embed([f"summary {i}"])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(len(c) for c in calls) == [8, 8]
+    for i in range(16):
+        np.testing.assert_array_equal(results[i][0], hash_embed([f"summary {i}"])[0])
+
+
+def test_unloadable_model_falls_back_to_hash_embeddings(monkeypatch):
+    def offline():
+        raise OSError("We couldn't connect to 'https://huggingface.co'")
+
+    monkeypatch.setattr(embeddings, "get_model_client", lambda: None)
+    monkeypatch.setattr(embeddings.models, "get_sentence_model", offline)
+    encode, model = embeddings._default_encoder()
+    assert model == embeddings.HASH_MODEL
+    np.testing.assert_array_equal(encode(["a"]), hash_embed(["a"]))
+
+
+
+def test_model_server_still_loading_is_retried_not_replaced(monkeypatch):
+    # A configured server never falls back to hash vectors, which would land
+    # next to real ones; the service is not cached until it answers
+    calls = []
+
+    class LoadingServer:
+        up = False
+
+        def embed(self, texts):
+            calls.append(texts)
+            if not self.up:
+                raise ConnectionRefusedError("no model server")
+            return hash_embed(texts) * 2
+
+    server = LoadingServer()
+    monkeypatch.setattr(embeddings, "get_model_client", lambda: server)
+    monkeypatch.setattr(embeddings, "PROBE_BACKOFF_S", 0.0)
+    monkeypatch.setattr(embeddings, "_service", None)
+    with pytest.raises(RuntimeError):
+        embeddings.get_embedding_service()
+    assert len(calls) == embeddings.PROBE_ATTEMPTS and embeddings._service is None
+
+    server.up = True
+    service = embeddings.get_embedding_service()
+    assert service.model == settings.EMBEDDING_MODEL
+    assert embeddings.collection_name("reports", service.model) == "reports-sentence-transformers-all-minilm-l6-v2"
+    assert embeddings.collection_name("reports", embeddings.HASH_MODEL) == "reports-sha256-fallback"
@@ -0,0 +1,88 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.ai import langchain_agent
+from app.db.database import Base
+from app.services import llm_cache as llm_cache_module
+from app.services.llm_cache import LLMResponseCache
+
+SALES = {"file": "sales.csv", "key_metrics": {"revenue_mean": 10.0}, "trends": [], "correlations": []}
+OTHER = {"file": "sales.csv", "key_metrics": {"revenue_mean": 11.0}, "trends": [], "correlations": []}
+REPORT = {"summary": "Sales grew", "key_metrics": {}, "trends": [], "correlations": [], "recommendations": []}
+
+
+@pytest.fixture
+def fake_groq(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'llm.db'}")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(llm_cache_module, "SessionLocal", sessionmaker(bind=engine))
+    cache = LLMResponseCache(max_entries=2, ttl=3600)
+    monkeypatch.setattr(langchain_agent, "llm_cache", cache)
+
+    prompts = []
+
+    class FakeGateway:
+        def chat_sync(self, messages, model, **kwargs):
+            prompts.append(messages[-1]["content"])
+            return json.dumps(REPORT)
+
+    monkeypatch.setattr(langchain_agent, "get_llm_gateway", FakeGateway)
+    return cache, prompts
+
+
+def test_unchanged_inputs_skip_the_llm(fake_groq):
+    cache, prompts = fake_groq
+
+    assert langchain_agent.run_langchain_agent([SALES], ["chart"]) == REPORT
+    assert langchain_agent.run_langchain_agent([SALES], ["chart"]) == REPORT
+    assert len(prompts) == 1
+    assert cache.stats()["memory_hits"] == 1
+
+    # Bypass goes to the LLM; other inputs miss
+    langchain_agent.run_langchain_agent([SALES], ["chart"], use_cache=False)
+    langchain_agent.run_langchain_agent([OTHER], ["chart"])
+    assert len(prompts) == 3
+
+
+def test_db_tier_is_shared_and_expires(fake_groq, monkeypatch):
+    cache, prompts = fake_groq
+    langchain_agent.run_langchain_agent([SALES], ["chart"])
+
+    # A fresh process only has the DB tier
+    other = LLMResponseCache(max_entries=2, ttl=3600)
+    monkeypatch.setattr(langchain_agent, "llm_cache", other)
+    assert langchain_agent.run_langchain_agent([SALES], ["chart"]) == REPORT
+    assert other.stats()["db_hits"] == 1 and len(prompts) == 1
+
+    expired = LLMResponseCache(max_entries=2, ttl=0)
+    monkeypatch.setattr(langchain_agent, "llm_cache", expired)
+    langchain_agent.run_langchain_agent([SALES], ["chart"])
+    assert expired.stats()["expired"] == 1 and len(prompts) == 2
+
+
+def test_key_covers_sampling_params():
+    key = llm_cache_module.llm_cache_key("m", 0.3, 2048, "prompt")
+    assert key == llm_cache_module.llm_cache_key("m", 0.3, 2048, "prompt")
+    assert key != llm_cache_module.llm_cache_key("m", 0.0, 2048, "prompt")
+    assert key != llm_cache_module.llm_cache_key("m", 0.3, 1024, "prompt")
+
+
+def test_callers_cannot_mutate_cached_responses(fake_groq):
+    cache, _ = fake_groq
+    stored = {"summary": "s", "trends": ["up"]}
+    cache.put("k", "m", stored)
+    stored["trends"].append("caller edit")
+
+    fresh = LLMResponseCache(max_entries=2, ttl=3600)
+    from_db = fresh.get("k")
+    from_db["trends"].append("db caller edit")
+    from_memory = cache.get("k")
+    from_memory["trends"].append("memory caller edit")
+
+    assert cache.get("k") == fresh.get("k") == {"summary": "s", "trends": ["up"]}
@@ -0,0 +1,257 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.metrics import PERCENTILES, compute_key_metrics, detect_trends, compute_correlations, compute_all_metrics
+from app.utils.streaming_metrics import MetricsAccumulator, stream_csv_metrics, combine_summaries
+from app.utils.quantiles import KLLSketch
+from app.utils.correlation import correlation_pairs, pairs_from_array
+from app.utils.trends import regression_trends
+
+# Rank tolerance for sketch percentiles: the documented ±1.65% plus slack
+RANK_EPS = 0.025
+
+
+def _frame(rows=500, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(100, 15, rows)
+    df = pd.DataFrame({
+        "revenue": base * 3 + rng.normal(0, 5, rows),
+        "units": base + rng.normal(0, 2, rows),
+        "spend": rng.normal(1e6, 10, rows),
+        "visits": rng.integers(0, 1000, rows),
+        "region": rng.choice(["n", "s"], rows),
+        "empty": np.nan,
+    })
+    df.loc[rng.choice(rows, 60, replace=False), "revenue"] = np.nan
+    df.loc[rng.choice(rows, 40, replace=False), "units"] = np.nan
+    df.loc[0, "units"] = np.nan
+    return df
+
+
+def _assert_same(expected, actual):
+    if isinstance(expected, dict):
+        assert expected.keys() == actual.keys()
+        for k in expected:
+            _assert_same(expected[k], actual[k])
+    elif isinstance(expected, list):
+        assert len(expected) == len(actual)
+        for e, a in zip(expected, actual):
+            _assert_same(e, a)
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9)
+    else:
+        assert expected == actual
+
+
+def _assert_sketched(df, expected, actual):
+    """Exact metrics must match; percentiles only within the sketch's rank error."""
+    pct = tuple(f"_p{p}" for p in PERCENTILES)
+    assert expected.keys() == actual.keys()
+    _assert_same({k: v for k, v in expected.items() if not k.endswith(pct)},
+                 {k: v for k, v in actual.items() if not k.endswith(pct)})
+    for key in expected:
+        if key.endswith(pct):
+            col, p = key.rsplit("_p", 1)
+            values = np.sort(pd.to_numeric(df[col]).dropna().to_numpy())
+            lo = np.searchsorted(values, actual[key], side="left") / len(values)
+            hi = np.searchsorted(values, actual[key], side="right") / len(values)
+            assert lo - RANK_EPS <= int(p) / 100 <= hi + RANK_EPS, key
+
+
+@pytest.mark.parametrize("chunk_rows", [7, 64, 1000])
+def test_streaming_matches_in_memory(tmp_path, chunk_rows):
+    df = _frame()
+    path = tmp_path / "data.csv"
+    df.to_csv(path, index=False)
+    parsed = pd.read_csv(path)
+
+    km, tr, corr = stream_csv_metrics(str(path), chunk_rows=chunk_rows, threshold=0.1)
+
+    _assert_sketched(parsed, compute_key_metrics(parsed), km)
+    _assert_same(detect_trends(parsed), tr)
+    _assert_same(compute_correlations(parsed, threshold=0.1), corr)
+
+
+def test_column_turning_non_numeric_is_dropped(tmp_path):
+    path = tmp_path / "mixed.csv"
+    path.write_text("a,b\n1,2\n2,4\n3,6\n4,x\n")
+    km, _, corr = stream_csv_metrics(str(path), chunk_rows=2)
+    assert km == compute_key_metrics(pd.read_csv(path))
+    assert corr == []
+
+
+def test_merge_equals_concatenation():
+    a, b = _frame(300, seed=1), _frame(200, seed=2).drop(columns=["spend"])
+    merged = MetricsAccumulator().update(a).merge(MetricsAccumulator().update(b))
+    both = pd.concat([a, b], ignore_index=True)
+
+    _assert_sketched(both, compute_key_metrics(both), merged.key_metrics())
+    _assert_same(compute_correlations(both, threshold=0.0), merged.correlations(threshold=0.0))
+
+
+@pytest.mark.parametrize("gaps", [True, False])
+def test_fused_matches_separate_functions(gaps):
+    df = _frame(800, seed=3)
+    if not gaps:
+        df = df.drop(columns=["empty"]).dropna()
+
+    km, tr, corr = compute_all_metrics(df, threshold=0.1)
+
+    _assert_same(compute_key_metrics(df), km)
+    _assert_same(detect_trends(df), tr)
+    _assert_same(compute_correlations(df, threshold=0.1), corr)
+
+
+def test_summaries_round_trip_and_combine():
+    a, b = _frame(300, seed=4), _frame(100, seed=5)
+    blobs = [MetricsAccumulator().update(a).to_bytes(), MetricsAccumulator().update(b).to_bytes()]
+    combined = combine_summaries(blobs)
+    both = pd.concat([a, b], ignore_index=True)
+
+    _assert_sketched(both, compute_key_metrics(both), combined.key_metrics())
+    _assert_same(detect_trends(both), combined.trends())
+    _assert_same(compute_correlations(both), combined.correlations())
+
+
+
+def test_complete_rows_store_only_comoments():
+    a = _frame(300, seed=11).drop(columns=["empty"]).dropna()
+    b = _frame(200, seed=12).drop(columns=["empty"]).dropna()
+    acc = MetricsAccumulator().update(a)
+    assert not acc.gaps and acc.pair_n is None
+
+    with np.load(io.BytesIO(acc.to_bytes())) as z:
+        assert [f for f in z.files if z[f].ndim == 2] == ["comoment"]
+
+    # Columns in another order stay gap-free; a gap then materialises the
+    # pairwise matrices without changing any result
+    both = pd.concat([a, b, _frame(100, seed=13)], ignore_index=True)
+    merged = combine_summaries([acc.to_bytes(), MetricsAccumulator().update(b[b.columns[::-1]]).to_bytes()])
+    assert not merged.gaps
+    merged.merge(MetricsAccumulator().update(_frame(100, seed=13)))
+    assert merged.gaps
+    _assert_sketched(both, compute_key_metrics(both), merged.key_metrics())
+    _assert_same(compute_correlations(both, threshold=0.0), merged.correlations(threshold=0.0))
+
+
+def test_pairwise_state_is_dropped_above_the_column_cap(tmp_path):
+    df = _frame(300, seed=14)
+    path = tmp_path / "wide.csv"
+    df.to_csv(path, index=False)
+    parsed = pd.read_csv(path)
+
+    km, tr, corr = stream_csv_metrics(str(path), chunk_rows=64, max_pair_columns=3)
+    assert corr == []
+    _assert_sketched(parsed, compute_key_metrics(parsed), km)
+    _assert_same(detect_trends(parsed), tr)
+
+    narrow = MetricsAccumulator(max_pair_columns=3).update(df[["revenue", "units"]])
+    assert narrow.pairwise
+    restored = MetricsAccumulator.from_bytes(narrow.merge(MetricsAccumulator().update(df)).to_bytes())
+    assert not restored.pairwise and restored.comoment is None
+    assert restored.correlations(threshold=0.0) == []
+
+
+def test_version_2_summaries_still_load():
+    # Version 2 stored the four pairwise matrices and sketches, no trend arrays
+    df = _frame(300, seed=15)
+    acc = MetricsAccumulator().update(df)
+    with np.load(io.BytesIO(acc.to_bytes())) as z:
+        arrays = {f: z[f] for f in ("meta", "sketch_values", "total", "min", "max", "first", "last", "comoment")}
+    meta = json.loads(str(arrays.pop("meta")))
+    meta = {k: v for k, v in meta.items() if k not in ("pairwise", "gaps", "trend_ok", "time_axis")}
+    meta["version"] = 2
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf, meta=np.array(json.dumps(meta)), **arrays,
+        **{a: np.array(m) for a, m in zip(("pair_n", "pair_mean", "pair_m2"), acc._pairs())},
+    )
+
+    old = MetricsAccumulator.from_bytes(buf.getvalue())
+    _assert_same(acc.key_metrics(), old.key_metrics())
+    _assert_same(acc.correlations(threshold=0.0), old.correlations(threshold=0.0))
+    _assert_same(detect_trends(df), old.trends("regression"))
+
+def test_kll_sketch_rank_error_and_merge():
+    rng = np.random.default_rng(6)
+    data = rng.lognormal(3, 1, 200_000)
+    sketch = KLLSketch()
+    for part in np.array_split(data, 3):
+        sub = KLLSketch()
+        for chunk in np.array_split(part, 17):
+            sub.update(chunk)
+        sketch.merge(sub)
+
+    assert sketch.n == len(data)
+    assert sum(len(lv) for lv in sketch.levels) < 3 * sketch.k
+    values = np.sort(data)
+    qs = [0.01, 0.5, 0.9, 0.99]
+    for q, est in zip(qs, sketch.quantiles(qs)):
+        assert abs(np.searchsorted(values, est) / len(values) - q) <= RANK_EPS
+
+
+@pytest.mark.parametrize("gaps", [True, False])
+def test_blocked_correlations_match_pandas(gaps):
+    df = _frame(400, seed=7)
+    if not gaps:
+        df = df.drop(columns=["empty"]).dropna()
+    expected = compute_correlations(df, threshold=0.0)
+
+    _assert_same(expected, correlation_pairs(df, threshold=0.0, block_cols=2))
+    # Tiny row blocks: every tile is accumulated over many of them
+    num = df.select_dtypes(include=["number"])
+    x = num.to_numpy(dtype="float64", na_value=np.nan)
+    _assert_same(expected, pairs_from_array(x, num.columns.tolist(), threshold=0.0, block_cols=2, block_cells=20))
+
+    top = correlation_pairs(df, threshold=0.0, top_k=3, block_cols=2)
+    strongest = sorted(expected, key=lambda c: -abs(c["coefficient"]))[:3]
+    assert [(c["a"], c["b"]) for c in top] == [(c["a"], c["b"]) for c in strongest]
+
+    single = correlation_pairs(df, threshold=0.0, dtype="float32")
+    assert [c["coefficient"] for c in single] == pytest.approx([c["coefficient"] for c in expected], abs=1e-3)
+
+
+def _dated_frame(rows=600, seed=8):
+    rng = np.random.default_rng(seed)
+    t = np.arange(rows, dtype="float64")
+    df = pd.DataFrame({
+        "day": pd.date_range("2024-01-01", periods=rows, freq="D").strftime("%Y-%m-%d"),
+        "sales": 100 + 0.5 * t + rng.normal(0, 3, rows),
+        "churn": 50 - 0.05 * t + rng.normal(0, 1, rows),
+    })
+    # One wild last row would flip an endpoint comparison
+    df.loc[rows - 1, "sales"] = 1.0
+    df.loc[rng.choice(rows, 50, replace=False), "churn"] = np.nan
+    return df
+
+
+def test_regression_trends_use_dates_and_resist_outliers():
+    df = _dated_frame()
+    trends = {t["metric"]: t for t in regression_trends(df, window=100)}
+
+    assert trends["sales"]["axis"] == "day"
+    assert trends["sales"]["direction"] == "up"
+    assert trends["sales"]["slope"] == pytest.approx(0.5, rel=0.05)
+    assert trends["churn"]["direction"] == "down"
+    assert "recent_slope" in trends["sales"]
+    assert {t["metric"]: t["direction"] for t in detect_trends(df)}["sales"] == "down"
+
+
+@pytest.mark.parametrize("chunk_rows", [7, 1000])
+def test_regression_trends_stream_and_merge(tmp_path, chunk_rows):
+    df = _dated_frame()
+    path = tmp_path / "dated.csv"
+    df.to_csv(path, index=False)
+    parsed = pd.read_csv(path)
+
+    _, tr, _ = stream_csv_metrics(str(path), chunk_rows=chunk_rows, trend_method="regression")
+    _assert_same(regression_trends(parsed), tr)
+
+    a, b = _frame(300, seed=9), _frame(200, seed=10)
+    blobs = [MetricsAccumulator().update(a).to_bytes(), MetricsAccumulator().update(b).to_bytes()]
+    both = pd.concat([a, b], ignore_index=True)
+    _assert_same(regression_trends(both), combine_summaries(blobs).trends("regression"))
@@ -0,0 +1,191 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import threading
+
+import numpy as np
+import pytest
+
+from app.ai import captioning, models
+from app.config import settings
+from app.services.model_server import ModelServer, ModelClient, ModelServerError
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # Stand-ins for the real models, which tests do not download
+    monkeypatch.setattr(captioning, "caption_local", lambda path: f"caption of {os.path.basename(path)}")
+
+    def embed(texts):
+        if not texts:
+            raise ValueError("nothing to embed")
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+    monkeypatch.setattr(models, "embed_local", embed)
+
+    path = str(tmp_path / "models.sock")
+    srv = ModelServer(path, preload=False)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_workers_share_one_server(server):
+    client = ModelClient(server, timeout=5)
+    assert client.call("ping") == "pong"
+    assert client.caption("uploads/chart.png") == "caption of chart.png"
+    emb = client.embed(["ab", "abcd"])
+    assert emb.dtype == np.float32 and emb.tolist() == [[2.0, 1.0], [4.0, 1.0]]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.embed(["x" * 3]).tolist())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [[[3.0, 1.0]]] * 8
+
+
+def test_server_errors_reach_the_caller(server):
+    client = ModelClient(server, timeout=5)
+    with pytest.raises(ModelServerError, match="nothing to embed"):
+        client.embed([])
+    # The connection survives a failed request
+    assert client.call("ping") == "pong"
+
+
+def test_caption_batcher_groups_concurrent_requests():
+    sizes = []
+
+    def run_batch(images):
+        sizes.append(len(images))
+        if "bad" in images:
+            raise ValueError("decode failed")
+        return [f"caption {i}" for i in images]
+
+    batcher = captioning.CaptionBatcher(run_batch, max_batch=4, max_wait=0.2)
+    futures = [batcher.submit(i) for i in range(10)]
+    assert [f.result(timeout=5) for f in futures] == [f"caption {i}" for i in range(10)]
+    assert sizes == [4, 4, 2]
+
+    # A lone request goes out after max_wait, and a failing batch fails only its callers
+    with pytest.raises(ValueError):
+        batcher.caption("bad")
+    assert batcher.caption(7) == "caption 7"
+
+    # A bad image sharing a batch fails only its own caller
+    shared = [batcher.submit(i) for i in (1, "bad", 2)]
+    assert shared[0].result(timeout=5) == "caption 1" and shared[2].result(timeout=5) == "caption 2"
+    with pytest.raises(ValueError):
+        shared[1].result(timeout=5)
+
+
+def test_batcher_fails_short_results_and_times_out():
+    release = threading.Event()
+
+    def run_batch(items):
+        if "hang" in items:
+            release.wait(5)
+        return items[:-1]
+
+    batcher = captioning.CaptionBatcher(run_batch, max_batch=4, max_wait=0.1, timeout=0.5)
+    futures = [batcher.submit(i) for i in range(3)]
+    for fut in futures:
+        with pytest.raises(RuntimeError):
+            fut.result(timeout=5)
+
+    with pytest.raises(TimeoutError):
+        batcher.caption("hang")
+    release.set()
+
+
+def test_captions_are_cached_by_checksum(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.ai import vision
+    from app.db.database import Base
+    from app.services import caption_cache
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(caption_cache, "SessionLocal", sessionmaker(bind=engine))
+    calls = []
+    monkeypatch.setattr(vision, "caption_local", lambda path: calls.append(path) or "a bar chart")
+
+    image = tmp_path / "chart.png"
+    image.write_bytes(b"not really a png")
+    copy = tmp_path / "same_chart.png"
+    copy.write_bytes(image.read_bytes())
+
+    assert vision.extract_image_text(str(image))["caption"] == "a bar chart"
+    # Same bytes under another name, with and without a known checksum
+    assert vision.extract_image_text(str(copy))["caption"] == "a bar chart"
+    checksum = vision.file_sha256(str(image))
+    assert vision.extract_image_text("s3://bucket/never-fetched.png", checksum=checksum)["caption"] == "a bar chart"
+    assert calls == [str(image)]
+
+    monkeypatch.setattr(models, "CAPTION_GENERATION", {"num_beams": 3})
+    vision.extract_image_text(str(copy))
+    assert calls == [str(image), str(copy)]
+
+    # Another backend may word captions differently, so it is cached apart
+    monkeypatch.setattr(settings, "CAPTION_BACKEND", "torch-int8")
+    vision.extract_image_text(str(copy))
+    assert calls == [str(image), str(copy), str(copy)]
+
+
+def test_unknown_caption_backend_is_rejected():
+    from app.ai.caption_backends import apply_backend
+
+    with pytest.raises(ValueError, match="CAPTION_BACKEND"):
+        apply_backend(object(), "tensorrt")
+
+
+@pytest.mark.parametrize("fmt, mode", [("JPEG", "RGB"), ("PNG", "RGBA"), ("PNG", "P")])
+def test_images_are_prepared_at_model_size_and_cached(tmp_path, fmt, mode):
+    from PIL import Image
+    from app.ai.image_prep import TARGET_SIZE, cache_prepared_image, load_prepared_image
+
+    path = str(tmp_path / "upload")
+    Image.new(mode, (2000, 1200), 120).save(path, format=fmt)
+
+    cached = cache_prepared_image(path)
+    os.remove(path)
+    img = load_prepared_image(path)
+    assert cached.endswith(".npy")
+    assert img.size == TARGET_SIZE and img.mode == "RGB"
+
+
+def test_timed_out_requests_are_not_resent(server, monkeypatch):
+    from app.services import model_server
+
+    calls = []
+    release = threading.Event()
+
+    def slow(req):
+        calls.append(req["path"])
+        release.wait(5)
+        return "late"
+
+    monkeypatch.setitem(model_server._OPS, "caption", slow)
+    client = ModelClient(server, timeout=0.3)
+    with pytest.raises(TimeoutError):
+        client.caption("chart.png")
+    release.set()
+    assert len(calls) == 1
+    assert client.call("ping") == "pong"
+
+
+def test_client_reconnects_when_its_pooled_connection_is_gone(server):
+    import socket
+
+    client = ModelClient(server, timeout=5)
+    # As after a server restart: the peer of this thread's socket has closed
+    stale, peer = socket.socketpair(socket.AF_UNIX)
+    peer.close()
+    client._local.sock = stale
+    assert client.call("ping") == "pong"
+    assert client._local.sock is not stale
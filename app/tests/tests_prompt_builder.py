@@ -0,0 +1,50 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import numpy as np
+import pandas as pd
+
+from app.ai.langchain_agent import build_prompt
+from app.ai.prompt_builder import estimate_tokens, legacy_csv_block, render_csv_insights
+from app.utils.metrics import compute_all_metrics
+
+
+def _wide_analysis(cols: int = 300, rows: int = 500) -> dict:
+    rng = np.random.default_rng(0)
+    data = {f"flat_{i}": 100 + rng.normal(0, 0.1, rows) for i in range(cols - 2)}
+    # One column that grows sharply and one that swings widely
+    data["revenue"] = np.linspace(100, 400, rows) + rng.normal(0, 5, rows)
+    data["churn"] = rng.normal(1, 3, rows)
+    km, tr, corr = compute_all_metrics(pd.DataFrame(data))
+    return {"file": "wide.csv", "key_metrics": km, "trends": tr, "correlations": corr}
+
+
+def test_wide_file_fits_budget_and_keeps_salient_columns():
+    analysis = _wide_analysis()
+    text = render_csv_insights([analysis], budget=600)
+
+    assert estimate_tokens(text) <= 600 < estimate_tokens(legacy_csv_block(analysis)) // 10
+    lines = text.splitlines()
+    assert lines[0].startswith("File: wide.csv (row_count=500, column_count=300)")
+    assert {lines[2].split(":")[0], lines[3].split(":")[0]} == {"revenue", "churn"}
+    assert any(line.startswith("(+") and "omitted" in line for line in lines)
+
+
+def test_budget_is_shared_fairly_and_whole_prompt_respects_it():
+    a, b = _wide_analysis(), dict(_wide_analysis(), file="other.csv")
+    text = render_csv_insights([a, b], budget=400)
+    assert "\nrevenue: " in text.split("File: other.csv")[0]
+    assert "\nrevenue: " in text.split("File: other.csv")[1]
+
+    prompt = build_prompt([a, b], ["chart.png: a line chart"], budget=1200)
+    assert estimate_tokens(prompt) <= 1200
+    assert "chart.png: a line chart" in prompt
+
+
+def test_small_file_is_rendered_in_full():
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0, 4.0], "b": [2.0, 4.0, 6.0, 8.1]})
+    km, tr, corr = compute_all_metrics(df)
+    text = render_csv_insights([{"file": "s.csv", "key_metrics": km, "trends": tr, "correlations": corr}], budget=4000)
+    assert "omitted" not in text
+    assert "a ~ b: r=1.00" in text
+    assert "a: mean=2.5 std=1.118 min=1 p50=2 p90=4 p99=4 max=4 sum=10 trend=up 300%" in text
@@ -0,0 +1,108 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import threading
+import uuid
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qdrant_client")
+
+from app.config import settings
+from app.services.qdrant_client import QdrantWrapper, point_id
+
+
+@pytest.fixture
+def wrapper(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_BACKEND", "qdrant")
+    monkeypatch.setattr(settings, "QDRANT_URL", ":memory:")
+    monkeypatch.setattr(settings, "QDRANT_BATCH_SIZE", 8)
+    monkeypatch.setattr(settings, "QDRANT_FLUSH_MS", 20)
+    return QdrantWrapper()
+
+
+def test_point_ids_are_valid_and_deterministic():
+    assert point_id(7) == 7
+    u = str(uuid.uuid4())
+    assert point_id(u) == u
+    assert point_id("abc_0") == point_id("abc_0") != point_id("abc_1")
+    uuid.UUID(point_id("abc_0"))
+
+
+def test_creates_collection_and_searches_with_filters(wrapper):
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(20, 16)).astype(np.float32)
+    ids = [f"rep{i // 2}_{i % 2}" for i in range(20)]
+    payloads = [{"report_id": f"rep{i // 2}", "upload_id": f"up{i % 3}"} for i in range(20)]
+
+    assert wrapper.search("reports", vecs[0]) == []
+    wrapper.upsert("reports", ids, vecs, payloads)
+
+    info = wrapper.client.get_collection("reports")
+    assert info.config.params.vectors.size == 16
+    assert info.points_count == 20
+
+    hits = wrapper.search("reports", vecs[3], top=3)
+    assert hits[0][0] == "rep1_1" and hits[0][1] > 0.999
+    assert hits[0][2] == {"report_id": "rep1", "upload_id": "up0"}
+
+    hits = wrapper.search("reports", vecs[3], top=10, where={"upload_id": ["up1", "up2"]})
+    assert hits and "rep1_1" not in [h[0] for h in hits]
+    assert all(h[2]["upload_id"] in ("up1", "up2") for h in hits)
+
+    batch = wrapper.search_batch("reports", vecs[2:4], top=1, where={"report_id": "rep1"})
+    assert [[h[0] for h in hits] for hits in batch] == [["rep1_0"], ["rep1_1"]]
+
+    # Same keys overwrite rather than duplicate
+    wrapper.upsert("reports", ids[:5], vecs[:5], payloads[:5])
+    assert wrapper.client.get_collection("reports").points_count == 20
+
+
+def test_concurrent_upserts_are_batched(wrapper, monkeypatch):
+    calls = []
+    real_upsert = wrapper.client.upsert
+    monkeypatch.setattr(wrapper.client, "upsert", lambda **kw: calls.append(len(kw["points"])) or real_upsert(**kw))
+
+    vecs = np.random.default_rng(1).normal(size=(32, 8)).astype(np.float32)
+    threads = [
+        threading.Thread(target=wrapper.upsert, args=("reports", [f"r{i}"], vecs[i:i + 1], [{"report_id": f"r{i}"}]))
+        for i in range(32)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(calls) == 32
+    assert len(calls) < 32 and max(calls) <= settings.QDRANT_BATCH_SIZE
+    assert wrapper.client.count("reports").count == 32
+
+
+def test_write_failures_reach_only_their_caller(wrapper, monkeypatch):
+    wrapper.upsert("reports", ["a"], np.ones((1, 4), dtype=np.float32), [{}])
+    with pytest.raises(Exception):
+        wrapper.upsert("reports", ["b"], np.ones((1, 6), dtype=np.float32), [{}])
+
+    # A bad caller sharing a batch with good ones, across two collections
+    monkeypatch.setattr(settings, "QDRANT_FLUSH_MS", 200)
+    batched = QdrantWrapper()
+    batched.upsert("reports", ["a"], np.ones((1, 4), dtype=np.float32), [{}])
+    good = batched.upsert("reports", ["c"], np.ones((1, 4), dtype=np.float32), [{}], wait=False)
+    bad = batched.upsert("reports", ["d", "e"], np.ones((2, 6), dtype=np.float32), [{}, {}], wait=False)
+    other = batched.upsert("charts", ["f"], np.ones((1, 6), dtype=np.float32), [{}], wait=False)
+    assert good[0].result() is None and other[0].result() is None
+    for fut in bad:
+        with pytest.raises(Exception):
+            fut.result()
+    assert batched.client.count("reports").count == 2
+    assert batched.client.count("charts").count == 1
+
+
+def test_local_backend_is_used_when_selected(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "VECTOR_BACKEND", "local")
+    monkeypatch.setattr(settings, "VECTOR_STORE_DIR", str(tmp_path))
+    wrapper = QdrantWrapper()
+    assert wrapper.client is None
+    wrapper.upsert("reports", ["x_0"], np.ones((1, 4), dtype=np.float32), [{"report_id": "x"}])
+    assert wrapper.search("reports", np.ones(4), where={"report_id": "x"})[0][0] == "x_0"
@@ -0,0 +1,125 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.db.models import ReportJob
+from app.services import report_jobs
+from app.services.report_jobs import JobQueue
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(report_jobs, "SessionLocal", factory)
+    return factory
+
+
+def _add_jobs(factory, n, status="queued", owner=None, age_s=0.0):
+    db = factory()
+    stamp = datetime.utcnow() - timedelta(seconds=age_s)
+    for i in range(n):
+        db.add(ReportJob(id=f"job{i}", upload_id="u", status=status, request_json={}, owner=owner, created_at=stamp, updated_at=stamp))
+    db.commit()
+    db.close()
+
+
+def _wait_done(factory, n, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        db = factory()
+        done = db.query(ReportJob).filter(ReportJob.status == "done").count()
+        db.close()
+        if done == n:
+            return
+        time.sleep(0.02)
+    raise AssertionError("jobs did not finish")
+
+
+def test_each_orphaned_job_runs_once_across_processes(session_factory):
+    _add_jobs(session_factory, 6, status="running", owner="dead-host:1:abc", age_s=3600)
+    runs, lock = [], threading.Lock()
+
+    def handler(db, job, progress):
+        with lock:
+            runs.append(job.id)
+        return {"job": job.id}
+
+    queues = [JobQueue(handler, workers=2, queue_depth=4) for _ in range(4)]
+    threads = [threading.Thread(target=q.claim_orphans) for q in queues]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    _wait_done(session_factory, 6)
+    assert sorted(runs) == [f"job{i}" for i in range(6)]
+    db = session_factory()
+    assert {row.result_json["job"] for row in db.query(ReportJob)} == {f"job{i}" for i in range(6)}
+    db.close()
+
+
+def test_live_owners_keep_their_jobs(session_factory):
+    _add_jobs(session_factory, 3, status="running", owner="live-host:2:def")
+    q = JobQueue(lambda db, job, progress: {}, workers=1, queue_depth=0)
+    assert q.claim_orphans() == 0
+
+
+def test_resume_does_not_block_on_a_large_backlog(session_factory):
+    _add_jobs(session_factory, 10)
+    release = threading.Event()
+    q = JobQueue(lambda db, job, progress: release.wait(10) and {}, workers=1, queue_depth=1)
+
+    start = time.monotonic()
+    assert q.resume() == 2
+    assert time.monotonic() - start < 1
+    q.stop()
+
+    # The rest stay queued and unowned until slots free up
+    db = session_factory()
+    assert db.query(ReportJob).filter(ReportJob.owner.is_(None)).count() == 8
+    db.close()
+    release.set()
+    _wait_done(session_factory, 2)
+    assert q.claim_orphans() == 2
+
+
+def test_job_taken_over_mid_run_is_abandoned(session_factory):
+    steps, taken = [], threading.Event()
+
+    def handler(db, job, progress):
+        progress("csv", 10)
+        steps.append("csv")
+        other = session_factory()
+        other.query(ReportJob).filter(ReportJob.id == job.id).update({"owner": "other-host:9:fff", "status": "running"})
+        other.commit()
+        other.close()
+        try:
+            progress("pdf", 75)
+            steps.append("pdf")
+        finally:
+            taken.set()
+        return {"done": True}
+
+    q = JobQueue(handler, workers=1, queue_depth=0)
+    db = session_factory()
+    job = q.submit(db, "u", {})
+    db.close()
+    assert taken.wait(5)
+    q._executor.shutdown(wait=True)
+    q.stop()
+
+    assert steps == ["csv"]
+    assert q._heartbeat is not None  # started by submit, not only by resume
+    db = session_factory()
+    row = db.get(ReportJob, job.id)
+    assert (row.owner, row.status, row.stage, row.result_json) == ("other-host:9:fff", "running", "csv", None)
+    db.close()
@@ -0,0 +1,110 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.ai import langchain_agent
+from app.config import settings
+from app.db.database import Base
+from app.db.models import FileMeta, Report, Upload
+from app.main import app
+from app.routes import report
+from app.services import llm_cache as llm_cache_module
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_gateway import LLMGateway
+from app.services.llm_stub import ChatCompletionsStub
+
+
+def _events(body: str) -> list[tuple[str, dict]]:
+    out = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+@pytest.fixture
+def stream_env(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(report, "SessionLocal", Session)
+    monkeypatch.setattr(llm_cache_module, "SessionLocal", Session)
+    monkeypatch.setattr(langchain_agent, "llm_cache", LLMResponseCache(max_entries=8, ttl=3600))
+
+    stub = ChatCompletionsStub(reply=json.dumps({"summary": "Revenue is rising.", "recommendations": ["Spend more"]})).start()
+    gateway = LLMGateway(stub.url, "key", 2, 5.0, 1)
+    monkeypatch.setattr(langchain_agent, "get_llm_gateway", lambda: gateway)
+
+    indexed = []
+    monkeypatch.setattr(report, "_index_report", lambda report_id, upload_id, out: indexed.append(report_id) or True)
+
+    csv = tmp_path / "sales.csv"
+    csv.write_text("month,revenue,cost\n1,100,50\n2,150,60\n3,210,65\n4,260,80\n")
+    db = Session()
+    db.add(Upload(id="u1"))
+    db.add(FileMeta(id="f1", upload_id="u1", filename="sales.csv", blob_path=str(csv), size=csv.stat().st_size))
+    db.commit()
+    db.close()
+
+    yield TestClient(app), Session, stub, indexed
+    gateway.close()
+    stub.stop()
+
+
+def test_report_streams_metrics_then_tokens_then_report(stream_env, monkeypatch):
+    client, Session, stub, indexed = stream_env
+    headers = {"Authorization": settings.API_TOKEN}
+
+    # Resolving inputs can download from S3, so it must not run on the event loop
+    on_loop = []
+    start_analysis = report._start_analysis
+
+    def spy(*args):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return start_analysis(*args)
+
+    monkeypatch.setattr(report, "_start_analysis", spy)
+
+    r = client.post("/generate-report/stream", json={"upload_id": "u1"}, headers=headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    kinds = [k for k, _ in events]
+
+    assert kinds[0] == "start" and kinds[1] == "metrics"
+    assert events[1][1]["file"] == "sales.csv" and "revenue_mean" in events[1][1]["key_metrics"]
+    assert kinds.count("token") > 1
+    assert kinds[-2:] == ["report", "done"]
+    tokens = "".join(d["text"] for k, d in events if k == "token")
+    assert json.loads(tokens)["summary"] == "Revenue is rising."
+
+    body = events[-2][1]
+    assert body["summary"] == "Revenue is rising." and body["recommendations"] == ["Spend more"]
+    assert events[-1][1] == {"report_id": body["report_id"], "pdf_path": None, "indexed": True}
+    assert indexed == [body["report_id"]]
+    assert on_loop == [False]
+    db = Session()
+    assert db.get(Report, body["report_id"]).report_json["summary"] == "Revenue is rising."
+    db.close()
+
+    # Unchanged inputs: straight to the cached report, no LLM call
+    events = _events(client.post("/generate-report/stream", json={"upload_id": "u1"}, headers=headers).text)
+    assert "token" not in [k for k, _ in events]
+    assert len(stub.requests) == 1
+
+
+def test_unknown_upload_is_rejected_before_streaming(stream_env):
+    client, *_ = stream_env
+    r = client.post("/generate-report/stream", json={"upload_id": "nope"}, headers={"Authorization": settings.API_TOKEN})
+    assert r.status_code == 404
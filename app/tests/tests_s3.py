@@ -0,0 +1,210 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import asyncio
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.config import settings
+from app.services import s3_client
+
+BUCKET = "datalens-test"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(settings, "AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setattr(settings, "AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(settings, "AWS_S3_BUCKET", BUCKET)
+    monkeypatch.setattr(settings, "AWS_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "S3_MULTIPART_THRESHOLD", 5 * 1024 * 1024)
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNKSIZE", 5 * 1024 * 1024)
+    s3_client.get_s3_client.cache_clear()
+    s3_client.get_transfer_config.cache_clear()
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield s3_client.get_s3_client()
+    s3_client.get_s3_client.cache_clear()
+    s3_client.get_transfer_config.cache_clear()
+
+
+def test_client_is_shared(s3):
+    assert s3_client.get_s3_client() is s3
+
+
+def test_upload_download_roundtrip(s3, tmp_path):
+    src = tmp_path / "sales.csv"
+    src.write_bytes(b"a,b\n1,2\n3,4\n")
+    uri = s3_client.upload_to_s3(str(src), key="blobs/abc")
+    assert uri == f"s3://{BUCKET}/blobs/abc"
+
+    dest = tmp_path / "out" / "sales.csv"
+    assert s3_client.download_from_s3(uri, str(dest)) == str(dest)
+    assert dest.read_bytes() == src.read_bytes()
+
+
+def test_multipart_upload(s3, tmp_path):
+    src = tmp_path / "big.bin"
+    src.write_bytes(os.urandom(12 * 1024 * 1024))
+    s3_client.upload_to_s3(str(src), key="big")
+    etag = s3.head_object(Bucket=BUCKET, Key="big")["ETag"]
+    # Multipart ETags carry the part count after a dash
+    assert etag.strip('"').endswith("-3")
+
+
+def test_async_uploads_run_together(s3, tmp_path):
+    paths = []
+    for i in range(4):
+        p = tmp_path / f"f{i}.csv"
+        p.write_bytes(f"x\n{i}\n".encode())
+        paths.append(str(p))
+
+    async def send_all():
+        return await asyncio.gather(*(s3_client.upload_to_s3_async(p, key=f"k{i}") for i, p in enumerate(paths)))
+
+    uris = asyncio.run(send_all())
+    assert uris == [f"s3://{BUCKET}/k{i}" for i in range(4)]
+    keys = {o["Key"] for o in s3.list_objects_v2(Bucket=BUCKET)["Contents"]}
+    assert keys == {"k0", "k1", "k2", "k3"}
+
+
+def test_object_cache_hits_and_evicts(s3, tmp_path):
+    from app.services.object_cache import ObjectCache
+
+    cache = ObjectCache(str(tmp_path / "cache"), max_bytes=25)
+    uris = []
+    for i in range(3):
+        src = tmp_path / f"o{i}.csv"
+        src.write_bytes(bytes([65 + i]) * 10)
+        uris.append(s3_client.upload_to_s3(str(src), key=f"o{i}"))
+
+    def get(i):
+        return cache.get_or_fetch(f"sum{i}", lambda dest: s3_client.download_from_s3(uris[i], dest))
+
+    first = get(0)
+    assert get(0) == first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    get(1)
+    get(2)  # 30 bytes > 25: the least recently used entry goes
+    assert not os.path.exists(first)
+    assert cache.stats()["evictions"] == 1
+    assert open(get(2), "rb").read() == b"C" * 10
+
+
+def test_leased_objects_survive_eviction(s3, tmp_path):
+    from app.services.object_cache import ObjectCache
+
+    cache = ObjectCache(str(tmp_path / "cache"), max_bytes=25)
+    uris = []
+    for i in range(3):
+        src = tmp_path / f"o{i}.csv"
+        src.write_bytes(bytes([65 + i]) * 10)
+        uris.append(s3_client.upload_to_s3(str(src), key=f"l{i}"))
+
+    def fetch(i):
+        return lambda dest: s3_client.download_from_s3(uris[i], dest)
+
+    # One report's inputs add up to more than the cache holds
+    with cache.lease("sum0", fetch(0)) as first, cache.lease("sum1", fetch(1)) as second:
+        with cache.lease("sum2", fetch(2)) as third:
+            assert all(os.path.exists(p) for p in (first, second, third))
+            assert cache.stats()["evictions"] == 0
+        # Once released, the only unpinned entry goes to get back under budget
+        assert not os.path.exists(third)
+        assert open(first, "rb").read() == b"A" * 10
+    assert cache.stats()["bytes"] <= 25
+
+
+def _hold_lease(root, held, done):
+    from app.services.object_cache import ObjectCache
+
+    cache = ObjectCache(root, max_bytes=25)
+    with cache.lease("sum0", lambda dest: open(dest, "wb").write(b"A" * 10)):
+        held.set()
+        done.wait(30)
+
+
+def test_leases_hold_across_worker_processes(tmp_path):
+    import multiprocessing
+
+    from app.services.object_cache import ObjectCache
+
+    root = str(tmp_path / "cache")
+    ctx = multiprocessing.get_context("spawn")
+    held, done = ctx.Event(), ctx.Event()
+    worker = ctx.Process(target=_hold_lease, args=(root, held, done))
+    worker.start()
+    try:
+        assert held.wait(30)
+        cache = ObjectCache(root, max_bytes=25)
+        for i in (1, 2):
+            cache.get_or_fetch(f"sum{i}", lambda dest: open(dest, "wb").write(b"B" * 10))
+        # Over budget, but the entry the other worker is reading stays
+        leased = cache.path_for("sum0")
+        assert os.path.exists(leased) and cache.stats()["evictions"] == 1
+    finally:
+        done.set()
+        worker.join(30)
+    assert worker.exitcode == 0
+
+    cache.get_or_fetch("sum3", lambda dest: open(dest, "wb").write(b"C" * 10))
+    assert not os.path.exists(leased) and not os.path.exists(f"{leased}.lock")
+    assert cache.stats()["bytes"] <= 25
+
+
+def test_concurrent_downloads_to_one_path(s3, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    src = tmp_path / "big.csv"
+    src.write_bytes(os.urandom(256 * 1024))
+    uri = s3_client.upload_to_s3(str(src), key="same")
+    dest = str(tmp_path / "out" / "same.csv")
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda _: s3_client.download_from_s3(uri, dest), range(8)))
+    assert open(dest, "rb").read() == src.read_bytes()
+    assert os.listdir(tmp_path / "out") == ["same.csv"]
+
+
+def test_failed_s3_put_undoes_the_upload(s3, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.db.database import Base, get_db
+    from app.db.models import FileMeta, Upload
+    from app.main import app
+    from app.routes import upload
+    from app.services.storage import INCOMING_DIR
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(INCOMING_DIR)
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def failing_put(path, key=None):
+        raise RuntimeError("S3 PUT failed")
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, get_test_db)
+    monkeypatch.setattr(upload, "upload_to_s3_async", failing_put)
+    client = TestClient(app, raise_server_exceptions=False)
+    files = [("csv_files", ("sales.csv", b"month,revenue\n1,10\n2,12\n", "text/csv"))]
+    r = client.post("/upload", files=files, headers={"Authorization": settings.API_TOKEN})
+
+    assert r.status_code == 500
+    db = Session()
+    assert db.query(Upload).count() == 0 and db.query(FileMeta).count() == 0
+    db.close()
+    leftovers = [os.path.join(d, f) for d, _, names in os.walk("uploads") for f in names]
+    assert leftovers == []
+    assert not upload._in_use
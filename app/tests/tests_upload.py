@@ -0,0 +1,193 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import hashlib
+import json
+
+import boto3
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from moto import mock_aws
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.db.database import Base, get_db
+from app.db.models import FileMeta, Upload
+from app.main import app
+from app.routes import report, upload
+from app.services import s3_client
+from app.services.analysis import analyze_csv
+from app.services.columnar import read_csv_frame
+from app.services.storage import INCOMING_DIR, blob_path_for
+from app.utils.metrics import compute_key_metrics
+
+BUCKET = "datalens-test"
+SALES = b"month,region,revenue,cost\n1,n,100,50\n2,s,150,60\n3,n,210,65\n4,s,260,80\n"
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(INCOMING_DIR)
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, get_test_db)
+    monkeypatch.setattr(settings, "IMAGE_PREP_ON_UPLOAD", False)
+    return TestClient(app, raise_server_exceptions=False), Session
+
+
+def _post(client, *files):
+    return client.post("/upload", files=[("csv_files", (name, body, "text/csv")) for name, body in files])
+
+
+def _incoming_leftovers():
+    return os.listdir(INCOMING_DIR)
+
+
+def _stored_files():
+    return [os.path.join(d, f) for d, _, names in os.walk("uploads") for f in names]
+
+
+def test_file_over_the_size_limit_is_rejected(api, monkeypatch):
+    client, Session = api
+    monkeypatch.setattr(settings, "MAX_UPLOAD_FILE_BYTES", 64)
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 16)
+
+    r = _post(client, ("small.csv", SALES[:40]), ("big.csv", SALES * 4))
+
+    assert r.status_code == 413 and "big.csv" in r.json()["detail"]
+    assert _incoming_leftovers() == [] and _stored_files() == []
+    db = Session()
+    assert db.query(Upload).count() == 0 and db.query(FileMeta).count() == 0
+    db.close()
+
+
+def test_request_over_the_size_limit_is_rejected(api, monkeypatch):
+    client, Session = api
+    # Each file fits, together they do not; a chunked body has no
+    # Content-Length, so the limit is enforced while streaming
+    monkeypatch.setattr(settings, "MAX_UPLOAD_REQUEST_BYTES", len(SALES) + 40)
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 16)
+    boundary = "datalens-boundary"
+    body = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="csv_files"; filename="{name}"\r\n'
+        f"Content-Type: text/csv\r\n\r\n".encode() + SALES + b"\r\n"
+        for name in ("a.csv", "b.csv")
+    ) + f"--{boundary}--\r\n".encode()
+
+    r = client.post(
+        "/upload",
+        content=iter([body[i:i + 64] for i in range(0, len(body), 64)]),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+
+    assert r.status_code == 413 and "b.csv" in r.json()["detail"]
+    assert _incoming_leftovers() == [] and _stored_files() == []
+    db = Session()
+    assert db.query(Upload).count() == 0
+    db.close()
+
+
+def test_declared_length_over_the_limit_is_refused_before_reading(api, monkeypatch):
+    client, _ = api
+    monkeypatch.setattr(settings, "MAX_UPLOAD_REQUEST_BYTES", 100)
+    parsed = []
+    monkeypatch.setattr(upload, "stream_upload_to_disk", lambda *a, **kw: parsed.append(a))
+
+    r = _post(client, ("sales.csv", SALES * 4))
+
+    assert r.status_code == 413
+    assert r.json() == {"detail": "Upload exceeds the request size limit"}
+    assert parsed == []
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(settings, "AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setattr(settings, "AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(settings, "AWS_S3_BUCKET", BUCKET)
+    monkeypatch.setattr(settings, "AWS_REGION", "us-east-1")
+    s3_client.get_s3_client.cache_clear()
+    s3_client.get_transfer_config.cache_clear()
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield s3_client.get_s3_client()
+    s3_client.get_s3_client.cache_clear()
+    s3_client.get_transfer_config.cache_clear()
+
+
+def test_identical_content_is_stored_and_pushed_once(api, s3, monkeypatch):
+    client, Session = api
+    puts = []
+    real_upload = s3_client._upload
+    monkeypatch.setattr(s3_client, "_upload", lambda path, key: puts.append(key) or real_upload(path, key))
+    sha = hashlib.sha256(SALES).hexdigest()
+
+    r = _post(client, ("sales.csv", SALES), ("copy.csv", SALES))
+    assert r.status_code == 200
+    assert _post(client, ("again.csv", SALES)).status_code == 200
+
+    assert sorted(os.listdir(os.path.dirname(blob_path_for(sha)))) == [sha, sha + ".cols"]
+    db = Session()
+    rows = db.query(FileMeta).all()
+    assert len(rows) == 3 and {row.blob_path for row in rows} == {blob_path_for(sha)}
+    assert {row.s3_path for row in rows} == {f"s3://{BUCKET}/blobs/{sha}"}
+    db.close()
+    assert puts == [f"blobs/{sha}"]
+    assert [o["Key"] for o in s3.list_objects_v2(Bucket=BUCKET)["Contents"]] == [f"blobs/{sha}"]
+
+
+def _memory_mapped(arr) -> bool:
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        arr = arr.base
+    return False
+
+
+def test_columnar_cache_is_built_at_ingest_and_read_without_parsing(api, monkeypatch):
+    client, Session = api
+    assert _post(client, ("sales.csv", SALES)).status_code == 200
+    db = Session()
+    f = db.query(FileMeta).one()
+    db.close()
+
+    with open(os.path.join(f.columnar_path, "manifest.json")) as fh:
+        manifest = json.load(fh)
+    assert manifest["row_count"] == 4 and manifest["column_count"] == 4
+    assert manifest["numeric_columns"] == ["month", "revenue", "cost"]
+    assert np.load(os.path.join(f.columnar_path, "numeric.npy")).shape == (4, 3)
+
+    def no_parsing(*args, **kwargs):
+        raise AssertionError("CSV text was parsed")
+
+    monkeypatch.setattr(pd, "read_csv", no_parsing)
+    assert report._csv_source_path(f, None) is None
+
+    df = read_csv_frame(f.blob_path)
+    assert _memory_mapped(df["revenue"].to_numpy())
+    km = compute_key_metrics(df)
+    assert (km["row_count"], km["column_count"]) == (4, 4)
+    assert km["revenue_sum"] == 720.0
+
+    out = analyze_csv("sales.csv", None, f.columnar_path, None)
+    assert out["key_metrics"]["column_count"] == 4
+    assert {c["a"] for c in out["correlations"]} >= {"month"}
+
+    try:
+        from app.ai.tools import csv_metrics_tool
+    except ImportError as e:
+        pytest.skip(f"agent tools unavailable: {e}")
+    assert json.loads(csv_metrics_tool(f.blob_path))["key_metrics"]["row_count"] == 4
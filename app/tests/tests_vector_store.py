@@ -0,0 +1,96 @@
+import os
+os.environ.setdefault("API_TOKEN", "test")
+
+import multiprocessing
+
+import numpy as np
+
+from app.services.vector_store import MIN_CAPACITY, LocalVectorStore
+
+
+def _data(n: int, dim: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vecs = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"r{i}" for i in range(n)]
+    payloads = [{"report_id": f"rep{i % 7}", "kind": "summary" if i % 2 else "metrics"} for i in range(n)]
+    return ids, vecs, payloads
+
+
+def _brute_force(vecs, q, top, rows=None):
+    rows = np.arange(len(vecs)) if rows is None else np.asarray(rows)
+    unit = vecs[rows] / np.linalg.norm(vecs[rows], axis=1, keepdims=True)
+    scores = unit @ (q / np.linalg.norm(q))
+    return [int(rows[i]) for i in np.argsort(-scores)[:top]]
+
+
+def test_search_matches_brute_force_and_survives_restart(tmp_path):
+    n = MIN_CAPACITY * 2 + 10  # forces the file to grow twice
+    ids, vecs, payloads = _data(n)
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert("reports", ids[:100], vecs[:100], payloads[:100])
+    store.upsert("reports", ids[100:], vecs[100:], payloads[100:])
+
+    queries = np.random.default_rng(1).normal(size=(5, 16)).astype(np.float32)
+    batch = store.search_batch("reports", queries, top=10)
+    for q, hits in zip(queries, batch):
+        assert [h[0] for h in hits] == [ids[i] for i in _brute_force(vecs, q, 10)]
+        assert all(a[1] >= b[1] for a, b in zip(hits, hits[1:]))
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.count("reports") == n
+    assert reopened.search_batch("reports", queries, top=10) == batch
+
+
+def test_upsert_replaces_by_id_and_filters_by_payload(tmp_path):
+    ids, vecs, payloads = _data(300)
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert("reports", ids, vecs, payloads)
+
+    # Re-upserting an id overwrites its row and payload
+    store.upsert("reports", ["r5"], vecs[:1] * 3, [{"report_id": "moved", "kind": "summary"}])
+    assert store.count("reports") == 300
+    top = store.search("reports", vecs[0], top=2)
+    assert {h[0] for h in top} == {"r0", "r5"} and top[0][1] > 0.999
+
+    q = vecs[42]
+    hits = store.search("reports", q, top=5, where={"report_id": ["rep1", "rep2"], "kind": "summary"})
+    rows = [i for i, p in enumerate(payloads) if p["report_id"] in ("rep1", "rep2") and p["kind"] == "summary" and i != 5]
+    assert [h[0] for h in hits] == [ids[i] for i in _brute_force(vecs, q, 5, rows)]
+    assert store.search("reports", q, top=5, where={"report_id": "moved"})[0][0] == "r5"
+    assert store.search("reports", q, where={"report_id": "nope"}) == []
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.search("reports", q, top=5, where={"report_id": "moved"})[0][0] == "r5"
+
+
+def _worker_upserts(root: str, worker: int, n: int):
+    ids, vecs, payloads = _data(n, seed=worker)
+    store = LocalVectorStore(root)
+    for i in range(0, n, 8):
+        store.upsert("reports", [f"w{worker}_{j}" for j in range(i, i + 8)], vecs[i:i + 8], payloads[i:i + 8])
+
+
+def test_processes_share_a_collection(tmp_path):
+    root = str(tmp_path)
+    watcher = LocalVectorStore(root)
+    watcher.upsert("reports", ["seed"], np.ones((1, 16), dtype=np.float32), [{"report_id": "seed"}])
+
+    # Enough rows across workers to grow the file while they interleave
+    n = MIN_CAPACITY // 2
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_worker_upserts, args=(root, w, n)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+
+    # The store opened before the workers ran sees their rows without reopening
+    assert watcher.count("reports") == 4 * n + 1
+    for w in range(4):
+        _, vecs, _ = _data(n, seed=w)
+        hit = watcher.search("reports", vecs[7], top=1)[0]
+        assert hit[0] == f"w{w}_7" and hit[1] > 0.999
+    reopened = LocalVectorStore(root)
+    assert reopened.count("reports") == 4 * n + 1
+    assert reopened.search("reports", np.ones(16), top=1)[0][0] == "seed"
@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import logging
+logger = logging.getLogger("datalens")
+
+
+class MicroBatcher:
+    """
+    Collects single items from any number of threads and runs them through
+    run_batch together. A batch goes out when max_batch items are waiting or
+    max_wait seconds after its first item arrived, whichever comes first, so
+    a lone request pays at most max_wait extra latency.
+
+    run_batch returns one result per item. An exception instance in place of
+    a result fails only that item's future. If run_batch itself raises, each
+    item is retried on its own, so one bad input fails only its caller. A
+    result list of the wrong length fails the whole batch. run() gives up
+    after timeout seconds.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list], List],
+        max_batch: int,
+        max_wait: float,
+        name: str = "batcher",
+        timeout: Optional[float] = None,
+    ):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item) -> Future:
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def run(self, item):
+        return self.submit(item).result(timeout=self.timeout)
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.run_batch(items))
+            except Exception as e:
+                if len(batch) == 1:
+                    results = [e]
+                else:
+                    logger.warning("%s batch of %d failed, retrying items alone: %s", self._worker.name, len(batch), e)
+                    results = [self._alone(item) for item in items]
+            if len(results) != len(batch):
+                error = RuntimeError(f"{self._worker.name} returned {len(results)} results for {len(batch)} items")
+                logger.error("%s", error)
+                results = [error] * len(batch)
+            for (_, fut), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+
+    def _alone(self, item):
+        try:
+            results = list(self.run_batch([item]))
+        except Exception as e:
+            logger.exception("%s item failed: %s", self._worker.name, e)
+            return e
+        if len(results) != 1:
+            return RuntimeError(f"{self._worker.name} returned {len(results)} results for 1 item")
+        return results[0]
@@ -0,0 +1,482 @@
+# app/utils/streaming_metrics.py
+
+from typing import Dict, Any, List, Iterable, Optional
+import io
+import json
+import pandas as pd
+import numpy as np
+
+from app.utils.metrics import BLOCK_CELLS, PERCENTILES, trend_item
+from app.utils.quantiles import KLLSketch
+from app.utils.trends import TrendStats, find_time_column, time_values
+
+# Version 2 added per-column quantile sketches, version 3 regression trend
+# statistics and version 4 per-column moments with pairwise matrices only
+# where they are needed; older summaries still load
+SUMMARY_VERSION = 4
+
+# Beyond this many numeric columns the k x k co-moments are not kept
+MAX_PAIR_COLUMNS = 2000
+
+
+class MetricsAccumulator:
+    """
+    Running statistics over row blocks of a table, in memory that does not
+    grow with the number of rows. Feeding every row of a CSV through update()
+    gives the same key metrics, trends and correlations as compute_key_metrics,
+    detect_trends and compute_correlations on the whole DataFrame.
+
+    Per column it keeps sum/min/max, first/last non-null values and the
+    count, mean and M2 (Welford). Correlations mirror pandas'
+    pairwise-complete Pearson through the k x k co-moment matrix. While every
+    row seen so far is complete, the pairwise counts, means and M2 equal the
+    per-column ones, so they are only materialised once a gap (a missing
+    value, or columns that did not cover the same rows) shows up. Blocks are
+    combined with Chan's parallel update, so two accumulators can also be
+    merged.
+
+    With more than max_pair_columns numeric columns no pairwise state is
+    kept at all: key metrics and trends are unaffected, correlations() is
+    empty.
+
+    Percentiles are the exception to "the same as in memory": each column
+    carries a KLL sketch, so {col}_pNN is an estimate within about ±1.65% in
+    rank (99% confidence) instead of the exact order statistic.
+
+    Least-squares trend statistics (TrendStats) ride along too. The x-axis
+    is the time column detected in the first rows, else the global row
+    position; merging accumulators with different axes disables
+    regression trends rather than mixing them.
+    """
+
+    def __init__(self, max_pair_columns: int = MAX_PAIR_COLUMNS):
+        self.names: List[str] = []
+        self.all_columns: List[str] = []
+        self.excluded: set = set()
+        self.row_count = 0
+        self._index: Dict[str, int] = {}
+        self._all_index: set = set()
+        self.total = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        self.first = np.zeros(0)
+        self.last = np.zeros(0)
+        self.count = np.zeros(0)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.sketches: List[KLLSketch] = []
+        self.trend = TrendStats()
+        self.time_axis: Optional[str] = None
+        self.trend_ok = True
+        self._axis_known = False
+        self.max_pair_columns = max_pair_columns
+        self.pairwise = True
+        self.gaps = False
+        self.comoment: Optional[np.ndarray] = np.zeros((0, 0))
+        self.pair_n: Optional[np.ndarray] = None
+        self.pair_mean: Optional[np.ndarray] = None
+        self.pair_m2: Optional[np.ndarray] = None
+
+    # ------------------------
+    # Feeding data
+    # ------------------------
+
+    def update(self, df: pd.DataFrame) -> "MetricsAccumulator":
+        self._see_columns(str(c) for c in df.columns)
+        if not self._axis_known and len(df):
+            self.time_axis = find_time_column(df)
+            self._axis_known = True
+        if self.time_axis is None:
+            x = np.arange(self.row_count, self.row_count + len(df), dtype="float64")
+        elif self.time_axis in df.columns:
+            x = time_values(df[self.time_axis])
+        else:
+            x = np.full(len(df), np.nan)
+        self.row_count += int(len(df))
+
+        num = df.select_dtypes(include=["number"])
+        # A column that is not numeric in any block would not be numeric
+        # when the whole file is parsed at once either
+        self.excluded.update(str(c) for c in df.columns if c not in num.columns)
+        if num.shape[1] == 0 or len(num) == 0:
+            return self
+
+        names = [str(c) for c in num.columns]
+        self._limit_pairs(names)
+        values = num.to_numpy(dtype="float64", na_value=np.nan)
+        step = max(1, BLOCK_CELLS // values.shape[1])
+        for start in range(0, len(values), step):
+            self._merge_block(names, values[start:start + step], x[start:start + step])
+        return self
+
+    def merge(self, other: "MetricsAccumulator") -> "MetricsAccumulator":
+        """Fold in statistics for rows that come after this accumulator's."""
+        self._see_columns(other.all_columns)
+        self.excluded.update(other.excluded)
+        if not self._axis_known:
+            self.time_axis, self.trend_ok, self._axis_known = other.time_axis, other.trend_ok, other._axis_known
+        elif other._axis_known and other.time_axis != self.time_axis:
+            self.trend_ok = False
+        self.trend_ok = self.trend_ok and other.trend_ok
+        # Row positions in other start at zero; time axes are absolute
+        shift = float(self.row_count) if self.time_axis is None else 0.0
+        self.row_count += other.row_count
+        if other.names:
+            self._combine(other.names, other, shift)
+        return self
+
+    def _see_columns(self, columns: Iterable[str]):
+        for c in columns:
+            if c not in self._all_index:
+                self._all_index.add(c)
+                self.all_columns.append(c)
+
+    def _limit_pairs(self, names: List[str], other_pairwise: bool = True):
+        if not self.pairwise:
+            return
+        width = len(self.names) + sum(n not in self._index for n in names)
+        if not other_pairwise or width > self.max_pair_columns:
+            self.pairwise = self.gaps = False
+            self.comoment = self.pair_n = self.pair_mean = self.pair_m2 = None
+
+    def _pairs(self):
+        """Pairwise counts, means and M2; views of the per-column ones while there are no gaps."""
+        if self.gaps:
+            return self.pair_n, self.pair_mean, self.pair_m2
+        k = len(self.names)
+        return tuple(np.broadcast_to(v[:, None], (k, k)) for v in (self.count, self.mean, self.m2))
+
+    def _merge_block(self, names: List[str], x: np.ndarray, pos: np.ndarray):
+        block = MetricsAccumulator()
+        block.names = list(names)
+        block._index = {n: i for i, n in enumerate(names)}
+
+        valid = ~np.isnan(x)
+        count = valid.sum(axis=0)
+        has = count > 0
+        filled = np.where(valid, x, 0.0)
+        block.total = filled.sum(axis=0)
+        block.min = np.where(valid, x, np.inf).min(axis=0)
+        block.max = np.where(valid, x, -np.inf).max(axis=0)
+
+        cols = np.arange(x.shape[1])
+        first_idx = valid.argmax(axis=0)
+        last_idx = len(x) - 1 - valid[::-1].argmax(axis=0)
+        block.first = np.where(has, x[first_idx, cols], np.nan)
+        block.last = np.where(has, x[last_idx, cols], np.nan)
+        block.sketches = [KLLSketch().update(x[:, i]) for i in range(x.shape[1])]
+        block.trend = TrendStats.from_block(pos, x)
+
+        # Centre on the block's own column means before the sums of squares
+        # and matrix products so they do not cancel catastrophically
+        shift = np.divide(block.total, count, out=np.zeros(x.shape[1]), where=has)
+        centred = np.where(valid, x - shift, 0.0)
+        csum = centred.sum(axis=0)
+        cmean = np.divide(csum, count, out=np.zeros(x.shape[1]), where=has)
+        block.count = count.astype("float64")
+        block.mean = cmean + shift
+        block.m2 = (centred * centred).sum(axis=0) - csum * cmean
+
+        block.pairwise = self.pairwise
+        block.gaps = self.pairwise and not valid.all()
+        if block.gaps:
+            v = valid.astype("float64")
+            n = v.T @ v
+            s = centred.T @ v
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean_c = np.where(n > 0, s / n, 0.0)
+            block.pair_n = n
+            block.pair_mean = mean_c + shift[:, None]
+            block.pair_m2 = (centred * centred).T @ v - s * mean_c
+            block.comoment = centred.T @ centred - s * mean_c.T
+        elif block.pairwise:
+            block.comoment = centred.T @ centred - np.outer(csum, cmean)
+        else:
+            block.comoment = None
+
+        self._combine(names, block)
+
+    def _combine(self, names: List[str], other: "MetricsAccumulator", shift: float = 0.0):
+        self._limit_pairs(names, other.pairwise)
+        new = [n for n in names if n not in self._index]
+        # Rows stay complete only if both sides' are and cover the same columns
+        complete = not other.gaps and (not self.names or (not new and len(names) == len(self.names)))
+        if self.pairwise and not complete and not self.gaps:
+            self.pair_n, self.pair_mean, self.pair_m2 = (np.array(a) for a in self._pairs())
+            self.gaps = True
+        self._grow(new)
+        idx = np.array([self._index[n] for n in names])
+
+        na = self.count[idx]
+        nb = other.count
+        n = na + nb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.where(n > 0, nb / n, 0.0)
+        weight = na * frac
+        delta = other.mean - self.mean[idx]
+
+        if self.gaps:
+            ix = np.ix_(idx, idx)
+            other_n, other_mean, other_m2 = other._pairs()
+            na2 = self.pair_n[ix]
+            n2 = na2 + other_n
+            with np.errstate(invalid="ignore", divide="ignore"):
+                frac2 = np.where(n2 > 0, other_n / n2, 0.0)
+            weight2 = na2 * frac2
+            delta2 = other_mean - self.pair_mean[ix]
+            self.comoment[ix] = self.comoment[ix] + other.comoment + delta2 * delta2.T * weight2
+            self.pair_m2[ix] = self.pair_m2[ix] + other_m2 + delta2 * delta2 * weight2
+            self.pair_mean[ix] = self.pair_mean[ix] + delta2 * frac2
+            self.pair_n[ix] = n2
+        elif self.pairwise:
+            # No gaps: both sides cover the same columns and every row, so
+            # the pairwise weights are the (equal) per-column ones
+            ix = np.ix_(idx, idx)
+            self.comoment[ix] = self.comoment[ix] + other.comoment + np.outer(delta, delta) * weight[0]
+
+        self.m2[idx] += other.m2 + delta * delta * weight
+        self.mean[idx] += delta * frac
+        self.count[idx] = n
+
+        had = na > 0
+        has = nb > 0
+        self.total[idx] += other.total
+        self.min[idx] = np.minimum(self.min[idx], other.min)
+        self.max[idx] = np.maximum(self.max[idx], other.max)
+        self.first[idx] = np.where(had, self.first[idx], other.first)
+        self.last[idx] = np.where(has, other.last, self.last[idx])
+        for j, i in enumerate(idx):
+            self.sketches[i].merge(other.sketches[j])
+        self.trend.combine(other.trend, idx, shift)
+
+    def _grow(self, new: List[str]):
+        if not new:
+            return
+        for n in new:
+            self._index[n] = len(self.names)
+            self.names.append(n)
+        k, add = len(self.names), len(new)
+
+        def pad1(a, fill):
+            return np.concatenate([a, np.full(add, fill)])
+
+        def pad2(a):
+            out = np.zeros((k, k))
+            out[: k - add, : k - add] = a
+            return out
+
+        self.total = pad1(self.total, 0.0)
+        self.min = pad1(self.min, np.inf)
+        self.max = pad1(self.max, -np.inf)
+        self.first = pad1(self.first, np.nan)
+        self.last = pad1(self.last, np.nan)
+        self.count = pad1(self.count, 0.0)
+        self.mean = pad1(self.mean, 0.0)
+        self.m2 = pad1(self.m2, 0.0)
+        self.sketches.extend(KLLSketch() for _ in new)
+        self.trend.grow(add)
+        if self.pairwise:
+            self.comoment = pad2(self.comoment)
+        if self.gaps:
+            self.pair_n = pad2(self.pair_n)
+            self.pair_mean = pad2(self.pair_mean)
+            self.pair_m2 = pad2(self.pair_m2)
+
+    # ------------------------
+    # Persistence
+    # ------------------------
+
+    _ARRAYS = ("total", "min", "max", "first", "last", "count", "mean", "m2")
+    _PAIR_ARRAYS = ("pair_n", "pair_mean", "pair_m2")
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact, pickle-free serialisation for storing alongside a file. The
+        co-moments are the only k x k matrix unless the file has gaps.
+        """
+        meta = {
+            "version": SUMMARY_VERSION,
+            "names": self.names,
+            "all_columns": self.all_columns,
+            "excluded": sorted(self.excluded),
+            "row_count": self.row_count,
+            "time_axis": self.time_axis,
+            "trend_ok": self.trend_ok,
+            "pairwise": self.pairwise,
+            "gaps": self.gaps,
+            "sketch_k": [s.k for s in self.sketches],
+            "sketch_n": [s.n for s in self.sketches],
+            "sketch_levels": [[len(lv) for lv in s.levels] for s in self.sketches],
+        }
+        arrays = {a: getattr(self, a) for a in self._ARRAYS}
+        if self.pairwise:
+            arrays["comoment"] = self.comoment
+        if self.gaps:
+            arrays.update({a: getattr(self, a) for a in self._PAIR_ARRAYS})
+        values = [lv for s in self.sketches for lv in s.levels]
+        buf = io.BytesIO()
+        np.savez_compressed(
+            buf,
+            meta=np.array(json.dumps(meta)),
+            sketch_values=np.concatenate(values) if values else np.zeros(0),
+            **{f"trend_{f}": getattr(self.trend, f) for f in TrendStats.FIELDS},
+            **arrays,
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_pair_columns: int = MAX_PAIR_COLUMNS) -> "MetricsAccumulator":
+        with np.load(io.BytesIO(data), allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("version") not in (1, 2, 3, SUMMARY_VERSION):
+                raise ValueError(f"Unsupported metric summary version {meta.get('version')}")
+            acc = cls(max_pair_columns)
+            for a in ("total", "min", "max", "first", "last"):
+                setattr(acc, a, z[a])
+            if meta["version"] < 4:
+                # Full pairwise matrices; the per-column moments are their diagonals
+                acc.comoment, acc.gaps = z["comoment"], True
+                for a in cls._PAIR_ARRAYS:
+                    setattr(acc, a, z[a])
+                acc.count, acc.mean, acc.m2 = (np.diag(m).copy() for m in acc._pairs())
+            else:
+                acc.count, acc.mean, acc.m2 = z["count"], z["mean"], z["m2"]
+                acc.pairwise, acc.gaps = meta["pairwise"], meta["gaps"]
+                acc.comoment = z["comoment"] if acc.pairwise else None
+                for a in cls._PAIR_ARRAYS:
+                    setattr(acc, a, z[a] if acc.gaps else None)
+            values = z["sketch_values"] if "sketch_values" in z.files else np.zeros(0)
+            acc.trend = TrendStats(len(meta["names"]))
+            has_trend = "trend_n" in z.files
+            if has_trend:
+                for f in TrendStats.FIELDS:
+                    setattr(acc.trend, f, z[f"trend_{f}"])
+        acc.names = meta["names"]
+        acc._index = {n: i for i, n in enumerate(acc.names)}
+        acc._see_columns(meta["all_columns"])
+        acc.excluded = set(meta["excluded"])
+        acc.row_count = meta["row_count"]
+        acc.time_axis = meta.get("time_axis")
+        acc.trend_ok = has_trend and meta.get("trend_ok", True)
+        acc._axis_known = acc.row_count > 0
+        acc._limit_pairs([])
+
+        acc.sketches = [KLLSketch() for _ in acc.names]
+        pos = 0
+        for s, k, n, sizes in zip(acc.sketches, meta.get("sketch_k", []), meta.get("sketch_n", []), meta.get("sketch_levels", [])):
+            s.k, s.n, s.levels = k, n, []
+            for size in sizes:
+                s.levels.append(values[pos:pos + size].copy())
+                pos += size
+        return acc
+
+    # ------------------------
+    # Results
+    # ------------------------
+
+    def _numeric(self) -> List[int]:
+        return [i for i, n in enumerate(self.names) if n not in self.excluded]
+
+    def key_metrics(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        numeric = self._numeric()
+        if self.row_count == 0 or not self.all_columns or not numeric:
+            return out
+
+        count, m2 = self.count, self.m2
+        for i in numeric:
+            if count[i] == 0:
+                continue
+            col = self.names[i]
+            out[f"{col}_mean"] = float(self.total[i] / count[i])
+            out[f"{col}_sum"] = float(self.total[i])
+            out[f"{col}_min"] = float(self.min[i])
+            out[f"{col}_max"] = float(self.max[i])
+            out[f"{col}_std"] = float(np.sqrt(max(m2[i], 0.0) / count[i]))
+            if self.sketches[i].n:
+                for p, v in zip(PERCENTILES, self.sketches[i].quantiles([p / 100 for p in PERCENTILES])):
+                    out[f"{col}_p{p}"] = v
+
+        out["row_count"] = int(self.row_count)
+        out["column_count"] = int(len(self.all_columns))
+        return out
+
+    def trends(self, method: str = "endpoints") -> List[Dict[str, Any]]:
+        """
+        method="endpoints" matches detect_trends; "regression" matches
+        regression_trends on the whole table (falling back to endpoints for
+        summaries that carry no usable regression statistics).
+        """
+        trends: List[Dict[str, Any]] = []
+        if self.row_count == 0:
+            return trends
+        if method == "regression" and self.trend_ok:
+            numeric = self._numeric()
+            return self.trend.subset(numeric).items([self.names[i] for i in numeric], axis=self.time_axis)
+        for i in self._numeric():
+            if self.count[i] < 2:
+                continue
+            trends.append(trend_item(self.names[i], self.first[i], self.last[i]))
+        return trends
+
+    def correlation_matrix(self) -> pd.DataFrame:
+        if not self.pairwise:
+            raise ValueError(f"No pairwise statistics kept for more than {self.max_pair_columns} columns")
+        numeric = self._numeric()
+        idx = np.ix_(numeric, numeric)
+        m2 = self._pairs()[2][idx]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            divisor = np.sqrt(np.clip(m2, 0.0, None) * np.clip(m2.T, 0.0, None))
+            corr = np.where(divisor > 0, self.comoment[idx] / divisor, np.nan)
+        names = [self.names[i] for i in numeric]
+        return pd.DataFrame(corr, index=names, columns=names)
+
+    def correlations(self, threshold: float = 0.5) -> List[Dict[str, Any]]:
+        corrs: List[Dict[str, Any]] = []
+        if self.row_count == 0 or not self.pairwise or len(self._numeric()) < 2:
+            return corrs
+
+        matrix = self.correlation_matrix()
+        cols = matrix.columns.tolist()
+        iu, ju = np.triu_indices(len(cols), 1)
+        coefs = matrix.to_numpy()[iu, ju]
+        keep = np.flatnonzero(~np.isnan(coefs) & (np.abs(coefs) >= threshold))
+        for p in keep:
+            corrs.append({"a": cols[iu[p]], "b": cols[ju[p]], "coefficient": float(coefs[p])})
+        return corrs
+
+
+def summarize_csv(path: str, chunk_rows: int = 100_000, max_pair_columns: int = MAX_PAIR_COLUMNS) -> MetricsAccumulator:
+    acc = MetricsAccumulator(max_pair_columns)
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        acc.update(chunk)
+    return acc
+
+
+def stream_csv_metrics(
+    path: str,
+    chunk_rows: int = 100_000,
+    threshold: float = 0.5,
+    trend_method: str = "endpoints",
+    max_pair_columns: int = MAX_PAIR_COLUMNS,
+):
+    """
+    Key metrics, trends and correlations for a CSV of any size, read in
+    chunk_rows blocks. Returns the same three structures as the in-memory
+    functions in app.utils.metrics.
+    """
+    acc = summarize_csv(path, chunk_rows, max_pair_columns)
+    return acc.key_metrics(), acc.trends(trend_method), acc.correlations(threshold)
+
+
+def combine_summaries(summaries: Iterable[bytes], max_pair_columns: int = MAX_PAIR_COLUMNS) -> MetricsAccumulator:
+    """
+    Merge stored per-file summaries, oldest first, into one accumulator that
+    answers as if all the files had been concatenated row-wise. Costs
+    O(columns^2) per file and never touches raw rows; correlations are
+    left out once more than max_pair_columns columns are involved.
+    """
+    acc = MetricsAccumulator(max_pair_columns)
+    for data in summaries:
+        acc.merge(MetricsAccumulator.from_bytes(data, max_pair_columns))
+    return acc
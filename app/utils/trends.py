@@ -0,0 +1,240 @@
+# app/utils/trends.py
+
+from typing import Dict, Any, List, Optional
+import pandas as pd
+import numpy as np
+
+from app.utils.metrics import BLOCK_CELLS, trend_item
+
+# Share of sampled values that must parse as ISO-8601 for a text column to
+# be taken as the time axis
+TIME_PARSE_MIN_SHARE = 0.9
+TIME_SAMPLE = 50
+
+_DAY = pd.Timedelta(days=1)
+
+
+def find_time_column(df: pd.DataFrame) -> Optional[str]:
+    """
+    The column to use as the x-axis: the first datetime column, else the
+    first text column whose values read as ISO-8601 dates.
+    """
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+    for col in df.columns:
+        s = df[col]
+        if not (pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)):
+            continue
+        sample = s.dropna().head(TIME_SAMPLE)
+        if sample.empty:
+            continue
+        parsed = pd.to_datetime(sample.astype(str), errors="coerce", format="ISO8601", utc=True)
+        if parsed.notna().mean() >= TIME_PARSE_MIN_SHARE:
+            return col
+    return None
+
+
+def time_values(series: pd.Series) -> np.ndarray:
+    """Days since the epoch as float64, NaN where a value does not parse."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        dt = series
+    else:
+        dt = pd.to_datetime(series, errors="coerce", format="ISO8601", utc=True)
+    origin = pd.Timestamp(0, tz=dt.dt.tz)
+    return ((dt - origin) / _DAY).to_numpy(dtype="float64", na_value=np.nan)
+
+
+class TrendStats:
+    """
+    Per-column sufficient statistics for a least-squares line y = a + b*x:
+    count, means of x and y, and the centred sums Sxx, Sxy, Syy, plus the x
+    range. Rows where x or y is missing are masked out column by column.
+    Two sets combine exactly with Chan's parallel update, so statistics can
+    be built per row block, per streamed chunk or per file and then merged.
+    """
+
+    FIELDS = ("n", "mean_x", "mean_y", "sxx", "sxy", "syy", "x_min", "x_max")
+
+    def __init__(self, k: int = 0):
+        self.n = np.zeros(k)
+        self.mean_x = np.zeros(k)
+        self.mean_y = np.zeros(k)
+        self.sxx = np.zeros(k)
+        self.sxy = np.zeros(k)
+        self.syy = np.zeros(k)
+        self.x_min = np.full(k, np.inf)
+        self.x_max = np.full(k, -np.inf)
+
+    @classmethod
+    def from_block(cls, x: np.ndarray, y: np.ndarray) -> "TrendStats":
+        """Statistics for one (rows, k) block against the row positions x."""
+        stats = cls(y.shape[1])
+        x_ok = ~np.isnan(x)
+        if not x_ok.any():
+            return stats
+        valid = ~np.isnan(y)
+        if not x_ok.all():
+            valid &= x_ok[:, None]
+        # x is centred on one scalar so the matrix-vector products below do
+        # not cancel; y is centred per column
+        centre = x[x_ok].mean()
+        if valid.all():
+            xc = x - centre
+            dy = y - y.mean(axis=0)
+            stats.n = np.full(y.shape[1], float(len(x)))
+            stats.mean_x = np.full(y.shape[1], centre)
+            stats.mean_y = y.mean(axis=0)
+            stats.sxx = np.full(y.shape[1], xc @ xc)
+            stats.sxy = xc @ dy
+            stats.syy = np.einsum("ij,ij->j", dy, dy)
+            stats.x_min = np.full(y.shape[1], x.min())
+            stats.x_max = np.full(y.shape[1], x.max())
+            return stats
+
+        dense = valid.all(axis=0)
+        if dense.any():
+            # Gap-free columns take the fast path; only the rest are masked
+            for cols, part in ((dense, cls.from_block(x, y[:, dense])), (~dense, cls.from_block(x, y[:, ~dense]))):
+                for field in cls.FIELDS:
+                    getattr(stats, field)[cols] = getattr(part, field)
+            return stats
+
+        v = valid.astype("float64")
+        xc = np.where(x_ok, x - centre, 0.0)
+        n = v.sum(axis=0)
+        has = n > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_xc = np.where(has, (xc @ v) / n, 0.0)
+            dy = np.where(valid, y, 0.0)
+            mean_y = np.where(has, dy.sum(axis=0) / n, 0.0)
+        dy -= mean_y
+        dy *= v
+
+        stats.n = n
+        stats.mean_x = mean_xc + centre
+        stats.mean_y = mean_y
+        stats.sxx = np.clip((xc * xc) @ v - n * mean_xc * mean_xc, 0.0, None)
+        stats.sxy = xc @ dy
+        stats.syy = np.einsum("ij,ij->j", dy, dy)
+        xs = np.broadcast_to(x[:, None], y.shape)
+        stats.x_min = np.where(valid, xs, np.inf).min(axis=0)
+        stats.x_max = np.where(valid, xs, -np.inf).max(axis=0)
+        return stats
+
+    @classmethod
+    def from_rows(cls, x: np.ndarray, y: np.ndarray) -> "TrendStats":
+        """from_block over bounded row blocks, for inputs of any length."""
+        stats = cls(y.shape[1])
+        step = max(1, BLOCK_CELLS // max(y.shape[1], 1))
+        for start in range(0, len(y), step):
+            stats.combine(cls.from_block(x[start:start + step], y[start:start + step]))
+        return stats
+
+    def combine(self, other: "TrendStats", idx: Optional[np.ndarray] = None, shift: float = 0.0):
+        """
+        Fold other into the columns idx of self (all columns by default).
+        shift is added to other's x values, e.g. the row offset of a later
+        chunk whose positions were counted from zero.
+        """
+        idx = np.arange(len(self.n)) if idx is None else idx
+        na, nb = self.n[idx], other.n
+        n = na + nb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.where(n > 0, nb / n, 0.0)
+        weight = na * frac
+        dx = other.mean_x + shift - self.mean_x[idx]
+        dy = other.mean_y - self.mean_y[idx]
+
+        self.sxx[idx] = self.sxx[idx] + other.sxx + dx * dx * weight
+        self.sxy[idx] = self.sxy[idx] + other.sxy + dx * dy * weight
+        self.syy[idx] = self.syy[idx] + other.syy + dy * dy * weight
+        self.mean_x[idx] = self.mean_x[idx] + dx * frac
+        self.mean_y[idx] = self.mean_y[idx] + dy * frac
+        self.n[idx] = n
+        self.x_min[idx] = np.minimum(self.x_min[idx], other.x_min + shift)
+        self.x_max[idx] = np.maximum(self.x_max[idx], other.x_max + shift)
+        return self
+
+    def grow(self, add: int):
+        for field in self.FIELDS:
+            fill = {"x_min": np.inf, "x_max": -np.inf}.get(field, 0.0)
+            setattr(self, field, np.concatenate([getattr(self, field), np.full(add, fill)]))
+
+    def subset(self, idx: List[int]) -> "TrendStats":
+        out = TrendStats()
+        for field in self.FIELDS:
+            setattr(out, field, getattr(self, field)[idx])
+        return out
+
+    def slopes(self) -> np.ndarray:
+        """Least-squares slope per column, NaN where x does not vary."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where((self.n >= 2) & (self.sxx > 0), self.sxy / self.sxx, np.nan)
+
+    def items(self, names: List[str], axis: Optional[str] = None, recent: Optional["TrendStats"] = None) -> List[Dict[str, Any]]:
+        """
+        One trend per column with at least two points, shaped like
+        trend_item: the change is read off the fitted line between the first
+        and last x, so a single outlier row cannot flip the direction.
+        """
+        slopes = self.slopes()
+        recent_slopes = recent.slopes() if recent is not None else None
+        unit = "day" if axis else "row"
+        with np.errstate(invalid="ignore"):
+            r2 = np.where(self.sxx * self.syy > 0, self.sxy ** 2 / (self.sxx * self.syy), np.nan)
+
+        trends: List[Dict[str, Any]] = []
+        for i, col in enumerate(names):
+            if np.isnan(slopes[i]):
+                continue
+            item = _fitted_item(col, slopes[i], self.mean_x[i], self.mean_y[i], self.x_min[i], self.x_max[i])
+            item["slope"] = float(slopes[i])
+            item["r2"] = float(r2[i])
+            item["axis"] = axis or "row"
+            item["description"] = (
+                f"{col} changed by {item['change_pct']:.1f}% along its least-squares fit "
+                f"(slope {slopes[i]:.4g} per {unit}, r²={r2[i]:.2f})."
+            )
+            if recent_slopes is not None and not np.isnan(recent_slopes[i]):
+                latest = _fitted_item(col, recent_slopes[i], recent.mean_x[i], recent.mean_y[i], recent.x_min[i], recent.x_max[i])
+                item["recent_slope"] = float(recent_slopes[i])
+                item["recent_direction"] = latest["direction"]
+                item["recent_change_pct"] = latest["change_pct"]
+                item["description"] += f" Over the latest window it moved {latest['change_pct']:.1f}%."
+            trends.append(item)
+        return trends
+
+
+def _fitted_item(col: str, slope: float, mean_x: float, mean_y: float, x_min: float, x_max: float) -> Dict[str, Any]:
+    start = mean_y + slope * (x_min - mean_x)
+    end = mean_y + slope * (x_max - mean_x)
+    return trend_item(col, start, end)
+
+
+def regression_trends(
+    df: pd.DataFrame,
+    window: Optional[int] = None,
+    x: Optional[np.ndarray] = None,
+    axis: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Least-squares trend for every numeric column in one batched pass.
+    The x-axis is x when given (with axis naming it), else a detected time
+    column in days, else the row position. window adds the slope over the
+    last window rows as recent_* fields.
+    """
+    if df.empty:
+        return []
+    num = df.select_dtypes(include=["number"])
+    if num.empty:
+        return []
+
+    if x is None:
+        axis = find_time_column(df)
+        x = time_values(df[axis]) if axis is not None else np.arange(len(df), dtype="float64")
+    y = num.to_numpy(dtype="float64", na_value=np.nan)
+
+    stats = TrendStats.from_rows(x, y)
+    recent = TrendStats.from_rows(x[-window:], y[-window:]) if window else None
+    return stats.items(num.columns.tolist(), axis=axis, recent=recent)
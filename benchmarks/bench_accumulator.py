@@ -0,0 +1,47 @@
+"""
+Cost of folding one CSV chunk into a MetricsAccumulator, and of the KLL
+sketch part of it, next to a plain np.sort of the same chunk.
+
+    python -m benchmarks.bench_accumulator --rows 100000 --cols 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.quantiles import KLLSketch
+from app.utils.streaming_metrics import MetricsAccumulator
+from benchmarks.bench_metrics import make_frame
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--cols", type=int, default=50)
+    ap.add_argument("--nan-frac", type=float, default=0.0)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    df = make_frame(args.rows, args.cols, args.nan_frac)
+    x = df.to_numpy()
+    print(f"chunk: {args.rows} rows x {args.cols} cols, nan_frac={args.nan_frac}")
+
+    t_update = best_of(lambda: MetricsAccumulator().update(df), args.repeat)
+    t_sketch = best_of(lambda: [KLLSketch().update(x[:, i]) for i in range(x.shape[1])], args.repeat)
+    t_sort = best_of(lambda: np.sort(x, axis=0), args.repeat)
+    print(f"  MetricsAccumulator.update  {t_update:6.2f}s")
+    print(f"  KLL sketches alone         {t_sketch:6.2f}s")
+    print(f"  np.sort of the chunk       {t_sort:6.2f}s   (sketches {t_sketch / t_sort:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Caption latency, peak RSS and agreement with the float32 baseline for each
+CAPTION_BACKEND on a fixed local image set (app/uploads/*.png by default).
+
+    python -m benchmarks.bench_caption_backends --repeat 3
+    python -m benchmarks.bench_caption_backends --images 'data/*.jpg' --backends torch onnx
+
+Needs torch and transformers; the onnx backend also needs onnx and
+onnxruntime. Each backend runs in a fresh process so peak RSS covers only
+that backend's model. Agreement is exact-match rate and mean token Jaccard
+overlap against the torch captions.
+"""
+import argparse
+import glob
+import multiprocessing
+import resource
+import statistics
+import time
+
+from app.ai.caption_backends import BACKENDS
+
+
+def _run(backend: str, paths: list[str], repeat: int, out):
+    from app.ai import models
+    from app.ai.image_prep import prepare_image
+
+    images = [prepare_image(p) for p in paths]
+    start = time.perf_counter()
+    models.get_blip(backend)
+    load_s = time.perf_counter() - start
+
+    captions, times = [], []
+    for i in range(repeat):
+        for img in images:
+            start = time.perf_counter()
+            caption = models.caption_batch_local([img], backend)[0]
+            times.append(time.perf_counter() - start)
+            if i == 0:
+                captions.append(caption)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    out.put((load_s, times, peak_mb, captions))
+
+
+def in_child(backend: str, paths: list[str], repeat: int):
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(backend, paths, repeat, out))
+    proc.start()
+    result = out.get()
+    proc.join()
+    return result
+
+
+def token_overlap(a: str, b: str) -> float:
+    ta, tb = set(a.lower().split()), set(b.lower().split())
+    return len(ta & tb) / len(ta | tb) if ta | tb else 1.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", default="app/uploads/*.png")
+    ap.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    if not paths:
+        raise SystemExit(f"No images match {args.images}")
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    print(f"{len(paths)} images x {args.repeat} runs, batch size 1")
+
+    baseline = None
+    for backend in backends:
+        load_s, times, peak_mb, captions = in_child(backend, paths, args.repeat)
+        baseline = baseline or captions
+        exact = sum(a == b for a, b in zip(captions, baseline)) / len(paths)
+        overlap = statistics.mean(token_overlap(a, b) for a, b in zip(captions, baseline))
+        print(
+            f"  {backend:<11} load {load_s:6.1f} s   median {statistics.median(times) * 1000:7.1f} ms/image"
+            f"   peak RSS {peak_mb:7.0f} MB   exact {exact:5.0%}   token overlap {overlap:.2f}"
+        )
+        for path, caption, ref in zip(paths, captions, baseline):
+            if caption != ref:
+                print(f"    {path}: {caption!r} (torch: {ref!r})")
+
+
+if __name__ == "__main__":
+    main()
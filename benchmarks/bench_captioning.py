@@ -0,0 +1,61 @@
+"""
+CPU captioning throughput at different batch sizes.
+
+    python -m benchmarks.bench_captioning --images "app/uploads/*.png" --batch-sizes 1 2 4 8 16 --threads 4
+
+Each image set is repeated up to --count images. The first batch is a
+warm-up and is not timed. The last line pushes the same images through
+CaptionBatcher from concurrent threads, the way overlapping reports do.
+"""
+import argparse
+import glob
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from app.config import settings
+from app.ai import models
+from app.ai.captioning import CaptionBatcher
+
+
+def load_images(pattern: str, count: int) -> list:
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise SystemExit(f"No images match {pattern}")
+    images = [Image.open(p).convert("RGB") for p in paths]
+    return [images[i % len(images)] for i in range(count)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", default="app/uploads/*.png")
+    ap.add_argument("--count", type=int, default=32)
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--threads", type=int, default=settings.CAPTION_THREADS)
+    ap.add_argument("--max-wait-ms", type=int, default=settings.CAPTION_MAX_WAIT_MS)
+    args = ap.parse_args()
+
+    settings.CAPTION_THREADS = args.threads
+    images = load_images(args.images, args.count)
+    models.caption_batch_local(images[:1])
+    print(f"{len(images)} images, {args.threads} torch threads")
+
+    for size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(images), size):
+            models.caption_batch_local(images[i:i + size])
+        elapsed = time.perf_counter() - start
+        print(f"  batch {size:>3}: {len(images) / elapsed:6.2f} images/sec")
+
+    size = max(args.batch_sizes)
+    batcher = CaptionBatcher(models.caption_batch_local, size, args.max_wait_ms / 1000)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(images)) as pool:
+        list(pool.map(batcher.caption, images))
+    elapsed = time.perf_counter() - start
+    print(f"  batcher (max {size}, {len(images)} concurrent callers): {len(images) / elapsed:6.2f} images/sec")
+
+
+if __name__ == "__main__":
+    main()
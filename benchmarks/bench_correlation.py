@@ -0,0 +1,70 @@
+"""
+Strong-pair extraction on wide numeric frames: pandas corr() plus the old
+nested .loc loop vs. the blocked engine (float64, float32, top-K).
+
+    python -m benchmarks.bench_correlation --rows 20000 --cols 100 1000 5000
+
+pandas is skipped above --pandas-max-cols since it is single-threaded and
+needs minutes at k = 5000.
+"""
+import argparse
+import time
+import tracemalloc
+
+import pandas as pd
+
+from app.utils.correlation import correlation_pairs
+from benchmarks.bench_metrics import make_frame
+
+
+def legacy_correlations(df: pd.DataFrame, threshold: float):
+    corr_matrix = df.corr()
+    cols = corr_matrix.columns.tolist()
+    out = []
+    for i in range(len(cols)):
+        for j in range(i + 1, len(cols)):
+            coef = corr_matrix.loc[cols[i], cols[j]]
+            if not pd.isna(coef) and abs(coef) >= threshold:
+                out.append({"a": cols[i], "b": cols[j], "coefficient": float(coef)})
+    return out
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20_000)
+    ap.add_argument("--cols", type=int, nargs="+", default=[100, 1000, 5000])
+    ap.add_argument("--nan-frac", type=float, default=0.0)
+    ap.add_argument("--threshold", type=float, default=0.5)
+    ap.add_argument("--top-k", type=int, default=100)
+    ap.add_argument("--pandas-max-cols", type=int, default=1000)
+    args = ap.parse_args()
+
+    for cols in args.cols:
+        df = make_frame(args.rows, cols, args.nan_frac)
+        print(f"\n{args.rows} rows x {cols} cols, nan_frac={args.nan_frac}")
+
+        if cols <= args.pandas_max_cols:
+            ref, t, mem = measure(lambda: legacy_correlations(df, args.threshold))
+            print(f"  pandas corr + loop   {t:8.2f}s  peak {mem:8.1f} MB  pairs {len(ref)}")
+
+        for label, kwargs in (
+            ("blocked float64", {}),
+            ("blocked float32", {"dtype": "float32"}),
+            (f"blocked top-{args.top_k}", {"dtype": "float32", "top_k": args.top_k}),
+        ):
+            pairs, t, mem = measure(lambda: correlation_pairs(df, args.threshold, **kwargs))
+            print(f"  {label:<20} {t:8.2f}s  peak {mem:8.1f} MB  pairs {len(pairs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Encode throughput of the embedding service against the old per-call path
+(one encode() per caller, vectors returned as Python lists).
+
+    python -m benchmarks.bench_embeddings --texts 2000 --threads 16
+
+Uses sentence-transformers (EMBEDDING_MODEL) when installed, otherwise the
+hash fallback, which measures only the service's own overhead. The cache
+table lives in a temporary SQLite file.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.ai import models
+from app.db.database import Base
+from app.services import embeddings
+from app.services.embeddings import EmbeddingService, hash_embed
+
+
+def corpus(n: int, unique: float) -> list[str]:
+    rng = np.random.default_rng(0)
+    words = ["revenue", "grew", "fell", "marketing", "spend", "conversion", "rate", "traffic", "bounce", "churn", "q3", "region", "units", "sold", "margin"]
+    distinct = [" ".join(rng.choice(words, size=12)) + f" #{i}" for i in range(max(1, int(n * unique)))]
+    return [distinct[i] for i in rng.integers(0, len(distinct), size=n)]
+
+
+def list_bytes(rows: int, dim: int) -> int:
+    # One float object per value plus the list's pointer to it
+    return rows * (sys.getsizeof([0.0] * dim) + dim * sys.getsizeof(1.0))
+
+
+def run_threads(fn, texts: list[str], threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda t: fn([t]), texts))
+    return time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--texts", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--unique", type=float, default=0.5, help="fraction of distinct texts")
+    args = ap.parse_args()
+
+    if importlib.util.find_spec("sentence_transformers") is not None:
+        encode, name = models.embed_local, settings.EMBEDDING_MODEL
+        encode(["warm up"])
+    else:
+        encode, name = hash_embed, "hash fallback (sentence-transformers not installed)"
+    texts = corpus(args.texts, args.unique)
+    print(f"{len(texts)} texts ({len(set(texts))} distinct), {args.threads} threads, encoder: {name}")
+
+    elapsed = run_threads(lambda t: np.asarray(encode(t)).tolist(), texts, args.threads)
+    print(f"  per-call encode + tolist   {len(texts) / elapsed:9.0f} texts/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'cache.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        embeddings.SessionLocal = sessionmaker(bind=engine)
+
+        svc = EmbeddingService(encode, name, settings.EMBED_MAX_BATCH, settings.EMBED_MAX_WAIT_MS / 1000, args.texts)
+        elapsed = run_threads(svc.embed, texts, args.threads)
+        print(f"  service, cold cache        {len(texts) / elapsed:9.0f} texts/s   {svc.stats()}")
+        elapsed = run_threads(svc.embed, texts, args.threads)
+        print(f"  service, warm LRU          {len(texts) / elapsed:9.0f} texts/s")
+
+        fresh = EmbeddingService(encode, name, settings.EMBED_MAX_BATCH, settings.EMBED_MAX_WAIT_MS / 1000, args.texts)
+        start = time.perf_counter()
+        out = fresh.embed(texts)
+        elapsed = time.perf_counter() - start
+        print(f"  new process, DB cache      {len(texts) / elapsed:9.0f} texts/s   (one call)")
+
+    print(f"  memory for {out.shape[0]} x {out.shape[1]}: float32 {out.nbytes / 2**20:.1f} MB vs lists {list_bytes(*out.shape) / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
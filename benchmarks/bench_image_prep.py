@@ -0,0 +1,94 @@
+"""
+Latency and peak memory of getting a large upload down to BLIP's 384 x 384
+input: full decode + convert + resize (what the processor did) vs.
+prepare_image (draft/reduce decoding) vs. loading the cached .npy.
+
+    python -m benchmarks.bench_image_prep --width 7680 --height 4320
+
+Each step runs in a fresh process so peak RSS is not polluted by earlier
+runs (Linux keeps ru_maxrss across exec, so the parent never touches pixels).
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.ai.image_prep import TARGET_SIZE, prepare_image, cache_prepared_image, load_prepared_image
+
+
+def make_image(path: str, width: int, height: int):
+    # Gradients plus noise: compresses like a screenshot, not like a flat fill
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype="float32")
+    y = np.linspace(0, 255, height, dtype="float32")[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    noise = rng.integers(0, 24, size=(height, width, 1), dtype="uint8")
+    Image.fromarray(np.clip(base + noise, 0, 255).astype("uint8")).save(path)
+
+
+def baseline(path: str):
+    img = Image.open(path).convert("RGB")
+    return img.resize(TARGET_SIZE, Image.BICUBIC)
+
+
+VARIANTS = {
+    "full decode + resize": baseline,
+    "prepare_image": prepare_image,
+    "cached .npy": load_prepared_image,
+}
+
+
+def _measure(name: str, path: str, out):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    VARIANTS[name](path)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out.put((elapsed, (after - before) / 1024))
+
+
+def in_child(target, *args):
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=target, args=(*args, out))
+    proc.start()
+    result = out.get()
+    proc.join()
+    return result
+
+
+def _make(path: str, width: int, height: int, out):
+    make_image(path, width, height)
+    out.put(None)
+
+
+def _cache(path: str, out):
+    out.put(cache_prepared_image(path))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--width", type=int, default=7680)
+    ap.add_argument("--height", type=int, default=4320)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("png", "jpg"):
+            path = os.path.join(tmp, f"large.{fmt}")
+            in_child(_make, path, args.width, args.height)
+            size_mb = os.path.getsize(path) / 2**20
+            print(f"{args.width}x{args.height} {fmt.upper()} ({size_mb:.1f} MB on disk)")
+            for name in VARIANTS:
+                if name == "cached .npy":
+                    in_child(_cache, path)
+                elapsed, peak = in_child(_measure, name, path)
+                print(f"  {name:<22} {elapsed * 1000:8.1f} ms   peak RSS +{peak:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Fused vs. separate metrics on a wide numeric frame.
+
+    python -m benchmarks.bench_metrics --rows 1000000 --cols 500
+
+The default size needs roughly 12 GB of RAM (frame plus working copies);
+shrink --rows for a quick run.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.utils.metrics import compute_key_metrics, detect_trends, compute_correlations, compute_all_metrics
+
+
+def make_frame(rows: int, cols: int, nan_frac: float, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(rows, cols))
+    # Give a few columns a shared factor so some correlations pass the threshold
+    data[:, : cols // 10] += rng.normal(size=(rows, 1)) * 2
+    if nan_frac:
+        data[rng.random((rows, cols)) < nan_frac] = np.nan
+    return pd.DataFrame(data, columns=[f"c{i}" for i in range(cols)])
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--cols", type=int, default=500)
+    ap.add_argument("--nan-frac", type=float, default=0.0)
+    args = ap.parse_args()
+
+    df = make_frame(args.rows, args.cols, args.nan_frac)
+    print(f"frame: {args.rows} rows x {args.cols} cols, nan_frac={args.nan_frac}")
+
+    (km, _), t_km = timed(lambda: (compute_key_metrics(df), None))
+    (tr, _), t_tr = timed(lambda: (detect_trends(df), None))
+    (corr, _), t_corr = timed(lambda: (compute_correlations(df), None))
+    separate = t_km + t_tr + t_corr
+    print(f"separate: key_metrics {t_km:.2f}s  trends {t_tr:.2f}s  correlations {t_corr:.2f}s  total {separate:.2f}s")
+
+    (fkm, ftr, fcorr), fused = timed(lambda: compute_all_metrics(df))
+    print(f"fused:    total {fused:.2f}s  ({separate / fused:.1f}x)")
+
+    worst = max(abs(fkm[k] - km[k]) / max(abs(km[k]), 1e-12) for k in km)
+    print(f"max relative key-metric difference: {worst:.2e}")
+    print(f"trends equal: {[t['direction'] for t in tr] == [t['direction'] for t in ftr]}")
+    print(f"correlation pairs: {len(corr)} separate / {len(fcorr)} fused")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Search latency of the local vector store against the old fallback (a list
+of (id, vector, payload) tuples scored one vector at a time).
+
+    python -m benchmarks.bench_vector_store --vectors 300000 --dim 384
+
+The old loop is timed on the first --legacy vectors and scaled linearly.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from numpy.linalg import norm
+
+from app.services.vector_store import LocalVectorStore
+
+
+def legacy_search(items, vector, top):
+    sims = []
+    for id_, vec, payload in items:
+        sim = float(np.dot(np.array(vec), np.array(vector)) / (norm(vec) * norm(vector) + 1e-9))
+        sims.append((id_, sim, payload))
+    sims.sort(key=lambda x: x[1], reverse=True)
+    return sims[:top]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vectors", type=int, default=300_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=32)
+    ap.add_argument("--legacy", type=int, default=20_000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(args.vectors, args.dim)).astype(np.float32)
+    ids = [f"v{i}" for i in range(args.vectors)]
+    payloads = [{"report_id": f"r{i % 100}"} for i in range(args.vectors)]
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    print(f"{args.vectors} x {args.dim} float32, {args.queries} queries, top 5")
+
+    items = list(zip(ids[: args.legacy], vecs[: args.legacy].tolist(), payloads))
+    start = time.perf_counter()
+    legacy_search(items, queries[0].tolist(), 5)
+    legacy = (time.perf_counter() - start) * args.vectors / args.legacy
+    print(f"  legacy loop (scaled)        {legacy * 1000:9.1f} ms/query")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalVectorStore(tmp)
+        start = time.perf_counter()
+        for lo in range(0, args.vectors, 10_000):
+            store.upsert("bench", ids[lo:lo + 10_000], vecs[lo:lo + 10_000], payloads[lo:lo + 10_000])
+        print(f"  upsert                      {args.vectors / (time.perf_counter() - start):9.0f} vectors/s")
+
+        store.search("bench", queries[0])
+        start = time.perf_counter()
+        for q in queries:
+            store.search("bench", q)
+        single = (time.perf_counter() - start) / args.queries
+        print(f"  matrix search               {single * 1000:9.1f} ms/query   ({legacy / single:.0f}x)")
+
+        start = time.perf_counter()
+        store.search_batch("bench", queries)
+        batch = (time.perf_counter() - start) / args.queries
+        print(f"  batched search              {batch * 1000:9.1f} ms/query")
+
+        start = time.perf_counter()
+        for q in queries:
+            store.search("bench", q, where={"report_id": "r7"})
+        print(f"  filtered (1% of rows)       {(time.perf_counter() - start) / args.queries * 1000:9.2f} ms/query")
+
+        start = time.perf_counter()
+        reopened = LocalVectorStore(tmp)
+        reopened.search("bench", queries[0])
+        print(f"  reopen + first search       {(time.perf_counter() - start) * 1000:9.0f} ms")
+
+
+if __name__ == "__main__":
+    main()